@@ -0,0 +1,82 @@
+"""
+/coupons/best ranking latency over the cached coupon set.
+
+Builds N synthetic active coupons (default 10k: a mix of percentage and fixed,
+with min order amounts, caps, restaurant and city restrictions and validity
+windows) and times utils.coupon_engine.rank_coupons per cart.
+
+Usage (from backend/):
+    python benchmarks/bench_best_coupon.py [coupons] [carts]
+"""
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId
+
+from utils.coupon_engine import index_coupons, rank_coupons
+
+RESTAURANTS = [str(ObjectId()) for _ in range(500)]
+CITIES = ["İstanbul", "Ankara", "İzmir", "Bursa", "Antalya"]
+
+
+def synthetic_coupon(rng: random.Random, now: datetime) -> dict:
+    percentage = rng.random() < 0.6
+    coupon = {
+        "_id": ObjectId(),
+        "code": f"BENCH-{rng.getrandbits(40):010X}",
+        "discountType": "percentage" if percentage else "fixed",
+        "discountValue": rng.choice([5, 10, 15, 20, 25]) if percentage else rng.choice([10, 20, 30, 50, 75]),
+        "minOrderAmount": rng.choice([0, 0, 50, 100, 150, 250]),
+        "maxDiscountAmount": rng.choice([None, 25, 50, 100]) if percentage else None,
+        "usageLimit": rng.choice([None, 100, 1000]),
+        "usedCount": rng.randint(0, 100),
+        "userLimit": rng.choice([1, 1, 3]),
+        "validFrom": now - timedelta(days=rng.randint(-3, 30)),
+        "validUntil": now + timedelta(days=rng.randint(1, 60)),
+        "isActive": True,
+        "applicableRestaurants": rng.sample(RESTAURANTS, rng.randint(1, 5)) if rng.random() < 0.5 else [],
+        "applicableCities": rng.sample(CITIES, 1) if rng.random() < 0.3 else [],
+    }
+    return coupon
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    carts = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    documents = [synthetic_coupon(rng, now) for _ in range(count)]
+    start = time.perf_counter()
+    coupons = index_coupons(documents, now)
+    print(f"index {count} coupons: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # A returning user who already used a tenth of the coupons
+    usage = {str(coupon["_id"]): 1 for coupon in rng.sample(documents, count // 10)}
+
+    for label, with_restaurant in (("restaurant cart", True), ("no restaurant", False)):
+        timings = []
+        eligible = 0
+        for _ in range(carts):
+            restaurant_id = rng.choice(RESTAURANTS) if with_restaurant else None
+            amount = rng.uniform(40, 600)
+            start = time.perf_counter()
+            _, qualifying = rank_coupons(coupons, usage, restaurant_id, amount, rng.choice(CITIES), now, limit=10)
+            timings.append(time.perf_counter() - start)
+            eligible += qualifying
+        timings.sort()
+        print(
+            f"{label:16s} p50 {statistics.median(timings) * 1000:6.2f} ms  "
+            f"p99 {timings[int(len(timings) * 0.99)] * 1000:6.2f} ms  "
+            f"avg eligible {eligible / carts:7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+ID generation throughput: random.choices codes vs utils.ids.
+
+Usage (from backend/):
+    python benchmarks/bench_ids.py [count]
+"""
+import random
+import string
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.ids import IdGenerator, split
+
+
+def legacy_reservation_code():
+    return 'RES-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+
+
+def rate(fn, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return count / (time.perf_counter() - start)
+
+
+def threaded_rate(generator: IdGenerator, count: int, threads: int) -> float:
+    per_thread = count // threads
+    workers = [threading.Thread(target=lambda: [generator.next_code() for _ in range(per_thread)]) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    generator = IdGenerator(worker_id=1)
+
+    print(f"random.choices (legacy): {rate(legacy_reservation_code, count) / 1e6:6.2f} M codes/s")
+    print(f"IdGenerator.next_value:  {rate(generator.next_value, count) / 1e6:6.2f} M values/s")
+    print(f"IdGenerator.next_code:   {rate(generator.next_code, count) / 1e6:6.2f} M codes/s")
+    print(f"next_code, 4 threads:    {threaded_rate(generator, count, 4) / 1e6:6.2f} M codes/s")
+    # With 4096 codes per second per worker, sustained rates above that borrow future seconds
+    ahead = split(generator.next_value())[0] - int(time.time())
+    print(f"timeline ahead of the wall clock: {max(ahead, 0)} s")
+
+
+if __name__ == "__main__":
+    main()
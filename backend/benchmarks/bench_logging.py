@@ -0,0 +1,66 @@
+"""
+Per-request logging cost: synchronous FileHandler vs the queue pipeline.
+
+Measures the time a request handler spends inside ``log_request`` (i.e. the
+cost paid on the event loop), not the writer thread's throughput.
+
+Usage (from backend/):
+    python benchmarks/bench_logging.py [iterations]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def bench(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn("/api/restaurants", "GET", "6581f0c2a1b2c3d4e5f60718")
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def legacy_pipeline(log_dir: str):
+    """The previous setup: FileHandler + StreamHandler, eager f-string"""
+    legacy = logging.getLogger("bench.legacy")
+    legacy.propagate = False
+    legacy.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for handler in (logging.FileHandler(os.path.join(log_dir, "legacy.log")), logging.StreamHandler(open(os.devnull, "w"))):
+        handler.setFormatter(formatter)
+        legacy.addHandler(handler)
+
+    def log_request(endpoint: str, method: str, user_id: str = None):
+        legacy.info(f"API Request: {method} {endpoint} | User: {user_id or 'anonymous'}")
+
+    return log_request
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        legacy = legacy_pipeline(log_dir)
+        print(f"legacy FileHandler:        {bench(legacy, iterations):8.2f} us/call")
+
+        os.environ["LOG_DIR"] = log_dir
+        os.environ["LOG_QUEUE_SIZE"] = str(iterations * 2)
+        sys.stderr = open(os.devnull, "w")
+        from utils import logger as app_logger
+
+        app_logger.configure_logging()
+        print(f"queue pipeline:            {bench(app_logger.log_request, iterations):8.2f} us/call")
+        app_logger.shutdown_logging()
+
+        os.environ["LOG_ROUTE_SAMPLE_RATES"] = "/api/restaurants=0.05"
+        app_logger.configure_logging()
+        print(f"queue pipeline, 5% sample: {bench(app_logger.log_request, iterations):8.2f} us/call")
+        app_logger.shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
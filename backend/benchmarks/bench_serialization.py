@@ -0,0 +1,108 @@
+"""
+Response encoding cost for the largest list endpoints.
+
+Compares FastAPI's default path (validate against response_model, dump to
+JSON-compatible Python, stdlib json) with the trusted orjson path used by
+utils/serialization.py, on synthetic documents shaped like MongoDB reads.
+
+Usage (from backend/):
+    python benchmarks/bench_serialization.py [iterations]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from models.menu import MenuItemResponse
+from models.order import OrderResponse
+from models.review import ReviewResponse
+from utils.serialization import dumps
+
+
+def make_orders(count: int) -> list:
+    now = datetime.utcnow()
+    return [{
+        "id": str(ObjectId()),
+        "orderNumber": f"ORD-{i:08d}",
+        "userId": str(ObjectId()),
+        "restaurantId": str(ObjectId()),
+        "items": [
+            {"menuItemId": str(ObjectId()), "name": f"Item {j}", "price": 42.5 + j, "quantity": 1 + j % 3}
+            for j in range(4)
+        ],
+        "deliveryAddress": {"title": "Ev", "address": "Bağdat Caddesi No: 12", "city": "İstanbul",
+                            "coordinates": {"lat": 40.97, "lng": 29.06}},
+        "paymentMethod": "card",
+        "subtotal": 180.0, "deliveryFee": 10.0, "serviceFee": 5.0, "total": 195.0,
+        "status": "delivered",
+        "createdAt": now - timedelta(minutes=i),
+    } for i in range(count)]
+
+
+def make_reviews(count: int) -> list:
+    now = datetime.utcnow()
+    return [{
+        "id": str(ObjectId()),
+        "restaurantId": str(ObjectId()),
+        "userId": str(ObjectId()),
+        "userName": "Ayşe Yılmaz",
+        "userAvatar": "https://i.pravatar.cc/150?u=1",
+        "rating": 1 + i % 5,
+        "comment": "Yemekler sıcak geldi, kurye çok nazikti. " * 3,
+        "createdAt": now - timedelta(hours=i),
+    } for i in range(count)]
+
+
+def make_menu(count: int) -> list:
+    return [{
+        "id": str(ObjectId()),
+        "restaurantId": str(ObjectId()),
+        "name": f"Menu item {i}",
+        "description": "Közlenmiş patlıcan, yoğurt ve tereyağlı sos ile",
+        "price": 95.0 + i,
+        "image": f"https://images.example.com/menu/{i}.jpg",
+        "category": ["Ana Yemek", "Başlangıç", "Tatlı", "İçecek"][i % 4],
+        "isAvailable": True,
+    } for i in range(count)]
+
+
+def fastapi_default(adapter: TypeAdapter):
+    def encode(docs):
+        validated = adapter.validate_python(docs)
+        content = adapter.dump_python(validated, mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return encode
+
+
+def bench(fn, docs, iterations: int) -> float:
+    fn(docs)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(docs)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    cases = [
+        ("GET /orders (1000)", List[OrderResponse], make_orders(1000)),
+        ("GET /reviews/{id} (1000)", List[ReviewResponse], make_reviews(1000)),
+        ("GET /menu/{id} (300)", List[MenuItemResponse], make_menu(300)),
+    ]
+    print(f"{'endpoint':28} {'validate+json':>14} {'orjson':>10} {'speedup':>8} {'bytes':>9}")
+    for name, model, docs in cases:
+        default_ms = bench(fastapi_default(TypeAdapter(model)), docs, iterations)
+        fast_ms = bench(dumps, docs, iterations)
+        print(f"{name:28} {default_ms:11.2f} ms {fast_ms:7.2f} ms {default_ms / fast_ms:7.1f}x {len(dumps(docs)):9d}")
+
+
+if __name__ == "__main__":
+    main()
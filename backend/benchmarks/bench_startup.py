@@ -0,0 +1,93 @@
+"""
+Startup cost: module import time, app construction and first-request latency.
+
+Each measurement runs in a fresh interpreter so nothing is cached between runs.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py [--top 15]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+FIRST_REQUEST_SCRIPT = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import server
+t1 = time.perf_counter()
+app = server.app
+t2 = time.perf_counter()
+
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        response = await client.get("/api/")
+        return response.status_code, time.perf_counter() - start
+
+status, first = asyncio.run(first_request())
+print(json.dumps({
+    "import_server_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "first_request_ms": first * 1000,
+    "first_request_status": status,
+}))
+"""
+
+
+def run(args, env=None):
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={**os.environ, **(env or {})}
+    )
+
+
+def import_times(statement: str):
+    """Parse `python -X importtime` output into (cumulative_us, module) pairs"""
+    result = run(["-X", "importtime", "-c", statement])
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, module = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level after the separator
+        times.append((int(cumulative_us), module[1:].rstrip()))
+    return times, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = {"MONGO_URL": os.getenv("MONGO_URL", "mongodb://localhost:27017"), "DB_NAME": os.getenv("DB_NAME", "bench")}
+    os.environ.update(env)
+
+    for label, statement in (("import server", "import server"), ("import + create_app", "import server; server.app")):
+        times, result = import_times(statement)
+        if result.returncode != 0:
+            print(result.stderr[-2000:])
+            sys.exit(result.returncode)
+        top_level = [t for t in times if not t[1].startswith(" ")]
+        total_ms = sum(t[0] for t in top_level) / 1000
+        print(f"{label}: {total_ms:.1f} ms cumulative import time")
+        for cumulative_us, module in sorted(top_level, reverse=True)[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+    result = run(["-c", FIRST_REQUEST_SCRIPT], env)
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit(result.returncode)
+    for key, value in json.loads(result.stdout.strip().splitlines()[-1]).items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,77 @@
 """
 Database connection module
 Separate from server.py to avoid circular imports
+
+Connection profiles:
+- ``db``: primary reads and all writes (orders, payments, admin edits)
+- ``catalog_db``: public browsing reads (restaurants, menus, collections) on
+  secondaryPreferred with bounded staleness; same client and pool as ``db``
+- ``analytics_db``: admin reporting aggregations on a dedicated client with
+  its own pool and a server-side time limit, so slow reports cannot starve
+  the pool used by checkout
+
+Pool, compression and timeout settings come from MONGO_* variables. Against a
+local single-node replica set (``mongod --replSet rs0`` then
+``rs.initiate()``), use ``MONGO_URL=mongodb://localhost:27017/?replicaSet=rs0``;
+secondaryPreferred then falls back to the primary.
 """
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import SecondaryPreferred
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables (server.py has already done so; scripts import
+# this module first)
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Imported after .env is loaded so the monitor sees DB_* settings
+from utils.db_monitor import command_monitor
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def client_options(prefix: str = "MONGO", max_pool_size: int = 100) -> dict:
+    """Motor client keyword arguments read from ``<prefix>_*`` variables"""
+    options = {
+        "maxPoolSize": _int_env(f"{prefix}_MAX_POOL_SIZE", max_pool_size),
+        "minPoolSize": _int_env(f"{prefix}_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env(f"{prefix}_MAX_IDLE_TIME_MS", 0) or None,
+        "connectTimeoutMS": _int_env(f"{prefix}_CONNECT_TIMEOUT_MS", 20000),
+        "serverSelectionTimeoutMS": _int_env(f"{prefix}_SERVER_SELECTION_TIMEOUT_MS", 30000),
+        "waitQueueTimeoutMS": _int_env(f"{prefix}_WAIT_QUEUE_TIMEOUT_MS", 0) or None,
+        "event_listeners": [command_monitor],
+    }
+    # e.g. "zstd,snappy,zlib"; zstd needs `zstandard`, snappy needs `python-snappy`.
+    # The server picks the first one it also supports
+    compressors = os.getenv(f"{prefix}_COMPRESSORS", os.getenv("MONGO_COMPRESSORS", ""))
+    if compressors:
+        options["compressors"] = compressors
+    return {key: value for key, value in options.items() if value is not None}
+
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
\ No newline at end of file
+db_name = os.environ['DB_NAME']
+
+client = AsyncIOMotorClient(mongo_url, **client_options("MONGO"))
+db = client[db_name]
+
+# Browsing reads tolerate a few seconds of replication lag (90s is the server minimum)
+CATALOG_MAX_STALENESS = _int_env("MONGO_CATALOG_MAX_STALENESS_SECONDS", 90)
+catalog_db = client.get_database(
+    db_name, read_preference=SecondaryPreferred(max_staleness=CATALOG_MAX_STALENESS)
+)
+
+# Reporting gets its own client so its pool is independent of request traffic.
+# timeoutMS makes the driver send maxTimeMS with every command
+analytics_client = AsyncIOMotorClient(
+    os.getenv("ANALYTICS_MONGO_URL", mongo_url),
+    timeoutMS=_int_env("ANALYTICS_TIMEOUT_MS", 30000),
+    readPreference="secondaryPreferred",
+    **client_options("ANALYTICS_MONGO", max_pool_size=10)
+)
+analytics_db = analytics_client[db_name]
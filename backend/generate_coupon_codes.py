@@ -0,0 +1,35 @@
+"""
+Generate single-use codes for a coupon, for runs too large for the admin API.
+
+    python generate_coupon_codes.py <couponId> <count> [prefix]
+
+Codes are inserted in batches of 10,000; running API workers pick them up
+within CODE_FILTER_REFRESH seconds.
+"""
+import asyncio
+import sys
+
+from bson import ObjectId
+
+from database import client, db
+from utils.coupon_codes import generate_codes
+
+
+async def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    coupon_id, count = sys.argv[1], int(sys.argv[2])
+    prefix = sys.argv[3].upper() if len(sys.argv) > 3 else ""
+    try:
+        if not ObjectId.is_valid(coupon_id) or not await db.coupons.find_one({"_id": ObjectId(coupon_id)}, {"_id": 1}):
+            print(f"❌ Coupon not found: {coupon_id}")
+            sys.exit(1)
+        inserted = await generate_codes(coupon_id, count, prefix)
+        print(f"✅ Generated {inserted} codes for coupon {coupon_id}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
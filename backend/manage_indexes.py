@@ -0,0 +1,72 @@
+"""
+Index management CLI.
+
+Run as a deploy/migration step instead of creating indexes on server start:
+
+    python manage_indexes.py plan              # show missing / conflicting / extra indexes
+    python manage_indexes.py sync              # create missing indexes
+    python manage_indexes.py sync --drop-extra # also drop indexes not in the spec
+    python manage_indexes.py unused            # indexes with no accesses in $indexStats
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from database import db, client
+from utils.indexes import plan_indexes, sync_indexes, unused_indexes
+
+
+def print_plan(plan: dict) -> bool:
+    """Print the plan; False when something could not be (or was not) applied"""
+    clean = True
+    ok = True
+    for collection, diff in plan.items():
+        for model in diff["missing"]:
+            clean = False
+            print(f"+ {collection}: {model.document['name']} {dict(model.document['key'])}")
+        for model, duplicates in diff["blocked"]:
+            clean = ok = False
+            print(f"x {collection}: {model.document['name']} blocked by duplicate keys, e.g. {duplicates}")
+        if diff.get("failed"):
+            clean = ok = False
+            print(f"x {collection}: index build failed: {diff['failed']}")
+        for name, existing, desired in diff["conflicting"]:
+            clean = False
+            print(f"! {collection}: {name} has {existing}, spec wants {desired}")
+        for name in diff["extra"]:
+            clean = False
+            print(f"- {collection}: {name} (not in spec)")
+    if clean:
+        print("✅ Indexes match the spec")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes")
+    parser.add_argument("command", choices=["plan", "sync", "unused"])
+    parser.add_argument("--drop-extra", action="store_true", help="drop indexes that are not in the spec")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    ok = True
+    try:
+        if args.command == "plan":
+            ok = print_plan(await plan_indexes(db))
+        elif args.command == "sync":
+            ok = print_plan(await sync_indexes(db, drop_extra=args.drop_extra))
+        else:
+            unused = await unused_indexes(db)
+            for item in unused:
+                print(f"{item['collection']}.{item['name']} unused since {item['since']} on {item['host']}")
+            if not unused:
+                print("✅ Every non-unique index has been used")
+    finally:
+        client.close()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
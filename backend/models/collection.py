@@ -1,13 +1,25 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from bson import ObjectId
 
+class CollectionRule(BaseModel):
+    """Which restaurants a dynamic collection holds; evaluated by the background materializer"""
+    cuisines: List[str] = []  # any of
+    tags: List[str] = []  # any of
+    city: Optional[str] = None
+    minRating: Optional[float] = Field(default=None, ge=0, le=5)
+    minReviewCount: Optional[int] = Field(default=None, ge=0)
+    features: List[str] = []  # all of: hasDelivery, hasTableBooking, ... or amenity/dietary/atmosphere/special feature names
+    sort: Literal["rating", "popular", "newest", "deliveryFee"] = "rating"
+    limit: int = Field(default=50, ge=1, le=500)
+
 class CollectionBase(BaseModel):
     title: str = Field(..., min_length=2, max_length=200)
     description: str
     image: str
-    restaurantIds: List[str] = []
+    restaurantIds: List[str] = []  # curated order; ignored when rule is set
+    rule: Optional[CollectionRule] = None
     category: str = Field(default="general")  # trending, new, deals, special_events, etc.
     isActive: bool = True
     priority: int = Field(default=0)  # Higher priority shows first
@@ -28,6 +40,7 @@ class Collection(CollectionBase):
 class CollectionResponse(CollectionBase):
     id: str
     restaurantCount: int = 0
+    materializedAt: Optional[datetime] = None
     createdAt: Optional[datetime] = None
     
     class Config:
@@ -23,6 +23,7 @@ class CouponBase(BaseModel):
     validUntil: datetime
     isActive: bool = True
     applicableRestaurants: List[str] = []  # Empty means all restaurants
+    applicableCities: List[str] = []  # Empty means all cities
     applicableCuisines: List[str] = []  # Empty means all cuisines
 
 class CouponCreate(BaseModel):
@@ -39,6 +40,7 @@ class CouponCreate(BaseModel):
     validUntil: datetime
     isActive: bool = True
     applicableRestaurants: List[str] = []
+    applicableCities: List[str] = []
     applicableCuisines: List[str] = []
 
 class Coupon(CouponBase):
@@ -58,6 +60,12 @@ class CouponResponse(CouponBase):
     class Config:
         orm_mode = True
 
+# Single-use campaign codes for a coupon
+class CouponCodeBatch(BaseModel):
+    count: int = Field(..., gt=0, le=100000)  # Larger runs: generate_coupon_codes.py
+    prefix: str = Field(default="", max_length=8, pattern=r"^[A-Z0-9-]*$")
+    length: int = Field(default=10, ge=8, le=16)
+
 class CouponUsage(BaseModel):
     id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     couponId: str
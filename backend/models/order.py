@@ -1,12 +1,8 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
-import random
-import string
-
-def generate_order_number():
-    return 'ORD-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+from utils.ids import generate_order_number
 
 class OrderItem(BaseModel):
     menuItemId: str
@@ -14,6 +10,13 @@ class OrderItem(BaseModel):
     price: float
     quantity: int = Field(ge=1)
 
+class OrderItemCreate(BaseModel):
+    menuItemId: str
+    quantity: int = Field(ge=1)
+    # Sent by older clients; prices come from the menu
+    name: Optional[str] = None
+    price: Optional[float] = None
+
 class OrderBase(BaseModel):
     restaurantId: str
     items: List[OrderItem]
@@ -22,16 +25,29 @@ class OrderBase(BaseModel):
     subtotal: float = Field(ge=0)
     deliveryFee: float = Field(ge=0)
     serviceFee: float = Field(ge=0)
+    discount: float = Field(default=0, ge=0)
+    couponCode: Optional[str] = None
     total: float = Field(ge=0)
 
-class OrderCreate(OrderBase):
-    pass
+class OrderCreate(BaseModel):
+    restaurantId: str
+    items: List[OrderItemCreate] = Field(..., min_length=1)
+    deliveryAddress: dict
+    paymentMethod: str
+    couponCode: Optional[str] = None
+    # Client-computed amounts are accepted for compatibility and ignored;
+    # the server prices every order (utils/pricing.py)
+    subtotal: Optional[float] = None
+    deliveryFee: Optional[float] = None
+    serviceFee: Optional[float] = None
+    total: Optional[float] = None
 
 class Order(OrderBase):
     id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     orderNumber: str = Field(default_factory=generate_order_number)
     userId: str
     status: str = "pending"
+    menuVersion: Optional[int] = None
     createdAt: datetime = Field(default_factory=datetime.utcnow)
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
 
@@ -2,11 +2,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
-import random
-import string
-
-def generate_reservation_code():
-    return 'RES-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+from utils.ids import generate_reservation_code
 
 class ReservationBase(BaseModel):
     restaurantId: str
@@ -0,0 +1,27 @@
+"""
+Rebuild the collection_members cards: curated collections from their
+restaurantIds, rule-based collections by evaluating their rules.
+
+Run once after deploying denormalized collection pages, or to repair them:
+
+    python rebuild_collection_members.py
+"""
+import asyncio
+
+from database import client
+from utils.collection_members import rebuild_all
+from utils.collection_rules import materialize_all
+
+
+async def main():
+    try:
+        count = await rebuild_all()
+        print(f"✅ Rebuilt members of {count} curated collections")
+        count = await materialize_all()
+        print(f"✅ Materialized {count} rule-based collections")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+"""
+Rebuild the per-user coupon usage documents from the coupon_usage history.
+
+Run once after deploying the coupon engine, or to repair the counters:
+
+    python rebuild_coupon_usage.py
+"""
+import asyncio
+
+from database import client
+from utils.coupon_engine import rebuild_user_usage
+
+
+async def main():
+    try:
+        count = await rebuild_user_usage()
+        print(f"✅ Rebuilt coupon usage for {count} users")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+"""
+Rebuild the reservation slot inventory from pending/confirmed reservations.
+
+Run once after deploying the inventory, or to repair it:
+
+    python rebuild_reservation_slots.py                 # every restaurant
+    python rebuild_reservation_slots.py <restaurantId>  # one restaurant
+"""
+import asyncio
+import sys
+
+from database import client
+from utils.reservation_slots import rebuild_slots
+
+
+async def main():
+    restaurant_id = sys.argv[1] if len(sys.argv) > 1 else None
+    try:
+        count = await rebuild_slots(restaurant_id)
+        print(f"✅ Rebuilt {count} reservation slots")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1 @@
-from . import auth
-from . import restaurants
-from . import menu
-from . import orders
-from . import reviews
-from . import user
-from . import admin
-from . import geo
-from . import coupons
-from . import campaigns
-from . import reservations
-from . import notifications
+# Routers are imported individually by server.create_app() (see server.ROUTERS)
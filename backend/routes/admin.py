@@ -3,16 +3,29 @@ from typing import List, Optional
 from models.restaurant import Restaurant, RestaurantCreate, Location
 from models.menu import MenuItem, MenuItemCreate
 from models.order import Order
-from models.coupon import Coupon, CouponCreate, CouponUsage
+from models.coupon import Coupon, CouponCreate, CouponCodeBatch, CouponUsage
 from models.campaign import Campaign, CampaignCreate
 from models.api_key import APIKey, APIKeyCreate, APIUsageLog
 from models.notification import Notification, NotificationCreate, BulkNotification
 from models.reservation import Reservation
 from utils.security import get_current_user, create_slug
 from utils.logger import log_request, log_error
+from utils.joins import batch_join, batch_count, lookup_stages, id_filter
+from utils.codec import find_with_ids
+from utils.reservation_slots import HOLDING_STATUSES, claim_slot, release_reservation
+from pymongo import ReturnDocument
+from utils.projections import projection_for
+from utils.pricing import invalidate_menu_prices
+from utils.menu_snapshot import apply_item_change, delete_snapshot
+from utils.coupon_engine import invalidate_coupons
+from utils.coupon_codes import generate_codes, delete_codes
+from utils.order_stream import notify_order_update
+from utils.notification_stream import notify_inserted
+from utils.collection_members import restaurant_changed
+from utils.catalog import DEFAULT_SETTINGS, invalidate_settings, invalidate_campaigns, invalidate_restaurants
 from bson import ObjectId
 from datetime import datetime, timedelta
-from database import db
+from database import db, analytics_db
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -44,19 +57,19 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
         log_request("/api/admin/analytics/dashboard", "GET", current_user["user_id"])
         
         # Total counts
-        total_restaurants = await db.restaurants.count_documents({})
-        total_orders = await db.orders.count_documents({})
-        total_users = await db.users.count_documents({})
-        total_reviews = await db.reviews.count_documents({})
+        total_restaurants = await analytics_db.restaurants.count_documents({})
+        total_orders = await analytics_db.orders.count_documents({})
+        total_users = await analytics_db.users.count_documents({})
+        total_reviews = await analytics_db.reviews.count_documents({})
         
         # Active campaigns & coupons
         now = datetime.utcnow()
-        active_campaigns = await db.campaigns.count_documents({
+        active_campaigns = await analytics_db.campaigns.count_documents({
             "isActive": True,
             "startDate": {"$lte": now},
             "endDate": {"$gte": now}
         })
-        active_coupons = await db.coupons.count_documents({
+        active_coupons = await analytics_db.coupons.count_documents({
             "isActive": True,
             "validFrom": {"$lte": now},
             "validUntil": {"$gte": now}
@@ -67,22 +80,22 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
             {"$match": {"status": {"$ne": "cancelled"}}},
             {"$group": {"_id": None, "total": {"$sum": "$total"}}}
         ]
-        revenue_result = await db.orders.aggregate(pipeline).to_list(1)
+        revenue_result = await analytics_db.orders.aggregate(pipeline).to_list(1)
         total_revenue = revenue_result[0]["total"] if revenue_result else 0
         
         # Today's stats
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_orders = await db.orders.count_documents({"createdAt": {"$gte": today_start}})
+        today_orders = await analytics_db.orders.count_documents({"createdAt": {"$gte": today_start}})
         
         today_revenue_pipeline = [
             {"$match": {"createdAt": {"$gte": today_start}, "status": {"$ne": "cancelled"}}},
             {"$group": {"_id": None, "total": {"$sum": "$total"}}}
         ]
-        today_revenue_result = await db.orders.aggregate(today_revenue_pipeline).to_list(1)
+        today_revenue_result = await analytics_db.orders.aggregate(today_revenue_pipeline).to_list(1)
         today_revenue = today_revenue_result[0]["total"] if today_revenue_result else 0
         
         # Recent orders
-        recent_orders = await db.orders.find().sort("createdAt", -1).limit(10).to_list(10)
+        recent_orders = await analytics_db.orders.find().sort("createdAt", -1).limit(10).to_list(10)
         for order in recent_orders:
             order["id"] = str(order["_id"])
             del order["_id"]
@@ -91,7 +104,7 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
         status_pipeline = [
             {"$group": {"_id": "$status", "count": {"$sum": 1}}}
         ]
-        status_result = await db.orders.aggregate(status_pipeline).to_list(10)
+        status_result = await analytics_db.orders.aggregate(status_pipeline).to_list(10)
         orders_by_status = {item["_id"]: item["count"] for item in status_result}
         
         # Revenue trend (last 7 days)
@@ -105,7 +118,7 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
             }},
             {"$sort": {"_id": 1}}
         ]
-        revenue_trend = await db.orders.aggregate(revenue_trend_pipeline).to_list(7)
+        revenue_trend = await analytics_db.orders.aggregate(revenue_trend_pipeline).to_list(7)
         
         # Top restaurants by orders
         top_restaurants_pipeline = [
@@ -113,11 +126,12 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
             {"$sort": {"revenue": -1}},
             {"$limit": 5}
         ]
-        top_restaurants = await db.orders.aggregate(top_restaurants_pipeline).to_list(5)
+        top_restaurants = await analytics_db.orders.aggregate(top_restaurants_pipeline).to_list(5)
         
         # Enrich with restaurant names
+        await batch_join(top_restaurants, analytics_db.restaurants, "_id", "restaurant", {"name": 1})
         for item in top_restaurants:
-            restaurant = await db.restaurants.find_one({"_id": ObjectId(item["_id"])})
+            restaurant = item.pop("restaurant")
             item["name"] = restaurant["name"] if restaurant else "Unknown"
             item["id"] = item["_id"]
             del item["_id"]
@@ -128,7 +142,7 @@ async def get_dashboard_analytics(current_user: dict = Depends(verify_admin)):
             {"$sort": {"count": -1}},
             {"$limit": 10}
         ]
-        top_cuisines = await db.restaurants.aggregate(cuisine_pipeline).to_list(10)
+        top_cuisines = await analytics_db.restaurants.aggregate(cuisine_pipeline).to_list(10)
         
         return {
             "summary": {
@@ -190,15 +204,15 @@ async def get_order_analytics(
             {"$sort": {"_id": 1}}
         ]
         
-        time_series = await db.orders.aggregate(pipeline).to_list(100)
+        time_series = await analytics_db.orders.aggregate(pipeline).to_list(100)
         
         # Order completion rate
-        total = await db.orders.count_documents({"createdAt": {"$gte": start_date}})
-        completed = await db.orders.count_documents({
+        total = await analytics_db.orders.count_documents({"createdAt": {"$gte": start_date}})
+        completed = await analytics_db.orders.count_documents({
             "createdAt": {"$gte": start_date},
             "status": "delivered"
         })
-        cancelled = await db.orders.count_documents({
+        cancelled = await analytics_db.orders.count_documents({
             "createdAt": {"$gte": start_date},
             "status": "cancelled"
         })
@@ -221,18 +235,18 @@ async def get_user_analytics(current_user: dict = Depends(verify_admin)):
     """Get user analytics"""
     try:
         # Total users
-        total_users = await db.users.count_documents({})
+        total_users = await analytics_db.users.count_documents({})
         
         # New users this week
         week_ago = datetime.utcnow() - timedelta(days=7)
-        new_users_week = await db.users.count_documents({"createdAt": {"$gte": week_ago}})
+        new_users_week = await analytics_db.users.count_documents({"createdAt": {"$gte": week_ago}})
         
         # Users with orders
         users_with_orders_pipeline = [
             {"$group": {"_id": "$userId"}},
             {"$count": "total"}
         ]
-        users_with_orders_result = await db.orders.aggregate(users_with_orders_pipeline).to_list(1)
+        users_with_orders_result = await analytics_db.orders.aggregate(users_with_orders_pipeline).to_list(1)
         users_with_orders = users_with_orders_result[0]["total"] if users_with_orders_result else 0
         
         # User registration trend
@@ -244,7 +258,7 @@ async def get_user_analytics(current_user: dict = Depends(verify_admin)):
             }},
             {"$sort": {"_id": 1}}
         ]
-        registration_trend = await db.users.aggregate(registration_trend_pipeline).to_list(30)
+        registration_trend = await analytics_db.users.aggregate(registration_trend_pipeline).to_list(30)
         
         # Top ordering users
         top_users_pipeline = [
@@ -252,7 +266,7 @@ async def get_user_analytics(current_user: dict = Depends(verify_admin)):
             {"$sort": {"spent": -1}},
             {"$limit": 10}
         ]
-        top_users = await db.orders.aggregate(top_users_pipeline).to_list(10)
+        top_users = await analytics_db.orders.aggregate(top_users_pipeline).to_list(10)
         
         return {
             "total_users": total_users,
@@ -297,17 +311,16 @@ async def get_all_restaurants_admin(
         
         skip = (page - 1) * limit
         
-        cursor = db.restaurants.find(query).skip(skip).limit(limit).sort("createdAt", -1)
-        restaurants = await cursor.to_list(length=limit)
+        restaurants = await find_with_ids(
+            db.restaurants, query, projection_for("admin"), sort=[("createdAt", -1)], skip=skip, limit=limit
+        )
         
         total = await db.restaurants.count_documents(query)
         
+        # Add order counts
+        order_counts = await batch_count(db.orders, "restaurantId", [r["id"] for r in restaurants])
         for restaurant in restaurants:
-            restaurant["id"] = str(restaurant["_id"])
-            del restaurant["_id"]
-            # Add order count
-            order_count = await db.orders.count_documents({"restaurantId": restaurant["id"]})
-            restaurant["orderCount"] = order_count
+            restaurant["orderCount"] = order_counts.get(restaurant["id"], 0)
         
         return {
             "restaurants": restaurants,
@@ -337,6 +350,8 @@ async def create_restaurant(restaurant_data: RestaurantCreate, current_user: dic
         
         result = await db.restaurants.insert_one(restaurant_dict)
         restaurant_id = str(result.inserted_id)
+        invalidate_restaurants()
+        await restaurant_changed(restaurant_id)
         
         created_restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
         created_restaurant["id"] = str(created_restaurant["_id"])
@@ -430,6 +445,8 @@ async def update_restaurant(restaurant_id: str, restaurant_data: dict, current_u
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Restaurant not found")
+        invalidate_restaurants()
+        await restaurant_changed(restaurant_id)
         
         updated_restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
         updated_restaurant["id"] = str(updated_restaurant["_id"])
@@ -458,10 +475,14 @@ async def delete_restaurant(restaurant_id: str, current_user: dict = Depends(ver
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Restaurant not found")
+        invalidate_restaurants()
         
-        # Delete related data
+        # Delete related data; the menu snapshot goes after the items it is built from
         await db.menu_items.delete_many({"restaurantId": restaurant_id})
+        await delete_snapshot(restaurant_id)
+        invalidate_menu_prices(restaurant_id)
         await db.reviews.delete_many({"restaurantId": restaurant_id})
+        await restaurant_changed(restaurant_id)
         
         return {"message": "Restaurant and related data deleted successfully"}
     except HTTPException:
@@ -513,12 +534,12 @@ async def create_menu_item(menu_item_data: MenuItemCreate, current_user: dict =
         menu_item_dict = menu_item_data.dict()
         menu_item_dict["createdAt"] = datetime.utcnow()
         
-        result = await db.menu_items.insert_one(menu_item_dict)
-        menu_item_id = str(result.inserted_id)
+        await db.menu_items.insert_one(menu_item_dict)
+        await apply_item_change(menu_item_dict["restaurantId"], str(menu_item_dict["_id"]))
+        invalidate_menu_prices(menu_item_dict["restaurantId"])
         
-        created_item = await db.menu_items.find_one({"_id": ObjectId(menu_item_id)})
-        created_item["id"] = str(created_item["_id"])
-        del created_item["_id"]
+        created_item = menu_item_dict
+        created_item["id"] = str(created_item.pop("_id"))
         
         return created_item
     except Exception as e:
@@ -535,17 +556,24 @@ async def update_menu_item(item_id: str, item_data: dict, current_user: dict = D
         if not ObjectId.is_valid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item ID")
         
-        result = await db.menu_items.update_one(
+        previous = await db.menu_items.find_one_and_update(
             {"_id": ObjectId(item_id)},
-            {"$set": item_data}
+            {"$set": item_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count == 0:
+        if not previous:
             raise HTTPException(status_code=404, detail="Menu item not found")
         
-        updated_item = await db.menu_items.find_one({"_id": ObjectId(item_id)})
-        updated_item["id"] = str(updated_item["_id"])
-        del updated_item["_id"]
+        updated_item = {**previous, **item_data}
+        # Both restaurants' menus and prices change if the item moved
+        if updated_item.get("restaurantId") != previous.get("restaurantId"):
+            await apply_item_change(previous.get("restaurantId"), item_id)
+            invalidate_menu_prices(previous.get("restaurantId"))
+        await apply_item_change(updated_item.get("restaurantId"), item_id)
+        invalidate_menu_prices(updated_item.get("restaurantId"))
+        
+        updated_item["id"] = str(updated_item.pop("_id"))
         
         return updated_item
     except HTTPException:
@@ -564,11 +592,14 @@ async def delete_menu_item(item_id: str, current_user: dict = Depends(verify_adm
         if not ObjectId.is_valid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item ID")
         
-        result = await db.menu_items.delete_one({"_id": ObjectId(item_id)})
+        deleted = await db.menu_items.find_one_and_delete({"_id": ObjectId(item_id)}, projection={"restaurantId": 1})
         
-        if result.deleted_count == 0:
+        if not deleted:
             raise HTTPException(status_code=404, detail="Menu item not found")
         
+        await apply_item_change(deleted.get("restaurantId"), item_id)
+        invalidate_menu_prices(deleted.get("restaurantId"))
+        
         return {"message": "Menu item deleted successfully"}
     except HTTPException:
         raise
@@ -599,21 +630,24 @@ async def get_all_orders(
         
         skip = (page - 1) * limit
         
-        cursor = db.orders.find(query).skip(skip).limit(limit).sort("createdAt", -1)
-        orders = await cursor.to_list(length=limit)
-        
+        # Sort/skip/limit come first so the page is read from the createdAt
+        # index; only the page's rows are joined to their restaurant names
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"createdAt": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            *lookup_stages("restaurants", "restaurantId", "restaurant", {"_id": 0, "name": 1})
+        ]
+        orders = await db.orders.aggregate(pipeline).to_list(limit)
         total = await db.orders.count_documents(query)
         
         for order in orders:
             order["id"] = str(order["_id"])
             del order["_id"]
-            # Get restaurant name
+            restaurant = order.pop("restaurant", None)
             if order.get("restaurantId"):
-                try:
-                    restaurant = await db.restaurants.find_one({"_id": ObjectId(order["restaurantId"])})
-                    order["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
-                except:
-                    order["restaurantName"] = "Unknown"
+                order["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
         
         return {
             "orders": orders,
@@ -635,7 +669,7 @@ async def get_order_details(order_id: str, current_user: dict = Depends(verify_a
         if not ObjectId.is_valid(order_id):
             raise HTTPException(status_code=400, detail="Invalid order ID")
         
-        order = await db.orders.find_one({"_id": ObjectId(order_id)})
+        order = await db.orders.find_one({"_id": id_filter(order_id)})
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
@@ -708,15 +742,19 @@ async def update_order_status(order_id: str, status_data: dict, current_user: di
             if status_data.get("reason"):
                 update_data["cancellationReason"] = status_data["reason"]
         
-        result = await db.orders.update_one(
-            {"_id": ObjectId(order_id)},
-            {"$set": update_data}
+        # Orders are stored with string ids
+        updated_order = await db.orders.find_one_and_update(
+            {"_id": id_filter(order_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
+        if not updated_order:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        updated_order = await db.orders.find_one({"_id": ObjectId(order_id)})
+        # Trackers get it from the change stream; without one, publish directly
+        notify_order_update(str(updated_order["_id"]), updated_order)
+        
         updated_order["id"] = str(updated_order["_id"])
         del updated_order["_id"]
         
@@ -759,9 +797,11 @@ async def get_all_users(
         for user in users:
             user["id"] = str(user["_id"])
             del user["_id"]
-            # Get order count
-            order_count = await db.orders.count_documents({"userId": user["id"]})
-            user["orderCount"] = order_count
+        
+        # Get order counts
+        order_counts = await batch_count(db.orders, "userId", [u["id"] for u in users])
+        for user in users:
+            user["orderCount"] = order_counts.get(user["id"], 0)
         
         return {
             "users": users,
@@ -792,15 +832,17 @@ async def get_user_details(user_id: str, current_user: dict = Depends(verify_adm
         
         # Get user's orders
         orders = await db.orders.find({"userId": user_id}).sort("createdAt", -1).limit(20).to_list(20)
-        for order in orders:
-            order["id"] = str(order["_id"])
-            del order["_id"]
         
         # Get user's reviews
         reviews = await db.reviews.find({"userId": user_id}).sort("createdAt", -1).to_list(20)
-        for review in reviews:
-            review["id"] = str(review["_id"])
-            del review["_id"]
+        
+        # Restaurant names for both lists in one query
+        await batch_join(orders + reviews, db.restaurants, "restaurantId", "restaurant", {"name": 1})
+        for doc in orders + reviews:
+            doc["id"] = str(doc["_id"])
+            del doc["_id"]
+            restaurant = doc.pop("restaurant")
+            doc["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
         
         # Stats
         total_spent_pipeline = [
@@ -938,6 +980,7 @@ async def create_coupon(coupon_data: CouponCreate, current_user: dict = Depends(
         
         result = await db.coupons.insert_one(coupon_dict)
         coupon_id = str(result.inserted_id)
+        invalidate_coupons()
         
         created_coupon = await db.coupons.find_one({"_id": ObjectId(coupon_id)})
         created_coupon["id"] = str(created_coupon["_id"])
@@ -966,6 +1009,7 @@ async def update_coupon(coupon_id: str, coupon_data: dict, current_user: dict =
             {"_id": ObjectId(coupon_id)},
             {"$set": coupon_data}
         )
+        invalidate_coupons()
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Coupon not found")
@@ -992,10 +1036,14 @@ async def delete_coupon(coupon_id: str, current_user: dict = Depends(verify_admi
             raise HTTPException(status_code=400, detail="Invalid coupon ID")
         
         result = await db.coupons.delete_one({"_id": ObjectId(coupon_id)})
+        invalidate_coupons()
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Coupon not found")
         
+        # Its single-use codes go too (rebuilds the code filter)
+        await delete_codes(coupon_id)
+        
         return {"message": "Coupon deleted successfully"}
     except HTTPException:
         raise
@@ -1006,6 +1054,30 @@ async def delete_coupon(coupon_id: str, current_user: dict = Depends(verify_admi
             detail="Failed to delete coupon"
         )
 
+@router.post("/coupons/{coupon_id}/codes", status_code=status.HTTP_201_CREATED)
+async def generate_coupon_codes(coupon_id: str, batch: CouponCodeBatch, current_user: dict = Depends(verify_admin)):
+    """Generate single-use codes for a coupon"""
+    try:
+        if not ObjectId.is_valid(coupon_id):
+            raise HTTPException(status_code=400, detail="Invalid coupon ID")
+        
+        coupon = await db.coupons.find_one({"_id": ObjectId(coupon_id)}, {"_id": 1})
+        if not coupon:
+            raise HTTPException(status_code=404, detail="Coupon not found")
+        
+        count = await generate_codes(coupon_id, batch.count, batch.prefix, batch.length)
+        total = await db.coupon_codes.count_documents({"couponId": coupon_id})
+        
+        return {"message": f"{count} codes generated", "count": count, "total": total}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error(e, "generate_coupon_codes")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate coupon codes"
+        )
+
 @router.get("/coupons/{coupon_id}/usage")
 async def get_coupon_usage(coupon_id: str, current_user: dict = Depends(verify_admin)):
     """Get coupon usage history"""
@@ -1015,9 +1087,16 @@ async def get_coupon_usage(coupon_id: str, current_user: dict = Depends(verify_a
         
         usage = await db.coupon_usage.find({"couponId": coupon_id}).sort("usedAt", -1).to_list(100)
         
+        # Attach user and order summaries with one query each
+        await batch_join(usage, db.users, "userId", "user", {"name": 1, "email": 1})
+        await batch_join(usage, db.orders, "orderId", "order", {"orderNumber": 1, "total": 1, "status": 1})
+        
         for item in usage:
             item["id"] = str(item["_id"])
             del item["_id"]
+            for field in ("user", "order"):
+                if item[field]:
+                    item[field]["id"] = str(item[field].pop("_id"))
         
         return usage
     except Exception as e:
@@ -1070,6 +1149,7 @@ async def create_campaign(campaign_data: CampaignCreate, current_user: dict = De
         
         result = await db.campaigns.insert_one(campaign_dict)
         campaign_id = str(result.inserted_id)
+        invalidate_campaigns()
         
         created_campaign = await db.campaigns.find_one({"_id": ObjectId(campaign_id)})
         created_campaign["id"] = str(created_campaign["_id"])
@@ -1099,6 +1179,7 @@ async def update_campaign(campaign_id: str, campaign_data: dict, current_user: d
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Campaign not found")
+        invalidate_campaigns()
         
         updated_campaign = await db.campaigns.find_one({"_id": ObjectId(campaign_id)})
         updated_campaign["id"] = str(updated_campaign["_id"])
@@ -1125,6 +1206,7 @@ async def delete_campaign(campaign_id: str, current_user: dict = Depends(verify_
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Campaign not found")
+        invalidate_campaigns()
         
         return {"message": "Campaign deleted successfully"}
     except HTTPException:
@@ -1156,12 +1238,12 @@ async def get_campaign_analytics(campaign_id: str, current_user: dict = Depends(
         orders_count = 0
         revenue = 0
         if campaign.get("couponCode"):
-            orders_count = await db.orders.count_documents({"couponCode": campaign["couponCode"]})
+            orders_count = await analytics_db.orders.count_documents({"couponCode": campaign["couponCode"]})
             revenue_pipeline = [
                 {"$match": {"couponCode": campaign["couponCode"]}},
                 {"$group": {"_id": None, "total": {"$sum": "$total"}}}
             ]
-            revenue_result = await db.orders.aggregate(revenue_pipeline).to_list(1)
+            revenue_result = await analytics_db.orders.aggregate(revenue_pipeline).to_list(1)
             revenue = revenue_result[0]["total"] if revenue_result else 0
         
         return {
@@ -1380,6 +1462,8 @@ async def delete_review(review_id: str, current_user: dict = Depends(verify_admi
                 {"_id": ObjectId(restaurant_id)},
                 {"$set": {"rating": 0, "reviewCount": 0}}
             )
+        invalidate_restaurants()
+        await restaurant_changed(restaurant_id)
         
         return {"message": "Review deleted successfully"}
     except HTTPException:
@@ -1413,15 +1497,14 @@ async def get_all_reservations(
         cursor = db.reservations.find(query).sort("createdAt", -1)
         reservations = await cursor.to_list(length=200)
         
+        # Get restaurant names
+        await batch_join(reservations, db.restaurants, "restaurantId", "restaurant", {"name": 1})
+        
         for reservation in reservations:
             reservation["id"] = str(reservation["_id"])
             del reservation["_id"]
-            # Get restaurant name
-            try:
-                restaurant = await db.restaurants.find_one({"_id": ObjectId(reservation["restaurantId"])})
-                reservation["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
-            except:
-                reservation["restaurantName"] = "Unknown"
+            restaurant = reservation.pop("restaurant")
+            reservation["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
         
         return reservations
     except Exception as e:
@@ -1456,15 +1539,34 @@ async def update_reservation_status(reservation_id: str, status_data: dict, curr
             if status_data.get("reason"):
                 update_data["cancellationReason"] = status_data["reason"]
         
-        result = await db.reservations.update_one(
-            {"_id": ObjectId(reservation_id)},
-            {"$set": update_data}
+        reservation = await db.reservations.find_one({"_id": ObjectId(reservation_id)})
+        if not reservation:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        
+        was_holding = reservation["status"] in HOLDING_STATUSES
+        holds = new_status in HOLDING_STATUSES
+        
+        # Reactivating a released reservation needs its capacity back first
+        if holds and not was_holding:
+            restaurant = await db.restaurants.find_one({"_id": ObjectId(reservation["restaurantId"])}) or {"_id": reservation["restaurantId"]}
+            if not await claim_slot(restaurant, reservation["date"], reservation["time"], reservation.get("partySize", 1)):
+                raise HTTPException(status_code=400, detail="Bu saat için rezervasyon dolu")
+        
+        # Only apply the change if nobody changed the status in between
+        updated_reservation = await db.reservations.find_one_and_update(
+            {"_id": ObjectId(reservation_id), "status": reservation["status"]},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
         
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Reservation not found")
+        if not updated_reservation:
+            if holds and not was_holding:
+                await release_reservation(reservation)
+            raise HTTPException(status_code=409, detail="Reservation was modified concurrently, please retry")
+        
+        if was_holding and not holds:
+            await release_reservation(reservation)
         
-        updated_reservation = await db.reservations.find_one({"_id": ObjectId(reservation_id)})
         updated_reservation["id"] = str(updated_reservation["_id"])
         del updated_reservation["_id"]
         
@@ -1529,6 +1631,8 @@ async def send_bulk_notification(notification_data: BulkNotification, current_us
         
         if notifications:
             await db.notifications.insert_many(notifications)
+            # Open notification streams get them now instead of on their next poll
+            await notify_inserted(notifications)
         
         return {
             "message": f"Notifications sent to {len(notifications)} users",
@@ -1550,18 +1654,7 @@ async def get_app_settings(current_user: dict = Depends(verify_admin)):
         settings = await db.settings.find_one({"type": "app"})
         if not settings:
             # Default settings
-            settings = {
-                "type": "app",
-                "siteName": "Yemek Nerede Yenir",
-                "currency": "TRY",
-                "currencySymbol": "₺",
-                "defaultDeliveryFee": 10,
-                "defaultServiceFee": 5,
-                "minOrderAmount": 50,
-                "maxDeliveryRadius": 10,
-                "supportEmail": "destek@yemeknereyeyenir.com",
-                "supportPhone": "+90 212 000 00 00"
-            }
+            settings = dict(DEFAULT_SETTINGS)
             await db.settings.insert_one(settings)
         
         if "_id" in settings:
@@ -1587,6 +1680,7 @@ async def update_app_settings(settings_data: dict, current_user: dict = Depends(
             {"$set": settings_data},
             upsert=True
         )
+        invalidate_settings()
         
         settings = await db.settings.find_one({"type": "app"})
         if "_id" in settings:
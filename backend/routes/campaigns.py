@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, status, Query
 from typing import Optional, List
 from utils.logger import log_request, log_error
 from bson import ObjectId
-from datetime import datetime
 from database import db
+from utils.catalog import get_active_campaigns as get_cached_active_campaigns
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 
@@ -15,38 +15,17 @@ async def get_active_campaigns(
 ):
     """Get currently active campaigns for public display"""
     try:
-        now = datetime.utcnow()
-        
-        query = {
-            "isActive": True,
-            "startDate": {"$lte": now},
-            "endDate": {"$gte": now}
-        }
+        campaigns = await get_cached_active_campaigns()
         
         if campaign_type:
-            query["campaignType"] = campaign_type
-        
-        cursor = db.campaigns.find(query).sort("priority", -1).limit(limit)
-        campaigns = await cursor.to_list(length=limit)
+            campaigns = [c for c in campaigns if c.get("campaignType") == campaign_type]
+        campaigns = campaigns[:limit]
         
-        result = []
-        for campaign in campaigns:
-            # Filter by city if specified
-            if city and campaign.get("applicableCities"):
-                if city not in campaign["applicableCities"]:
-                    continue
-            
-            # Increment impression count
-            await db.campaigns.update_one(
-                {"_id": campaign["_id"]},
-                {"$inc": {"impressionCount": 1}}
-            )
-            
-            campaign["id"] = str(campaign["_id"])
-            del campaign["_id"]
-            result.append(campaign)
+        # Filter by city if specified
+        if city:
+            campaigns = [c for c in campaigns if not c.get("applicableCities") or city in c["applicableCities"]]
         
-        return result
+        return await record_impressions(campaigns)
     except Exception as e:
         log_error(e, "get_active_campaigns")
         raise HTTPException(
@@ -58,26 +37,9 @@ async def get_active_campaigns(
 async def get_homepage_campaigns():
     """Get campaigns to show on homepage"""
     try:
-        now = datetime.utcnow()
-        
-        cursor = db.campaigns.find({
-            "isActive": True,
-            "showOnHomepage": True,
-            "startDate": {"$lte": now},
-            "endDate": {"$gte": now}
-        }).sort("priority", -1).limit(5)
-        
-        campaigns = await cursor.to_list(length=5)
+        campaigns = [c for c in await get_cached_active_campaigns() if c.get("showOnHomepage")][:5]
         
-        for campaign in campaigns:
-            await db.campaigns.update_one(
-                {"_id": campaign["_id"]},
-                {"$inc": {"impressionCount": 1}}
-            )
-            campaign["id"] = str(campaign["_id"])
-            del campaign["_id"]
-        
-        return campaigns
+        return await record_impressions(campaigns)
     except Exception as e:
         log_error(e, "get_homepage_campaigns")
         raise HTTPException(
@@ -85,6 +47,15 @@ async def get_homepage_campaigns():
             detail="Kampanyalar yüklenemedi"
         )
 
+async def record_impressions(campaigns: list) -> list:
+    """Increment impression counts with one write and return response copies without _id"""
+    if campaigns:
+        await db.campaigns.update_many(
+            {"_id": {"$in": [c["_id"] for c in campaigns]}},
+            {"$inc": {"impressionCount": 1}}
+        )
+    return [{k: v for k, v in c.items() if k != "_id"} for c in campaigns]
+
 @router.post("/{campaign_id}/click")
 async def record_campaign_click(campaign_id: str):
     """Record a click on a campaign"""
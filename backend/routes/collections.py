@@ -1,72 +1,92 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from typing import List, Optional
 from datetime import datetime
-from motor.motor_asyncio import AsyncIOMotorDatabase
 from models.collection import Collection, CollectionCreate, CollectionResponse
-import os
 from bson import ObjectId
+from database import db, catalog_db
+from utils.catalog import get_active_collections, invalidate_collections
+from utils.collection_members import get_page, remove_collection
+from utils.collection_rules import refresh_collection
+from utils.joins import fetch_by_keys
+from utils.projections import resolve_fields, to_projection, trim
 
 router = APIRouter(prefix="/collections", tags=["collections"])
 
-def get_db():
-    from server import db
-    return db
+def _with_count(collection: dict) -> dict:
+    collection.setdefault("restaurantCount", len(collection.get("restaurantIds", [])))
+    return collection
 
 @router.get("/", response_model=List[CollectionResponse], include_in_schema=True)
 async def get_collections(
     category: Optional[str] = None,
     is_active: bool = True,
-    limit: int = Query(default=20, le=100),
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    limit: int = Query(default=20, le=100)
 ):
     """Get all collections"""
+    if is_active:
+        collections = await get_active_collections()
+        if category:
+            collections = [c for c in collections if c.get("category") == category]
+        return collections[:limit]
+    
     query = {"isActive": is_active}
     if category:
         query["category"] = category
     
-    collections = await db.collections.find(query, {"_id": 0}).sort("priority", -1).limit(limit).to_list(length=limit)
+    collections = await catalog_db.collections.find(query, {"_id": 0}).sort("priority", -1).limit(limit).to_list(length=limit)
     
-    # Add restaurant count for each collection
-    for collection in collections:
-        collection["restaurantCount"] = len(collection.get("restaurantIds", []))
-    
-    return collections
+    return [_with_count(collection) for collection in collections]
 
 @router.get("/{collection_id}", response_model=CollectionResponse)
-async def get_collection(collection_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def get_collection(collection_id: str):
     """Get collection by ID"""
-    collection = await db.collections.find_one({"id": collection_id}, {"_id": 0})
+    collection = await catalog_db.collections.find_one({"id": collection_id}, {"_id": 0})
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
     
-    collection["restaurantCount"] = len(collection.get("restaurantIds", []))
-    return collection
+    return _with_count(collection)
 
 @router.get("/{collection_id}/restaurants")
 async def get_collection_restaurants(
     collection_id: str,
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    response: Response,
+    view: str = Query("card", description="card, detail or admin"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields"),
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
 ):
-    """Get restaurants in a collection"""
-    collection = await db.collections.find_one({"id": collection_id}, {"_id": 0})
-    if not collection:
-        raise HTTPException(status_code=404, detail="Collection not found")
+    """Get restaurants in a collection, in collection order, one page at a time"""
+    try:
+        field_names = resolve_fields(view, fields)
+        members, next_cursor = await get_page(collection_id, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not members and after is None:
+        # Empty or unknown; only then is the collection itself looked up
+        if not await catalog_db.collections.find_one({"id": collection_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Collection not found")
     
-    restaurant_ids = collection.get("restaurantIds", [])
-    if not restaurant_ids:
-        return []
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
-    restaurants = await db.restaurants.find(
-        {"id": {"$in": restaurant_ids}},
-        {"_id": 0}
-    ).to_list(length=len(restaurant_ids))
+    # Card fields are stored on the members; other views read the page's restaurants
+    if view == "card":
+        return [trim(member["card"], field_names) for member in members]
     
-    return restaurants
+    restaurant_ids = [member["restaurantId"] for member in members]
+    restaurants = await fetch_by_keys(catalog_db.restaurants, restaurant_ids, to_projection(field_names) if field_names else None)
+    results = []
+    for restaurant_id in restaurant_ids:
+        restaurant = restaurants.get(restaurant_id)
+        if restaurant:
+            restaurant["id"] = str(restaurant.pop("_id"))
+            results.append(restaurant)
+    return results
 
 @router.post("/", response_model=CollectionResponse)
 async def create_collection(
-    collection: CollectionCreate,
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    collection: CollectionCreate
 ):
     """Create a new collection (Admin only)"""
     collection_dict = collection.dict()
@@ -75,16 +95,16 @@ async def create_collection(
     collection_dict["updatedAt"] = datetime.utcnow()
     
     await db.collections.insert_one(collection_dict)
+    collection_dict["restaurantCount"] = await refresh_collection(collection_dict)
+    invalidate_collections()
     
-    result = await db.collections.find_one({"id": collection_dict["id"]}, {"_id": 0})
-    result["restaurantCount"] = len(result.get("restaurantIds", []))
-    return result
+    collection_dict.pop("_id", None)
+    return collection_dict
 
 @router.put("/{collection_id}", response_model=CollectionResponse)
 async def update_collection(
     collection_id: str,
-    collection: CollectionCreate,
-    db: AsyncIOMotorDatabase = Depends(get_db)
+    collection: CollectionCreate
 ):
     """Update a collection (Admin only)"""
     existing = await db.collections.find_one({"id": collection_id})
@@ -98,15 +118,19 @@ async def update_collection(
         {"id": collection_id},
         {"$set": update_dict}
     )
+    refreshed = {"id": collection_id, "restaurantCount": existing.get("restaurantCount", 0), **update_dict}
+    update_dict["restaurantCount"] = await refresh_collection(refreshed)
+    invalidate_collections()
     
-    result = await db.collections.find_one({"id": collection_id}, {"_id": 0})
-    result["restaurantCount"] = len(result.get("restaurantIds", []))
-    return result
+    existing.pop("_id", None)
+    return {**existing, **update_dict}
 
 @router.delete("/{collection_id}")
-async def delete_collection(collection_id: str, db: AsyncIOMotorDatabase = Depends(get_db)):
+async def delete_collection(collection_id: str):
     """Delete a collection (Admin only)"""
     result = await db.collections.delete_one({"id": collection_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Collection not found")
+    await remove_collection(collection_id)
+    invalidate_collections()
     return {"message": "Collection deleted successfully"}
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import Optional
 from models.coupon import CouponUsage
 from utils.security import get_current_user
 from utils.logger import log_request, log_error
+from utils.coupon_engine import CouponError, CouponNotFound, best_coupons, check_coupon, coupon_discount, get_user_coupons
+from utils.joins import id_filter
 from bson import ObjectId
-from datetime import datetime
 from database import db
 
 router = APIRouter(prefix="/coupons", tags=["coupons"])
@@ -14,66 +15,26 @@ async def validate_coupon(
     code: str,
     restaurant_id: Optional[str] = None,
     order_amount: Optional[float] = None,
+    city: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """Validate a coupon code"""
     try:
         log_request(f"/api/coupons/validate/{code}", "GET", current_user["user_id"])
         
-        coupon = await db.coupons.find_one({"code": code.upper()})
+        # Same rules as checkout pricing; served from the coupon and usage caches
+        try:
+            coupon = await check_coupon(code, current_user["user_id"], restaurant_id, order_amount, city)
+        except CouponNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except CouponError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        if not coupon:
-            raise HTTPException(status_code=404, detail="Kupon bulunamadı")
+        discount = coupon_discount(coupon, order_amount) if order_amount else 0
         
-        now = datetime.utcnow()
-        
-        # Check if active
-        if not coupon.get("isActive", True):
-            raise HTTPException(status_code=400, detail="Bu kupon aktif değil")
-        
-        # Check validity period
-        if coupon.get("validFrom") and coupon["validFrom"] > now:
-            raise HTTPException(status_code=400, detail="Bu kupon henüz geçerli değil")
-        
-        if coupon.get("validUntil") and coupon["validUntil"] < now:
-            raise HTTPException(status_code=400, detail="Bu kuponun süresi dolmuş")
-        
-        # Check usage limit
-        if coupon.get("usageLimit") and coupon.get("usedCount", 0) >= coupon["usageLimit"]:
-            raise HTTPException(status_code=400, detail="Bu kuponun kullanım limiti dolmuş")
-        
-        # Check user limit
-        user_usage = await db.coupon_usage.count_documents({
-            "couponId": str(coupon["_id"]),
-            "userId": current_user["user_id"]
-        })
-        if user_usage >= coupon.get("userLimit", 1):
-            raise HTTPException(status_code=400, detail="Bu kuponu zaten kullandınız")
-        
-        # Check minimum order amount
-        if order_amount and coupon.get("minOrderAmount", 0) > order_amount:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Minimum sipariş tutarı {coupon['minOrderAmount']}₺ olmalıdır"
-            )
-        
-        # Check applicable restaurants
-        if coupon.get("applicableRestaurants") and restaurant_id:
-            if restaurant_id not in coupon["applicableRestaurants"]:
-                raise HTTPException(status_code=400, detail="Bu kupon bu restoran için geçerli değil")
-        
-        # Calculate discount
-        discount = 0
-        if order_amount:
-            if coupon["discountType"] == "percentage":
-                discount = order_amount * (coupon["discountValue"] / 100)
-                if coupon.get("maxDiscountAmount"):
-                    discount = min(discount, coupon["maxDiscountAmount"])
-            else:
-                discount = coupon["discountValue"]
-        
-        coupon["id"] = str(coupon["_id"])
-        del coupon["_id"]
+        # The cached document is shared
+        coupon = dict(coupon)
+        coupon["id"] = str(coupon.pop("_id"))
         
         return {
             "valid": True,
@@ -90,41 +51,64 @@ async def validate_coupon(
             detail="Kupon doğrulanamadı"
         )
 
+@router.get("/best")
+async def get_best_coupons(
+    order_amount: float = Query(..., gt=0),
+    restaurant_id: Optional[str] = None,
+    city: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    """Coupons usable on a cart, ranked by discount, from the cached coupon set"""
+    try:
+        ranked, eligible = await best_coupons(current_user["user_id"], restaurant_id, order_amount, city, limit)
+        
+        results = []
+        for entry in ranked:
+            coupon = {key: value for key, value in entry["coupon"].items() if key != "_id"}
+            coupon["id"] = entry["couponId"]
+            results.append({"coupon": coupon, "discount": entry["discount"]})
+        
+        return {
+            "coupons": results,
+            "best": results[0] if results else None,
+            "eligibleCount": eligible
+        }
+    except Exception as e:
+        log_error(e, "get_best_coupons")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Kuponlar yüklenemedi"
+        )
+
 @router.post("/apply")
 async def apply_coupon(
     coupon_data: dict,
     current_user: dict = Depends(get_current_user)
 ):
-    """Apply a coupon to an order (records usage)"""
+    """Confirm a coupon was applied to an order
+
+    Orders redeem their coupon when they are created (create_order); this
+    only reads the order, so calling it again changes nothing.
+    """
     try:
         code = coupon_data.get("code")
         order_id = coupon_data.get("orderId")
-        discount_applied = coupon_data.get("discountApplied", 0)
         
         if not code or not order_id:
             raise HTTPException(status_code=400, detail="Kupon kodu ve sipariş ID gerekli")
         
-        coupon = await db.coupons.find_one({"code": code.upper()})
-        if not coupon:
-            raise HTTPException(status_code=404, detail="Kupon bulunamadı")
-        
-        # Record usage
-        usage = {
-            "couponId": str(coupon["_id"]),
-            "userId": current_user["user_id"],
-            "orderId": order_id,
-            "discountApplied": discount_applied,
-            "usedAt": datetime.utcnow()
-        }
-        await db.coupon_usage.insert_one(usage)
-        
-        # Increment used count
-        await db.coupons.update_one(
-            {"_id": coupon["_id"]},
-            {"$inc": {"usedCount": 1}}
+        # The discount is the one the order was priced and redeemed with
+        order = await db.orders.find_one(
+            {"_id": id_filter(order_id), "userId": current_user["user_id"]},
+            {"couponCode": 1, "discount": 1}
         )
+        if not order:
+            raise HTTPException(status_code=404, detail="Sipariş bulunamadı")
+        if (order.get("couponCode") or "").upper() != code.upper():
+            raise HTTPException(status_code=400, detail="Bu kupon bu siparişte kullanılmadı")
         
-        return {"message": "Kupon başarıyla uygulandı", "discount": discount_applied}
+        return {"message": "Kupon başarıyla uygulandı", "discount": order.get("discount", 0)}
     except HTTPException:
         raise
     except Exception as e:
@@ -135,34 +119,16 @@ async def apply_coupon(
         )
 
 @router.get("/my-coupons")
-async def get_user_coupons(current_user: dict = Depends(get_current_user)):
-    """Get coupons available for the user"""
+async def get_my_coupons(
+    restaurant_id: Optional[str] = None,
+    city: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get coupons available for the user, optionally for a restaurant and city"""
     try:
-        now = datetime.utcnow()
-        
-        # Get all active coupons
-        cursor = db.coupons.find({
-            "isActive": True,
-            "validFrom": {"$lte": now},
-            "validUntil": {"$gte": now}
-        })
-        all_coupons = await cursor.to_list(length=50)
-        
-        available_coupons = []
-        for coupon in all_coupons:
-            # Check if user can still use this coupon
-            user_usage = await db.coupon_usage.count_documents({
-                "couponId": str(coupon["_id"]),
-                "userId": current_user["user_id"]
-            })
-            
-            if user_usage < coupon.get("userLimit", 1):
-                coupon["id"] = str(coupon["_id"])
-                del coupon["_id"]
-                coupon["remainingUses"] = coupon.get("userLimit", 1) - user_usage
-                available_coupons.append(coupon)
-        
-        return available_coupons
+        # Cached coupon set and per-user usage document; no per-coupon queries
+        coupons = await get_user_coupons(current_user["user_id"], restaurant_id, city)
+        return coupons[:50]
     except Exception as e:
         log_error(e, "get_user_coupons")
         raise HTTPException(
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
 import httpx
-import math
-from database import db
+from database import catalog_db
 from utils.logger import log_request, log_error
+from utils.helpers import haversine_distance
+from utils.catalog import get_cities, get_geo_index
+from utils.joins import fetch_by_keys
+from utils.projections import projection_for
 from bson import ObjectId
 
 router = APIRouter(prefix="/geo", tags=["geolocation"])
@@ -11,21 +14,6 @@ router = APIRouter(prefix="/geo", tags=["geolocation"])
 # OpenStreetMap Nominatim API base URL
 NOMINATIM_URL = "https://nominatim.openstreetmap.org"
 
-# Haversine formula to calculate distance between two points
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two points in kilometers"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
-
 @router.get("/search")
 async def search_location(q: str = Query(..., min_length=2), limit: int = Query(5, ge=1, le=10)):
     """Search for locations using OpenStreetMap Nominatim"""
@@ -106,39 +94,36 @@ async def get_nearby_restaurants(
     radius: float = Query(5, ge=0.5, le=50, description="Radius in kilometers"),
     cuisine: Optional[str] = None,
     min_rating: Optional[float] = None,
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    view: str = Query("card", description="card, detail or admin"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields")
 ):
     """Get restaurants within a radius from a point"""
     try:
-        # Get all restaurants
-        query = {}
-        if cuisine:
-            query["cuisine"] = cuisine
-        if min_rating:
-            query["rating"] = {"$gte": min_rating}
+        projection = projection_for(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Candidates within the radius come from the in-memory geo index
+        geo_index = await get_geo_index()
+        candidates = geo_index.nearby(lat, lng, radius, cuisine=cuisine, min_rating=min_rating)[:limit]
         
-        cursor = db.restaurants.find(query)
-        all_restaurants = await cursor.to_list(length=500)
+        # Fetch only the restaurants on the page
+        restaurants = await fetch_by_keys(
+            catalog_db.restaurants, [restaurant_id for _, restaurant_id in candidates], projection
+        )
         
-        # Filter by distance
         nearby = []
-        for restaurant in all_restaurants:
-            coords = restaurant.get("location", {}).get("coordinates", {})
-            if coords and coords.get("lat") and coords.get("lng"):
-                distance = haversine_distance(
-                    lat, lng,
-                    float(coords["lat"]), float(coords["lng"])
-                )
-                if distance <= radius:
-                    restaurant["id"] = str(restaurant["_id"])
-                    del restaurant["_id"]
-                    restaurant["distance"] = round(distance, 2)
-                    nearby.append(restaurant)
+        for distance, restaurant_id in candidates:
+            restaurant = restaurants.get(restaurant_id)
+            if restaurant:
+                restaurant["id"] = str(restaurant["_id"])
+                del restaurant["_id"]
+                restaurant["distance"] = round(distance, 2)
+                nearby.append(restaurant)
         
-        # Sort by distance
-        nearby.sort(key=lambda x: x["distance"])
-        
-        return nearby[:limit]
+        return nearby
     except Exception as e:
         log_error(e, "get_nearby_restaurants")
         raise HTTPException(status_code=500, detail="Failed to fetch nearby restaurants")
@@ -194,13 +179,7 @@ async def get_route(
 async def get_available_cities():
     """Get list of cities with restaurants"""
     try:
-        pipeline = [
-            {"$group": {"_id": "$location.city", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        cities = await db.restaurants.aggregate(pipeline).to_list(100)
-        
-        return [{"city": c["_id"], "restaurantCount": c["count"]} for c in cities if c["_id"]]
+        return await get_cities()
     except Exception as e:
         log_error(e, "get_available_cities")
         raise HTTPException(status_code=500, detail="Failed to fetch cities")
@@ -216,7 +195,7 @@ async def check_delivery_area(
         if not ObjectId.is_valid(restaurant_id):
             raise HTTPException(status_code=400, detail="Invalid restaurant ID")
         
-        restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
+        restaurant = await catalog_db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
         if not restaurant:
             raise HTTPException(status_code=404, detail="Restaurant not found")
         
@@ -1,33 +1,52 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Header, Response
+from typing import List, Optional
 from models.menu import MenuItem, MenuItemResponse
 from utils.logger import log_request, log_error
+from utils.serialization import RawJSONResponse
+from utils.menu_snapshot import get_menu as get_menu_snapshot
 from bson import ObjectId
 
 router = APIRouter(prefix="/menu", tags=["menu"])
 
-from database import db
+# Clients revalidate with If-None-Match; unchanged menus cost a 304
+MENU_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+def _menu_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    # The flat and grouped bodies have different ETags
+    headers = {"ETag": etag, "Cache-Control": MENU_CACHE_CONTROL}
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return RawJSONResponse(body, headers=headers)
 
 @router.get("/{restaurant_id}", response_model=List[MenuItemResponse])
-async def get_menu(restaurant_id: str):
+async def get_menu(restaurant_id: str, if_none_match: Optional[str] = Header(None)):
     """Get menu items for a restaurant"""
     try:
         log_request(f"/api/menu/{restaurant_id}", "GET")
         
-        # Get menu items
-        cursor = db.menu_items.find({"restaurantId": restaurant_id})
-        menu_items = await cursor.to_list(length=1000)
-        
-        # Convert ObjectId to string
-        for item in menu_items:
-            item["id"] = str(item["_id"])
-            del item["_id"]
-        
-        return menu_items
+        # One snapshot read per restaurant, or a cache hit
+        menu = await get_menu_snapshot(restaurant_id)
+        return _menu_response(menu["items"], menu["itemsEtag"], if_none_match)
     
     except Exception as e:
         log_error(e, "get_menu")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch menu"
-        )
\ No newline at end of file
+        )
+
+@router.get("/{restaurant_id}/snapshot")
+async def get_menu_grouped(restaurant_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get a restaurant's menu grouped by category"""
+    try:
+        log_request(f"/api/menu/{restaurant_id}/snapshot", "GET")
+        
+        menu = await get_menu_snapshot(restaurant_id)
+        return _menu_response(menu["grouped"], menu["groupedEtag"], if_none_match)
+    
+    except Exception as e:
+        log_error(e, "get_menu_grouped")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch menu"
+        )
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from models.notification import NotificationCreate
-from utils.security import get_current_user
+from utils.security import get_current_user, get_stream_user
 from utils.logger import log_request, log_error
+from utils.codec import find_with_ids
+from utils.notification_stream import (
+    notification_updates, notification_event, event_key, format_key, parse_key, since_key, catch_up
+)
+from utils.pubsub import sse_event, SSE_HEARTBEAT
+from utils.serialization import dumps
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import db
+import os
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+# Seconds between keep-alive comments on idle streams
+STREAM_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Live events held per stream before falling back to a catch-up query
+STREAM_BUFFER = int(os.getenv("NOTIFICATION_STREAM_BUFFER", "50"))
+
 @router.get("/")
 async def get_user_notifications(
     unread_only: bool = Query(False),
@@ -21,12 +34,7 @@ async def get_user_notifications(
         if unread_only:
             query["isRead"] = False
         
-        cursor = db.notifications.find(query).sort("createdAt", -1).limit(limit)
-        notifications = await cursor.to_list(length=limit)
-        
-        for notif in notifications:
-            notif["id"] = str(notif["_id"])
-            del notif["_id"]
+        notifications = await find_with_ids(db.notifications, query, sort=[("createdAt", -1)], limit=limit)
         
         # Get unread count
         unread_count = await db.notifications.count_documents({
@@ -137,3 +145,62 @@ async def get_unread_count(current_user: dict = Depends(get_current_user)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Bildirim sayısı alınamadı"
         )
+
+@router.get("/stream")
+async def stream_notifications(
+    since: Optional[datetime] = Query(None, description="Also send notifications created since this time"),
+    last_event_id: Optional[str] = Header(None),
+    current_user: dict = Depends(get_stream_user)
+):
+    """Server-Sent Events stream of the user's new notifications, replacing unread-count polling"""
+    user_id = current_user["user_id"]
+    # Subscribe before reading so nothing inserted meanwhile is missed
+    subscription = notification_updates.subscribe(user_id, buffer=STREAM_BUFFER)
+    connected_at = datetime.utcnow()
+    try:
+        unread_count = await db.notifications.count_documents({"userId": user_id, "isRead": False})
+    except Exception as e:
+        notification_updates.unsubscribe(subscription)
+        log_error(e, "stream_notifications")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Bildirimler yüklenemedi"
+        )
+    
+    # EventSource resends the last id it saw when it reconnects
+    last_key = parse_key(last_event_id) or (since_key(since.replace(tzinfo=None)) if since else None)
+    
+    def event(doc: dict) -> bytes:
+        return sse_event(dumps(notification_event(doc)).decode(), event="notification", event_id=format_key(event_key(doc)))
+    
+    async def events():
+        nonlocal last_key
+        try:
+            yield sse_event(dumps({"unreadCount": unread_count}).decode(), event="unread")
+            if last_key is not None:
+                for doc in await catch_up(user_id, last_key):
+                    last_key = event_key(doc)
+                    yield event(doc)
+            while True:
+                docs = await subscription.get(timeout=STREAM_HEARTBEAT)
+                if subscription.missed:
+                    # Fell behind a burst: reread from the last delivered event
+                    subscription.missed = 0
+                    docs = await catch_up(user_id, last_key or since_key(connected_at - timedelta(seconds=5)))
+                elif not docs:
+                    yield SSE_HEARTBEAT
+                    continue
+                for doc in docs:
+                    key = event_key(doc)
+                    if last_key is not None and key <= last_key:
+                        continue
+                    last_key = key
+                    yield event(doc)
+        finally:
+            notification_updates.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
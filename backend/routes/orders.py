@@ -1,8 +1,18 @@
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import StreamingResponse
 from typing import List
 from models.order import Order, OrderCreate, OrderResponse
-from utils.security import get_current_user
+from utils.pricing import price_order, PricingError
+from utils.coupon_engine import CouponError, redeem, release_redemption
+from utils.ids import generate_order_number, insert_with_code
+from utils.security import get_current_user, get_stream_user
+from utils.joins import id_filter
+from utils.order_stream import order_updates, order_event, FINAL_STATUSES
+from utils.pubsub import sse_event, SSE_HEARTBEAT
+import os
 from utils.logger import log_request, log_error
+from utils.serialization import model_projection, dumps, RawJSONResponse
+from utils.codec import find_json
 from bson import ObjectId
 from datetime import datetime
 
@@ -10,43 +20,54 @@ router = APIRouter(prefix="/orders", tags=["orders"])
 
 from database import db
 
+ORDER_FIELDS = model_projection(OrderResponse)
+
+# Seconds between keep-alive comments on idle streams
+STREAM_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
     """Create a new order"""
     try:
         log_request("/api/orders", "POST", current_user["user_id"])
         
+        # Price the order from the menu index and settings; client amounts are ignored
+        try:
+            priced = await price_order(
+                order_data.restaurantId, order_data.items, current_user["user_id"], order_data.couponCode
+            )
+        except PricingError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
         # Create order
         order = Order(
             userId=current_user["user_id"],
             restaurantId=order_data.restaurantId,
-            items=order_data.items,
             deliveryAddress=order_data.deliveryAddress,
             paymentMethod=order_data.paymentMethod,
-            subtotal=order_data.subtotal,
-            deliveryFee=order_data.deliveryFee,
-            serviceFee=order_data.serviceFee,
-            total=order_data.total,
-            status="confirmed"
+            status="confirmed",
+            **priced
         )
         
-        # Insert order
-        order_dict = order.dict(by_alias=True)
-        result = await db.orders.insert_one(order_dict)
-        order_id = str(result.inserted_id)
+        # Pricing only checked the coupon against cached counters; redeeming it
+        # enforces usageLimit, userLimit and single-use codes atomically
+        if order.couponCode:
+            try:
+                await redeem(order.couponCode, current_user["user_id"], order.id, order.discount)
+            except CouponError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         
-        # Get created order
-        created_order = await db.orders.find_one({"_id": result.inserted_id})
-        if not created_order:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to retrieve created order"
-            )
-            
-        created_order["id"] = str(created_order["_id"])
-        del created_order["_id"]
+        # Insert order; the inserted document is the response, no re-read
+        order_dict = order.dict(by_alias=True)
+        try:
+            await insert_with_code(db.orders, order_dict, "orderNumber", generate_order_number)
+        except Exception:
+            if order.couponCode:
+                await release_redemption(order.couponCode, current_user["user_id"], order.id)
+            raise
+        order_dict["id"] = order_dict.pop("_id")
         
-        return created_order
+        return order_dict
     
     except HTTPException:
         raise
@@ -64,15 +85,13 @@ async def get_orders(current_user: dict = Depends(get_current_user)):
         log_request("/api/orders", "GET", current_user["user_id"])
         
         # Get orders
-        cursor = db.orders.find({"userId": current_user["user_id"]}).sort("createdAt", -1)
-        orders = await cursor.to_list(length=1000)
-        
-        # Convert ObjectId to string
-        for order in orders:
-            order["id"] = str(order["_id"])
-            del order["_id"]
-        
-        return orders
+        # Documents written by create_order already match OrderResponse, so they
+        # go from BSON to JSON without validation
+        body = await find_json(
+            db.orders, {"userId": current_user["user_id"]}, ORDER_FIELDS,
+            sort=[("createdAt", -1)], limit=1000
+        )
+        return RawJSONResponse(body)
     
     except Exception as e:
         log_error(e, "get_orders")
@@ -93,8 +112,9 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
                 detail="Invalid order ID"
             )
         
+        # Orders are stored with string ids
         order = await db.orders.find_one({
-            "_id": ObjectId(order_id),
+            "_id": id_filter(order_id),
             "userId": current_user["user_id"]
         })
         
@@ -116,4 +136,51 @@ async def get_order(order_id: str, current_user: dict = Depends(get_current_user
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to fetch order"
-        )
\ No newline at end of file
+        )
+@router.get("/{order_id}/stream")
+async def stream_order_status(order_id: str, current_user: dict = Depends(get_stream_user)):
+    """Server-Sent Events stream of an order's status until it is delivered or cancelled"""
+    user_id = current_user["user_id"]
+    
+    try:
+        order = await db.orders.find_one(
+            {"_id": id_filter(order_id), "userId": user_id},
+            {field: 1 for field in ("status", "updatedAt", "confirmedAt", "deliveredAt", "cancelledAt", "cancellationReason")}
+        )
+    except Exception as e:
+        log_error(e, "stream_order_status")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch order"
+        )
+    if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    
+    order_id = str(order["_id"])
+    # Subscribe before sending the snapshot so no update falls in between
+    subscription = order_updates.subscribe(order_id)
+    
+    async def events():
+        try:
+            # Current state first; reconnecting clients need nothing else to catch up
+            snapshot = order_event(order_id, order)
+            yield sse_event(dumps(snapshot).decode(), event="status")
+            if snapshot.get("status") in FINAL_STATUSES:
+                return
+            while True:
+                updates = await subscription.get(timeout=STREAM_HEARTBEAT)
+                if not updates:
+                    yield SSE_HEARTBEAT
+                    continue
+                latest = updates[-1]
+                yield sse_event(dumps(latest).decode(), event="status")
+                if latest.get("status") in FINAL_STATUSES:
+                    return
+        finally:
+            order_updates.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -3,16 +3,21 @@ from typing import Optional, List
 from models.reservation import ReservationCreate, Reservation
 from utils.security import get_current_user
 from utils.logger import log_request, log_error
+from utils.joins import batch_join, fetch_by_keys
+from utils.reservation_slots import (
+    HOLDING_STATUSES, MAX_RANGE_DAYS, claim_slot, release_reservation,
+    normalize_slot, parse_date, get_availability_range, next_available_slots
+)
+from pymongo import ReturnDocument
 from bson import ObjectId
 from datetime import datetime, timedelta
+from utils.ids import generate_reservation_code, insert_with_code
 from database import db
-import random
-import string
 
 router = APIRouter(prefix="/reservations", tags=["reservations"])
 
-def generate_reservation_code():
-    return 'RES-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+# Restaurant fields needed to compute slot capacity
+CAPACITY_FIELDS = {"maxReservationsPerSlot": 1, "maxCoversPerSlot": 1}
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_reservation(
@@ -27,6 +32,12 @@ async def create_reservation(
         if not ObjectId.is_valid(reservation_data.restaurantId):
             raise HTTPException(status_code=400, detail="Invalid restaurant ID")
         
+        # One spelling per slot, so capacity is always counted on the same inventory document
+        try:
+            reservation_data.date, reservation_data.time = normalize_slot(reservation_data.date, reservation_data.time)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Geçersiz rezervasyon tarihi veya saati")
+        
         restaurant = await db.restaurants.find_one({"_id": ObjectId(reservation_data.restaurantId)})
         if not restaurant:
             raise HTTPException(status_code=404, detail="Restaurant not found")
@@ -36,16 +47,9 @@ async def create_reservation(
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Check availability (basic check - can be expanded)
-        existing = await db.reservations.count_documents({
-            "restaurantId": reservation_data.restaurantId,
-            "date": reservation_data.date,
-            "time": reservation_data.time,
-            "status": {"$in": ["pending", "confirmed"]}
-        })
-        
-        # Max 5 reservations per time slot (simplified)
-        if existing >= 5:
+        # Claim capacity atomically before writing the reservation
+        claimed = await claim_slot(restaurant, reservation_data.date, reservation_data.time, reservation_data.partySize)
+        if not claimed:
             raise HTTPException(
                 status_code=400, 
                 detail="Bu saat için rezervasyon dolu. Lütfen başka bir saat seçin."
@@ -61,12 +65,14 @@ async def create_reservation(
         reservation_dict["createdAt"] = datetime.utcnow()
         reservation_dict["updatedAt"] = datetime.utcnow()
         
-        result = await db.reservations.insert_one(reservation_dict)
-        reservation_id = str(result.inserted_id)
+        try:
+            await insert_with_code(db.reservations, reservation_dict, "reservationCode", generate_reservation_code)
+        except Exception:
+            await release_reservation(reservation_dict)
+            raise
         
-        created = await db.reservations.find_one({"_id": ObjectId(reservation_id)})
-        created["id"] = str(created["_id"])
-        del created["_id"]
+        created = reservation_dict
+        created["id"] = str(created.pop("_id"))
         created["restaurantName"] = restaurant["name"]
         
         return created
@@ -93,16 +99,15 @@ async def get_user_reservations(
         cursor = db.reservations.find(query).sort("createdAt", -1)
         reservations = await cursor.to_list(length=50)
         
+        # Get restaurant names and images
+        await batch_join(reservations, db.restaurants, "restaurantId", "restaurant", {"name": 1, "image": 1})
+        
         for res in reservations:
             res["id"] = str(res["_id"])
             del res["_id"]
-            # Get restaurant name
-            try:
-                restaurant = await db.restaurants.find_one({"_id": ObjectId(res["restaurantId"])})
-                res["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
-                res["restaurantImage"] = restaurant.get("image", "") if restaurant else ""
-            except:
-                res["restaurantName"] = "Unknown"
+            restaurant = res.pop("restaurant")
+            res["restaurantName"] = restaurant["name"] if restaurant else "Unknown"
+            res["restaurantImage"] = restaurant.get("image", "") if restaurant else ""
         
         return reservations
     except Exception as e:
@@ -112,6 +117,30 @@ async def get_user_reservations(
             detail="Rezervasyonlar yüklenemedi"
         )
 
+@router.get("/next-available")
+async def get_next_available_slots(
+    restaurant_ids: str = Query(..., description="Comma-separated restaurant IDs"),
+    days: int = Query(14, ge=1, le=MAX_RANGE_DAYS)
+):
+    """First bookable slot for each restaurant, for listing badges"""
+    try:
+        ids = [rid for rid in dict.fromkeys(r.strip() for r in restaurant_ids.split(",")) if rid]
+        if len(ids) > 100:
+            raise HTTPException(status_code=400, detail="At most 100 restaurants per request")
+        
+        restaurants = await fetch_by_keys(db.restaurants, ids, CAPACITY_FIELDS)
+        slots = await next_available_slots(restaurants.values(), days)
+        
+        return {"days": days, "restaurants": {rid: slots.get(rid) for rid in ids if rid in restaurants}}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error(e, "get_next_available_slots")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Uygunluk bilgisi yüklenemedi"
+        )
+
 @router.get("/{reservation_id}")
 async def get_reservation_details(
     reservation_id: str,
@@ -168,17 +197,6 @@ async def cancel_reservation(
         if not ObjectId.is_valid(reservation_id):
             raise HTTPException(status_code=400, detail="Invalid reservation ID")
         
-        reservation = await db.reservations.find_one({
-            "_id": ObjectId(reservation_id),
-            "userId": current_user["user_id"]
-        })
-        
-        if not reservation:
-            raise HTTPException(status_code=404, detail="Reservation not found")
-        
-        if reservation["status"] in ["cancelled", "completed"]:
-            raise HTTPException(status_code=400, detail="Bu rezervasyon iptal edilemez")
-        
         update_data = {
             "status": "cancelled",
             "cancelledAt": datetime.utcnow(),
@@ -188,11 +206,28 @@ async def cancel_reservation(
         if reason_data and reason_data.get("reason"):
             update_data["cancellationReason"] = reason_data["reason"]
         
-        await db.reservations.update_one(
-            {"_id": ObjectId(reservation_id)},
-            {"$set": update_data}
+        # The status filter makes a concurrent double cancel release capacity only once
+        reservation = await db.reservations.find_one_and_update(
+            {
+                "_id": ObjectId(reservation_id),
+                "userId": current_user["user_id"],
+                "status": {"$nin": ["cancelled", "completed"]}
+            },
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
+        if not reservation:
+            exists = await db.reservations.count_documents(
+                {"_id": ObjectId(reservation_id), "userId": current_user["user_id"]}, limit=1
+            )
+            if not exists:
+                raise HTTPException(status_code=404, detail="Reservation not found")
+            raise HTTPException(status_code=400, detail="Bu rezervasyon iptal edilemez")
+        
+        if reservation["status"] in HOLDING_STATUSES:
+            await release_reservation(reservation)
+        
         return {"message": "Rezervasyon iptal edildi"}
     except HTTPException:
         raise
@@ -213,50 +248,68 @@ async def get_restaurant_availability(
         if not ObjectId.is_valid(restaurant_id):
             raise HTTPException(status_code=400, detail="Invalid restaurant ID")
         
-        restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
+        try:
+            day = parse_date(date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+        
+        restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)}, CAPACITY_FIELDS)
         if not restaurant:
             raise HTTPException(status_code=404, detail="Restaurant not found")
         
-        # Define time slots (11:00 to 22:00, every 30 minutes)
-        time_slots = []
-        for hour in range(11, 23):
-            for minute in ["00", "30"]:
-                time_slots.append(f"{hour:02d}:{minute}")
+        # Held capacity comes from the slot inventory, not a scan of reservations
+        days = await get_availability_range(restaurant, day, day)
+        availability = days[0]["timeSlots"]
         
-        # Get existing reservations for this date
-        reservations = await db.reservations.find({
+        return {
             "restaurantId": restaurant_id,
             "date": date,
-            "status": {"$in": ["pending", "confirmed"]}
-        }).to_list(100)
+            "timeSlots": availability
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_error(e, "get_restaurant_availability")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Uygunluk bilgisi yüklenemedi"
+        )
+
+@router.get("/restaurant/{restaurant_id}/availability/range")
+async def get_restaurant_availability_range(
+    restaurant_id: str,
+    date_from: str = Query(..., alias="from", description="First date, YYYY-MM-DD"),
+    date_to: str = Query(..., alias="to", description="Last date (inclusive), YYYY-MM-DD")
+):
+    """Per-slot availability for every day in a range (up to 60 days), for booking calendars"""
+    try:
+        if not ObjectId.is_valid(restaurant_id):
+            raise HTTPException(status_code=400, detail="Invalid restaurant ID")
         
-        # Count reservations per time slot
-        slot_counts = {}
-        for res in reservations:
-            time = res.get("time")
-            slot_counts[time] = slot_counts.get(time, 0) + 1
+        try:
+            start, end = parse_date(date_from), parse_date(date_to)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
         
-        # Max capacity per slot (can be customized per restaurant)
-        max_per_slot = restaurant.get("maxReservationsPerSlot", 5)
+        if end < start:
+            raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
         
-        availability = []
-        for slot in time_slots:
-            current = slot_counts.get(slot, 0)
-            availability.append({
-                "time": slot,
-                "available": max_per_slot - current,
-                "isAvailable": current < max_per_slot
-            })
+        restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)}, CAPACITY_FIELDS)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
         
         return {
             "restaurantId": restaurant_id,
-            "date": date,
-            "timeSlots": availability
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "days": await get_availability_range(restaurant, start, end)
         }
     except HTTPException:
         raise
     except Exception as e:
-        log_error(e, "get_restaurant_availability")
+        log_error(e, "get_restaurant_availability_range")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Uygunluk bilgisi yüklenemedi"
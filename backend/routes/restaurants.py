@@ -3,11 +3,15 @@ from typing import Optional, List
 from models.restaurant import Restaurant, RestaurantResponse
 from utils.helpers import paginate
 from utils.logger import log_request, log_error
+from utils.catalog import get_default_restaurant_listing
+from utils.projections import resolve_fields, to_projection, trim
+from utils.serialization import trusted_response
+from utils.codec import find_with_ids
 from bson import ObjectId
 
 router = APIRouter(prefix="/restaurants", tags=["restaurants"])
 
-from database import db
+from database import catalog_db
 
 @router.get("", response_model=dict)
 async def get_restaurants(
@@ -19,13 +23,27 @@ async def get_restaurants(
     lng: Optional[float] = Query(None, description="User longitude for nearby search"),
     max_distance: Optional[float] = Query(None, ge=0, le=50, description="Max distance in km"),
     feature: Optional[str] = Query(None, description="Filter by feature tag"),
+    view: str = Query("card", description="card, detail or admin"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100)
 ):
     """Get list of restaurants with filters"""
+    try:
+        field_names = resolve_fields(view, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     try:
         log_request("/api/restaurants", "GET")
         
+        # Unfiltered listing (home screen) is served from the warm catalog cache
+        if not any([city, cuisine, search, min_rating, feature]) and lat is None and lng is None:
+            result = paginate(await get_default_restaurant_listing(view), page, page_size)
+            if fields:
+                result["items"] = [trim(r, field_names) for r in result["items"]]
+            return trusted_response(result)
+        
         # Build query
         query = {}
         
@@ -55,15 +73,11 @@ async def get_restaurants(
                 {"dietaryOptions": {"$regex": feature, "$options": "i"}}
             ]
         
-        # Get restaurants
-        cursor = db.restaurants.find(query)
-        restaurants = await cursor.to_list(length=1000)
+        # Get restaurants; rating and coordinates are fetched for sorting and distance
+        projection = to_projection(field_names, extra=["rating", "location.coordinates", "deliveryRadius"])
+        restaurants = await find_with_ids(catalog_db.restaurants, query, projection, limit=1000)
         
-        # Convert ObjectId to string and remove _id
         for restaurant in restaurants:
-            restaurant["id"] = str(restaurant["_id"])
-            del restaurant["_id"]
-            
             # Calculate distance if lat/lng provided
             if lat is not None and lng is not None and restaurant.get("location", {}).get("coordinates"):
                 coords = restaurant["location"]["coordinates"]
@@ -96,8 +110,9 @@ async def get_restaurants(
         
         # Paginate results
         result = paginate(restaurants, page, page_size)
+        result["items"] = [trim(r, field_names) for r in result["items"]]
         
-        return result
+        return trusted_response(result)
     
     except Exception as e:
         log_error(e, "get_restaurants")
@@ -112,7 +127,7 @@ async def get_restaurant_by_slug(slug: str):
     try:
         log_request(f"/api/restaurants/{slug}", "GET")
         
-        restaurant = await db.restaurants.find_one({"slug": slug})
+        restaurant = await catalog_db.restaurants.find_one({"slug": slug})
         
         if not restaurant:
             raise HTTPException(
@@ -141,10 +156,10 @@ async def get_restaurant_by_id(restaurant_id: str):
         log_request(f"/api/restaurants/id/{restaurant_id}", "GET")
         
         # Try to find by 'id' field first (string), then by '_id' (ObjectId)
-        restaurant = await db.restaurants.find_one({"id": restaurant_id})
+        restaurant = await catalog_db.restaurants.find_one({"id": restaurant_id})
         
         if not restaurant and ObjectId.is_valid(restaurant_id):
-            restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
+            restaurant = await catalog_db.restaurants.find_one({"_id": ObjectId(restaurant_id)})
         
         if not restaurant:
             raise HTTPException(
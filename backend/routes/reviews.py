@@ -3,12 +3,18 @@ from typing import List
 from models.review import Review, ReviewCreate, ReviewResponse
 from utils.security import get_current_user
 from utils.logger import log_request, log_error
+from utils.catalog import invalidate_restaurants
+from utils.collection_members import restaurant_changed
+from utils.serialization import model_projection, RawJSONResponse
+from utils.codec import find_json
 from bson import ObjectId
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
 from database import db
 
+REVIEW_FIELDS = model_projection(ReviewResponse)
+
 @router.post("", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
 async def create_review(review_data: ReviewCreate, current_user: dict = Depends(get_current_user)):
     """Create a new review"""
@@ -55,15 +61,11 @@ async def get_reviews(restaurant_id: str):
         log_request(f"/api/reviews/{restaurant_id}", "GET")
         
         # Get reviews
-        cursor = db.reviews.find({"restaurantId": restaurant_id}).sort("createdAt", -1)
-        reviews = await cursor.to_list(length=1000)
-        
-        # Convert ObjectId to string
-        for review in reviews:
-            review["id"] = str(review["_id"])
-            del review["_id"]
-        
-        return reviews
+        body = await find_json(
+            db.reviews, {"restaurantId": restaurant_id}, REVIEW_FIELDS,
+            sort=[("createdAt", -1)], limit=1000
+        )
+        return RawJSONResponse(body)
     
     except Exception as e:
         log_error(e, "get_reviews")
@@ -89,5 +91,7 @@ async def update_restaurant_rating(restaurant_id: str):
                 {"_id": ObjectId(restaurant_id)},
                 {"$set": {"rating": avg_rating, "reviewCount": len(reviews)}}
             )
+            invalidate_restaurants()
+            await restaurant_changed(restaurant_id)
     except Exception as e:
         log_error(e, "update_restaurant_rating")
\ No newline at end of file
@@ -4,6 +4,8 @@ import os
 from dotenv import load_dotenv
 from bson import ObjectId
 from datetime import datetime
+from utils.collection_members import rebuild_all
+from utils.collection_rules import materialize_all
 
 load_dotenv()
 
@@ -24,6 +26,7 @@ async def seed_collections():
             "description": "Şu an en popüler restoranlar",
             "image": "https://images.unsplash.com/photo-1555939594-58d7cb561ad1?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"sort": "popular", "limit": 20},
             "category": "trending",
             "isActive": True,
             "priority": 100,
@@ -36,6 +39,7 @@ async def seed_collections():
             "description": "Yeni eklenen restoranlar",
             "image": "https://images.unsplash.com/photo-1414235077428-338989a2e8c0?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"sort": "newest", "limit": 20},
             "category": "new",
             "isActive": True,
             "priority": 90,
@@ -48,6 +52,7 @@ async def seed_collections():
             "description": "İndirimli restoranlar",
             "image": "https://images.unsplash.com/photo-1504674900247-0877df9cc836?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"features": ["hasActiveOffer"], "sort": "rating", "limit": 30},
             "category": "deals",
             "isActive": True,
             "priority": 85,
@@ -60,12 +65,26 @@ async def seed_collections():
             "description": "4.5+ puan alan restoranlar",
             "image": "https://images.unsplash.com/photo-1517248135467-4c7edcad34c4?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"minRating": 4.5, "sort": "rating", "limit": 30},
             "category": "top_rated",
             "isActive": True,
             "priority": 80,
             "createdAt": datetime.utcnow(),
             "updatedAt": datetime.utcnow()
         },
+        {
+            "id": str(ObjectId()),
+            "title": "İstanbul'un En İyileri",
+            "description": "İstanbul'da en yüksek puan alan restoranlar",
+            "image": "https://images.unsplash.com/photo-1517248135467-4c7edcad34c4?w=400&h=200&fit=crop",
+            "restaurantIds": [],
+            "rule": {"city": "İstanbul", "minRating": 4.0, "sort": "rating", "limit": 20},
+            "category": "top_rated",
+            "isActive": True,
+            "priority": 78,
+            "createdAt": datetime.utcnow(),
+            "updatedAt": datetime.utcnow()
+        },
         {
             "id": str(ObjectId()),
             "title": "Hızlı Teslimat",
@@ -96,6 +115,7 @@ async def seed_collections():
             "description": "Bitki bazlı lezzetler",
             "image": "https://images.unsplash.com/photo-1512621776951-a57141f2eefd?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"features": ["vegetarian"], "sort": "rating", "limit": 30},
             "category": "vegetarian",
             "isActive": True,
             "priority": 65,
@@ -108,6 +128,7 @@ async def seed_collections():
             "description": "Gece geç saatlere kadar açık",
             "image": "https://images.unsplash.com/photo-1466978913421-dad2ebd01d17?w=400&h=200&fit=crop",
             "restaurantIds": [],
+            "rule": {"features": ["lateNight"], "sort": "popular", "limit": 30},
             "category": "nightlife",
             "isActive": True,
             "priority": 60,
@@ -117,13 +138,14 @@ async def seed_collections():
     ]
     
     # Get some restaurant IDs to populate collections
-    restaurants = await db.restaurants.find({}, {"_id": 0, "id": 1}).limit(20).to_list(length=20)
-    restaurant_ids = [r["id"] for r in restaurants]
+    restaurants = await db.restaurants.find({}, {"_id": 1}).limit(20).to_list(length=20)
+    restaurant_ids = [str(r["_id"]) for r in restaurants]
     
-    # Distribute restaurants across collections
-    for i, collection in enumerate(collections_data):
+    # Distribute restaurants across the curated collections; rule-based ones are materialized below
+    curated = [collection for collection in collections_data if not collection.get("rule")]
+    for i, collection in enumerate(curated):
         # Assign 3-5 restaurants per collection
-        start_idx = (i * 3) % len(restaurant_ids)
+        start_idx = (i * 3) % max(len(restaurant_ids), 1)
         end_idx = min(start_idx + 5, len(restaurant_ids))
         collection["restaurantIds"] = restaurant_ids[start_idx:end_idx]
     
@@ -131,6 +153,13 @@ async def seed_collections():
         await db.collections.insert_many(collections_data)
         print(f"✅ Seeded {len(collections_data)} collections")
     
+    # Materialize the member cards the collection pages read
+    await db.collection_members.delete_many({})
+    count = await rebuild_all()
+    print(f"✅ Synced members of {count} curated collections")
+    count = await materialize_all()
+    print(f"✅ Materialized {count} rule-based collections")
+    
     client.close()
 
 if __name__ == "__main__":
@@ -180,6 +180,7 @@ async def seed_data():
         print("🗑️  Clearing existing data...")
         await db.restaurants.delete_many({})
         await db.menu_items.delete_many({})
+        await db.menu_snapshots.delete_many({})
         
         # Insert restaurants
         print("🍽️  Inserting restaurants...")
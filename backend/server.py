@@ -1,114 +1,183 @@
 from fastapi import FastAPI, APIRouter
-from fastapi.middleware.gzip import GZipMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import Response, JSONResponse
 from starlette.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from importlib import import_module
+from pathlib import Path
+from dotenv import load_dotenv
+import asyncio
 import os
 import logging
-from pathlib import Path
-
-# Import database
-from database import db, client
-
-# Import routes
-from routes import auth, restaurants, menu, orders, reviews, user, admin, geo, coupons, campaigns, reservations, notifications, collections
 
+# Modules read their settings (SECRET_KEY, DB_*, DEBUG, ...) when they are
+# imported, so .env is loaded before create_app imports any of them
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create the main app without a prefix
-app = FastAPI(
-    title="Yemek Nerede Yenir API",
-    description="Food delivery platform API - Zomato Clone",
-    version="1.0.0"
-)
-
-# Add GZip compression for performance
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
-
-# Health check
-@api_router.get("/")
-async def root():
-    return {
-        "status": "healthy",
-        "message": "Yemek Nerede Yenir API",
-        "version": "1.0.0"
-    }
-
-@api_router.get("/health")
-async def health_check():
-    try:
-        # Check database connection
-        await db.command("ping")
-        return {"status": "healthy", "database": "connected"}
-    except Exception as e:
-        return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
-
-# Include routers
-api_router.include_router(auth.router)
-api_router.include_router(restaurants.router)
-api_router.include_router(menu.router)
-api_router.include_router(orders.router)
-api_router.include_router(reviews.router)
-api_router.include_router(user.router)
-api_router.include_router(admin.router)
-api_router.include_router(geo.router)
-api_router.include_router(coupons.router)
-api_router.include_router(campaigns.router)
-api_router.include_router(reservations.router)
-api_router.include_router(notifications.router)
-api_router.include_router(collections.router)
-
-# Include the main router in the app
-app.include_router(api_router)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Startup event
-@app.on_event("startup")
-async def startup_db_client():
+# Routers mounted under /api, imported when the app is built rather than when
+# this module is imported
+ROUTERS = [
+    "auth", "restaurants", "menu", "orders", "reviews", "user", "admin",
+    "geo", "coupons", "campaigns", "reservations", "notifications", "collections",
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown of background components"""
+    from database import db, client, analytics_client
+    from utils.logger import configure_logging, shutdown_logging
+    from utils.db_monitor import explain_worker, EXPLAIN_SAMPLE_RATE
+    from utils.health import monitor, warm_up
+    from utils.order_stream import watcher as order_watcher
+    from utils.notification_stream import watcher as notification_watcher
+    from utils.collection_rules import run_materializer
+    from utils.ids import set_worker_id
+    from utils.leases import hold_worker_id, lease_worker_id
+    # Registers the catalog cache warmers
+    import utils.catalog  # noqa: F401
+
+    configure_logging()
     logger.info("Starting up...")
-    # Create indexes for performance
+
+    # A worker number of our own for order and reservation codes; without one
+    # (MongoDB unreachable) codes use a random number until the lease succeeds
+    try:
+        worker_id = await asyncio.wait_for(lease_worker_id(), timeout=10)
+        set_worker_id(worker_id)
+        logger.info("Generating codes as worker %d", worker_id)
+    except Exception as e:
+        worker_id = None
+        logger.warning(f"Could not lease a worker number: {e}")
+
+    # Readiness comes from the background monitor and the warm-up task;
+    # neither blocks startup, /api/ready reports when both are done
+    tasks = [
+        asyncio.create_task(monitor.run(db)),
+        asyncio.create_task(warm_up()),
+        # Order status and notification push for SSE clients
+        asyncio.create_task(order_watcher.run(db)),
+        asyncio.create_task(notification_watcher.run(db)),
+        # Rule-based collections; one worker holds the lease and does the work
+        asyncio.create_task(run_materializer()),
+        asyncio.create_task(hold_worker_id(worker_id)),
+    ]
+    if EXPLAIN_SAMPLE_RATE > 0:
+        tasks.append(asyncio.create_task(explain_worker(client)))
+    # Indexes are declared in utils/indexes.py and created by `manage_indexes.py sync`
+    # as a deploy step. AUTO_SYNC_INDEXES=true (local development) also creates
+    # missing ones in the background, without holding up startup
+    if os.getenv("AUTO_SYNC_INDEXES", "false").lower() in ("1", "true", "yes"):
+        tasks.append(asyncio.create_task(sync_indexes_in_background(db)))
+
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        client.close()
+        analytics_client.close()
+        logger.info("Shutting down...")
+        shutdown_logging()
+
+
+async def sync_indexes_in_background(db):
+    from utils.indexes import sync_indexes
+
     try:
-        await db.users.create_index("email", unique=True)
-        await db.restaurants.create_index("slug", unique=True)
-        await db.restaurants.create_index("location.city")
-        await db.restaurants.create_index("cuisine")
-        await db.restaurants.create_index("tags")
-        await db.menu_items.create_index("restaurantId")
-        await db.orders.create_index("userId")
-        await db.orders.create_index("orderNumber", unique=True)
-        await db.reviews.create_index("restaurantId")
-        await db.reviews.create_index("userId")
-        # New indexes for new collections
-        await db.coupons.create_index("code", unique=True)
-        await db.campaigns.create_index("isActive")
-        await db.api_keys.create_index("key", unique=True)
-        await db.reservations.create_index("reservationCode", unique=True)
-        await db.reservations.create_index("restaurantId")
-        await db.notifications.create_index("userId")
-        await db.restaurants.create_index([("location.coordinates.lat", 1), ("location.coordinates.lng", 1)])
-        logger.info("Database indexes created successfully")
+        await sync_indexes(db)
+        logger.info("Database indexes are in sync")
     except Exception as e:
-        logger.warning(f"Index creation warning: {e}")
+        logger.warning(f"Index sync warning: {e}")
+
+
+def create_app() -> FastAPI:
+    """Build the application: middleware, core endpoints and routers"""
+    from utils.metrics import MetricsMiddleware, ResponseSizeMiddleware, REGISTRY, CONTENT_TYPE
+    from utils.db_monitor import DBStatsMiddleware
+    from utils.health import monitor, is_ready, readiness
+    from utils.serialization import ORJSONResponse
+    from utils.compression import CompressionMiddleware
+
+    app = FastAPI(
+        title="Yemek Nerede Yenir API",
+        description="Food delivery platform API - Zomato Clone",
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+
+    # Attribute MongoDB commands to the request that issued them
+    app.add_middleware(DBStatsMiddleware)
+
+    # Measure response bytes before compression
+    app.add_middleware(ResponseSizeMiddleware)
+
+    # br/zstd/gzip with cached variants per ETag, and 304s for unchanged bodies
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Request metrics (outermost, so it sees compressed sizes and final status codes)
+    app.add_middleware(MetricsMiddleware)
+
+    # Create a router with the /api prefix
+    api_router = APIRouter(prefix="/api")
+
+    # Health check
+    @api_router.get("/")
+    async def root():
+        return {
+            "status": "healthy",
+            "message": "Yemek Nerede Yenir API",
+            "version": "1.0.0"
+        }
+
+    @api_router.get("/health")
+    async def health_check():
+        # Database state comes from the background monitor instead of a ping per probe
+        snapshot = monitor.snapshot()
+        return {"status": "healthy" if monitor.healthy else "unhealthy", **snapshot}
+
+    @api_router.get("/live")
+    async def liveness():
+        """Process is up and serving requests"""
+        return {"status": "alive"}
+
+    @api_router.get("/ready")
+    async def readiness_check():
+        """Caches are warm and the database is reachable"""
+        return JSONResponse(readiness(), status_code=200 if is_ready() else 503)
+
+    @api_router.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text exposition of in-process metrics"""
+        return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    # Include routers
+    for name in ROUTERS:
+        api_router.include_router(import_module(f"routes.{name}").router)
+
+    # Include the main router in the app
+    app.include_router(api_router)
+
+    return app
+
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-    logger.info("Shutting down...")
\ No newline at end of file
+def __getattr__(name):
+    # `uvicorn server:app` keeps working, but importing this module no longer
+    # builds the app; it is created on first access to `server.app`
+    if name == "app":
+        app = create_app()
+        globals()["app"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
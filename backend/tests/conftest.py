@@ -0,0 +1,63 @@
+"""
+Shared test setup.
+
+Tests import application modules directly (backend/ is put on sys.path here)
+and may be ``async def``: each runs in its own event loop, without a pytest
+plugin.
+
+Modules import ``db``/``catalog_db`` from ``database`` at import time; the
+``mongo`` fixture swaps an in-memory database (mongomock-motor) into every
+loaded module that holds one, and clears the in-process caches so tests do
+not see each other's data.
+"""
+import asyncio
+import inspect
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# database.py reads these at import; no server is contacted
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    import database
+    from utils.cache import _caches
+
+    fake = AsyncMongoMockClient()["test"]
+    handles = {id(database.db), id(database.catalog_db)}
+    for module in list(sys.modules.values()):
+        for name in ("db", "catalog_db"):
+            if id(getattr(module, name, None)) in handles:
+                monkeypatch.setattr(module, name, fake)
+    for cache in _caches.values():
+        cache.invalidate()
+    return fake
+
+
+@pytest.fixture
+def project_change(mongo):
+    """Run a watcher's change-stream pipeline over a raw change event; None when it is filtered out"""
+    async def project(pipeline: list, change: dict):
+        await mongo.change_events.insert_one(change)
+        projected = await mongo.change_events.aggregate([{"$match": {"_id": change["_id"]}}, *pipeline]).to_list(length=1)
+        return projected[0] if projected else None
+
+    return project
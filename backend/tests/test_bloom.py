@@ -0,0 +1,76 @@
+"""
+Bloom filter (utils.bloom) and the coupon code lookup it guards.
+
+Run from backend/:
+    python -m pytest tests/test_bloom.py
+"""
+from datetime import datetime
+
+import pytest
+
+import utils.coupon_codes as coupon_codes
+from utils.bloom import BloomFilter
+
+
+def test_added_items_are_always_found():
+    items = [f"CODE{i:06d}" for i in range(20_000)]
+    bloom = BloomFilter.from_items(items, capacity=20_000, error_rate=0.01)
+    assert all(item in bloom for item in items)
+    assert len(bloom) <= len(items)
+
+
+def test_false_positive_rate_is_near_the_target():
+    bloom = BloomFilter.from_items((f"IN{i}" for i in range(10_000)), capacity=10_000, error_rate=0.01)
+    probes = 50_000
+    false_positives = sum(f"OUT{i}" in bloom for i in range(probes))
+    assert false_positives / probes < 0.02
+
+
+def test_saturation_and_validation():
+    bloom = BloomFilter(capacity=10)
+    bloom.update(f"x{i}" for i in range(10))
+    assert not bloom.saturated
+    bloom.add("one more")
+    assert bloom.saturated
+    assert not bloom.add("one more")
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=0)
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=10, error_rate=1)
+
+
+async def test_unknown_codes_are_rejected_without_a_database_read(mongo, monkeypatch):
+    coupon_codes.invalidate_code_filter()
+    await mongo.coupon_codes.insert_one({"_id": "KNOWN12345", "couponId": "c1", "createdAt": datetime.utcnow(), "orderId": None})
+    assert (await coupon_codes.find_code("known12345"))["couponId"] == "c1"
+
+    # Collection objects are created per access; patch their class
+    collection_class = type(mongo.coupon_codes)
+    find_one = collection_class.find_one
+    reads = []
+
+    async def counting_find_one(self, *args, **kwargs):
+        if self.name == "coupon_codes":
+            reads.append(args)
+        return await find_one(self, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "find_one", counting_find_one)
+    assert (await coupon_codes.find_code("KNOWN12345")) is not None
+    assert len(reads) == 1
+    reads.clear()
+    unknown = [f"GUESS{i:05d}" for i in range(1000)]
+    assert [await coupon_codes.find_code(code) for code in unknown] == [None] * len(unknown)
+    # Only the filter's false positives (0.1%) reach the database
+    assert len(reads) <= 5
+
+
+async def test_codes_created_after_the_build_are_picked_up_on_refresh(mongo):
+    coupon_codes.invalidate_code_filter()
+    await mongo.coupon_codes.insert_one({"_id": "FIRST00001", "couponId": "c1", "createdAt": datetime.utcnow(), "orderId": None})
+    await coupon_codes.find_code("FIRST00001")
+    await mongo.coupon_codes.insert_one({"_id": "LATER00001", "couponId": "c1", "createdAt": datetime.utcnow(), "orderId": None})
+
+    # Until the filter refreshes, the new code looks unknown
+    assert await coupon_codes.find_code("LATER00001") is None
+    coupon_codes.code_filter_cache.invalidate()
+    assert (await coupon_codes.find_code("LATER00001"))["_id"] == "LATER00001"
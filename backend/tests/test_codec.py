@@ -0,0 +1,59 @@
+"""
+Shared document codec (utils.codec) on the trusted list endpoints: reads
+return `id` strings, encode dates like the validated endpoints do, and fill
+in the response model's defaults (utils.serialization.model_projection).
+
+Run from backend/:
+    python -m pytest tests/test_codec.py
+"""
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+import routes.orders as orders
+import routes.reviews as reviews
+
+CREATED_AT = datetime(2030, 1, 5, 19, 0, 0, 123000)
+
+
+async def test_order_list_dates_match_order_details(mongo):
+    order_id = str(ObjectId())
+    await mongo.orders.insert_one({"_id": order_id, "userId": "u1", "status": "confirmed", "createdAt": CREATED_AT})
+    user = {"user_id": "u1"}
+
+    [listed] = json.loads((await orders.get_orders(current_user=user)).body)
+    assert listed["id"] == order_id
+    assert "_id" not in listed
+    detail = await orders.get_order(order_id, current_user=user)
+    assert listed["createdAt"] == detail["createdAt"].isoformat() == "2030-01-05T19:00:00.123000"
+
+
+async def test_review_dates_are_isoformat(mongo):
+    await mongo.reviews.insert_many([
+        {"_id": ObjectId(), "restaurantId": "r1", "rating": 5, "comment": "Harika", "userId": "u1",
+         "userName": "Ayşe", "createdAt": CREATED_AT},
+        {"_id": ObjectId(), "restaurantId": "r1", "rating": 4, "comment": "İyi", "userId": "u2",
+         "userName": "Mehmet", "createdAt": datetime(2030, 1, 6, 12, 30)},
+    ])
+    listed = json.loads((await reviews.get_reviews("r1")).body)
+    assert [review["createdAt"] for review in listed] == ["2030-01-06T12:30:00", CREATED_AT.isoformat()]
+
+
+async def test_orders_written_before_coupons_get_the_model_defaults(mongo):
+    await mongo.orders.insert_many([
+        {"_id": str(ObjectId()), "userId": "u1", "status": "delivered", "total": 120.0, "createdAt": CREATED_AT},
+        {"_id": str(ObjectId()), "userId": "u1", "status": "pending", "total": 90.0, "discount": 10.0,
+         "couponCode": "HOSGELDIN", "createdAt": datetime(2030, 1, 6)},
+    ])
+    listed = json.loads((await orders.get_orders(current_user={"user_id": "u1"})).body)
+    assert [(order["discount"], order["couponCode"]) for order in listed] == [(10.0, "HOSGELDIN"), (0, None)]
+
+
+async def test_reviews_without_an_avatar_get_null(mongo):
+    await mongo.reviews.insert_one({
+        "_id": ObjectId(), "restaurantId": "r1", "rating": 5, "comment": "Harika", "userId": "u1",
+        "userName": "Ayşe", "createdAt": CREATED_AT,
+    })
+    [review] = json.loads((await reviews.get_reviews("r1")).body)
+    assert review["userAvatar"] is None
@@ -0,0 +1,110 @@
+"""
+Rule-based collections (utils.collection_rules): ``rule_query`` and
+``matches`` must select the same restaurants, and only the materializer
+lease holder writes members.
+
+Run from backend/:
+    python -m pytest tests/test_collection_rules.py
+"""
+import itertools
+
+from bson import ObjectId
+
+import utils.leases as leases
+from utils.collection_rules import (
+    LEASE, materialize, materialize_all, matches, refresh_collection, rule_query
+)
+
+
+def _restaurants() -> list:
+    cuisines = ["Türk", "İtalyan", None]
+    cities = ["İstanbul", "Ankara", None]
+    ratings = [4.8, 3.5, None, "yok"]
+    restaurants = []
+    for number, (cuisine, city, rating) in enumerate(itertools.product(cuisines, cities, ratings)):
+        restaurant = {"_id": ObjectId(), "name": f"Restoran {number}", "reviewCount": number * 10}
+        if cuisine:
+            restaurant["cuisine"] = cuisine
+        if city:
+            restaurant["location"] = {"city": city, "coordinates": [29.0, 41.0]}
+        if rating is not None:
+            restaurant["rating"] = rating
+        if number % 2:
+            restaurant["tags"] = ["kebap", "ocakbaşı"][: number % 3 + 1]
+        if number % 3 == 0:
+            restaurant["hasDelivery"] = True
+        elif number % 3 == 1:
+            restaurant["hasDelivery"] = False
+        if number % 4 == 0:
+            restaurant["amenities"] = ["wifi", "otopark"]
+        if number % 5 == 0:
+            restaurant["dietaryOptions"] = ["vegan"]
+        restaurants.append(restaurant)
+    return restaurants
+
+
+RULES = [
+    {},
+    {"cuisines": ["Türk"]},
+    {"cuisines": ["Türk", "İtalyan"], "city": "İstanbul"},
+    {"tags": ["kebap"]},
+    {"city": "Ankara", "minRating": 4},
+    {"minRating": 3.5, "minReviewCount": 100},
+    {"minReviewCount": 0},
+    {"features": ["hasDelivery"]},
+    {"features": ["wifi"]},
+    {"features": ["vegan", "hasDelivery"]},
+    {"features": ["otopark"], "tags": ["ocakbaşı"], "minRating": 1},
+    {"features": ["teras"]},
+]
+
+
+async def test_rule_query_and_matches_agree(mongo):
+    restaurants = _restaurants()
+    await mongo.restaurants.insert_many(restaurants)
+    for rule in RULES:
+        queried = {restaurant["_id"] async for restaurant in mongo.restaurants.find(rule_query(rule), {"_id": 1})}
+        matched = {restaurant["_id"] for restaurant in restaurants if matches(rule, restaurant)}
+        assert queried == matched, rule
+
+
+async def test_materialize_keeps_the_best_by_the_rule_sort(mongo):
+    restaurants = _restaurants()
+    await mongo.restaurants.insert_many(restaurants)
+    collection = {"id": "c1", "rule": {"cuisines": ["Türk"], "sort": "popular", "limit": 3}}
+    await mongo.collections.insert_one(dict(collection))
+
+    assert await materialize(collection) == 3
+    members = await mongo.collection_members.find({"collectionId": "c1"}).sort("rank", 1).to_list(length=None)
+    best = sorted((r for r in restaurants if r.get("cuisine") == "Türk"), key=lambda r: -r["reviewCount"])[:3]
+    assert [member["restaurantId"] for member in members] == [str(r["_id"]) for r in best]
+    assert (await mongo.collections.find_one({"id": "c1"}))["restaurantCount"] == 3
+
+
+async def test_admin_refresh_only_marks_rule_collections_stale(mongo):
+    await mongo.restaurants.insert_many(_restaurants())
+    collection = {"id": "c1", "rule": {"cuisines": ["Türk"]}, "restaurantCount": 0}
+    await mongo.collections.insert_one(dict(collection))
+
+    assert await refresh_collection(collection) == 0
+    assert await mongo.collection_members.count_documents({}) == 0
+    assert "staleAt" in await mongo.collections.find_one({"id": "c1"})
+
+
+async def test_materialize_all_defers_to_the_lease_holder(mongo, monkeypatch):
+    await mongo.restaurants.insert_many(_restaurants())
+    await mongo.collections.insert_one({"id": "c1", "rule": {"cuisines": ["Türk"]}})
+
+    monkeypatch.setattr(leases, "OWNER", "server:1:a")
+    assert await leases.acquire_lease(LEASE, 60)
+    monkeypatch.setattr(leases, "OWNER", "script:2:b")
+
+    assert await materialize_all() == 1
+    assert await mongo.collection_members.count_documents({}) == 0
+    assert "staleAt" in await mongo.collections.find_one({"id": "c1"})
+
+    # With the lease free it evaluates, then lets go of the lease
+    await mongo.job_leases.delete_many({})
+    assert await materialize_all() == 1
+    assert await mongo.collection_members.count_documents({"collectionId": "c1"}) > 0
+    assert await mongo.job_leases.count_documents({}) == 0
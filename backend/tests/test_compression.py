@@ -0,0 +1,119 @@
+"""
+CompressionMiddleware: encoding negotiation, ETags, 304s and the variant cache.
+
+Run from backend/:
+    python -m pytest tests/test_compression.py
+"""
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from utils.compression import CompressionMiddleware, VariantCache, _etag_matches, negotiate
+
+FLAT = b'[{"id": "1", "name": "Adana"}]' * 200
+GROUPED = b'{"categories": [{"name": "Kebap"}]}' * 200
+
+
+def _app(cache: VariantCache) -> TestClient:
+    async def flat(request):
+        return Response(FLAT, media_type="application/json", headers={"etag": '"menu-7"'})
+
+    async def grouped(request):
+        # Deliberately the same app ETag as /flat
+        return Response(GROUPED, media_type="application/json", headers={"etag": '"menu-7"'})
+
+    async def missing(request):
+        return PlainTextResponse("not here " * 500, status_code=404)
+
+    async def empty(request):
+        return Response(status_code=204)
+
+    app = Starlette(routes=[
+        Route("/flat", flat), Route("/grouped", grouped), Route("/missing", missing), Route("/empty", empty),
+    ])
+    return TestClient(CompressionMiddleware(app, cache=cache))
+
+
+def _raw_get(client: TestClient, path: str, **headers):
+    response = client.get(path, headers=headers)
+    # httpx already decoded the body; check what went over the wire
+    return response, response.headers.get("content-encoding")
+
+
+def test_negotiate_respects_q_values_and_identity():
+    assert negotiate("gzip;q=0.5, br", ["br", "gzip"]) == "br"
+    assert negotiate("br;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("identity", ["br", "gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+
+
+def test_compresses_and_tags_each_variant():
+    client = _app(VariantCache())
+    response, encoding = _raw_get(client, "/flat", **{"accept-encoding": "gzip"})
+    assert encoding == "gzip"
+    assert response.content == FLAT
+    assert response.headers["etag"] == '"menu-7-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response, encoding = _raw_get(client, "/flat", **{"accept-encoding": "identity"})
+    assert encoding is None
+    assert response.headers["etag"] == '"menu-7"'
+
+
+def test_same_app_etag_on_two_urls_never_shares_a_variant():
+    cache = VariantCache()
+    client = _app(cache)
+    _raw_get(client, "/flat", **{"accept-encoding": "gzip"})
+    response, encoding = _raw_get(client, "/grouped", **{"accept-encoding": "gzip"})
+    assert encoding == "gzip"
+    assert response.content == GROUPED
+    assert len(cache) == 2
+
+    # Cached variants are served for their own URL
+    response, _ = _raw_get(client, "/flat", **{"accept-encoding": "gzip"})
+    assert response.content == FLAT
+
+
+def test_if_none_match_returns_304_for_any_variant_of_the_body():
+    client = _app(VariantCache())
+    for validator in ('"menu-7"', '"menu-7-gzip"', 'W/"menu-7-gzip"', '"other", "menu-7"', "*"):
+        response = client.get("/flat", headers={"if-none-match": validator, "accept-encoding": "gzip"})
+        assert response.status_code == 304, validator
+        assert response.content == b""
+
+
+def test_etag_matching_is_exact():
+    # App ETags may contain "-": "menu-7" must not match "menu-70" or "menu"
+    assert not _etag_matches('"menu"', '"menu-7"')
+    assert not _etag_matches('"menu-7"', '"menu-70"')
+    assert not _etag_matches('"menu-7-gzip"', '"menu-7-gz"')
+    assert not _etag_matches('"menu-7-unknown"', '"menu-7"')
+    assert _etag_matches('"menu-7-gzip"', '"menu-7"')
+
+
+def test_error_responses_are_compressed_without_etags():
+    cache = VariantCache()
+    client = _app(cache)
+    response, encoding = _raw_get(client, "/missing", **{"accept-encoding": "gzip"})
+    assert response.status_code == 404
+    assert encoding == "gzip"
+    assert response.text == "not here " * 500
+    assert "etag" not in response.headers
+    assert len(cache) == 0
+
+
+def test_no_content_passes_through():
+    response, encoding = _raw_get(_app(VariantCache()), "/empty", **{"accept-encoding": "gzip"})
+    assert response.status_code == 204
+    assert encoding is None
+
+
+def test_small_bodies_are_not_compressed():
+    async def small(request):
+        return PlainTextResponse("ok")
+
+    client = TestClient(CompressionMiddleware(Starlette(routes=[Route("/", small)]), cache=VariantCache()))
+    response, encoding = _raw_get(client, "/", **{"accept-encoding": "gzip"})
+    assert encoding is None
+    assert response.content == b"ok"
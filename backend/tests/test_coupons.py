@@ -0,0 +1,118 @@
+"""
+Coupon redemption at checkout: create_order redeems the coupon before the
+order is inserted, so usageLimit, userLimit and single-use codes hold even
+when pricing's cached check lets a stale coupon through.
+
+Run from backend/:
+    python -m pytest tests/test_coupons.py
+"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import routes.orders as orders
+from models.order import OrderCreate
+from utils.coupon_codes import invalidate_code_filter
+from utils.coupon_engine import redeem, release_redemption
+
+RESTAURANT_ID = ObjectId()
+
+
+async def _seed(mongo, **coupon) -> dict:
+    invalidate_code_filter()
+    await mongo.restaurants.insert_one({"_id": RESTAURANT_ID, "name": "Kebapçı", "location": {"city": "İstanbul"}})
+    await mongo.menu_snapshots.insert_one({
+        "_id": str(RESTAURANT_ID), "version": 1, "itemCount": 1,
+        "categories": [{"name": "Kebap", "items": [{"id": "m1", "name": "Adana", "price": 100.0, "isAvailable": True}]}],
+    })
+    # mongomock cannot evaluate _claim_global's $expr without a usageLimit
+    coupon = {
+        "_id": ObjectId(), "code": "YAZ20", "discountType": "fixed", "discountValue": 20,
+        "isActive": True, "userLimit": 1, "usageLimit": 100, "usedCount": 0, **coupon,
+    }
+    await mongo.coupons.insert_one(coupon)
+    return coupon
+
+
+async def _order(user_id: str, code: str) -> dict:
+    order_data = OrderCreate(
+        restaurantId=str(RESTAURANT_ID), items=[{"menuItemId": "m1", "quantity": 1}],
+        deliveryAddress={"address": "Moda"}, paymentMethod="cash", couponCode=code,
+    )
+    return await orders.create_order(order_data, current_user={"user_id": user_id})
+
+
+async def test_second_order_with_a_single_use_code_is_rejected(mongo):
+    coupon = await _seed(mongo, userLimit=5)
+    await mongo.coupon_codes.insert_one({
+        "_id": "KAMPANYA01", "couponId": str(coupon["_id"]), "createdAt": datetime.utcnow(), "userId": None, "orderId": None,
+    })
+
+    first = await _order("u1", "kampanya01")
+    assert first["discount"] == 20
+
+    with pytest.raises(HTTPException) as error:
+        await _order("u2", "KAMPANYA01")
+    assert error.value.status_code == 400
+
+    assert await mongo.orders.count_documents({}) == 1
+    assert (await mongo.coupon_codes.find_one({"_id": "KAMPANYA01"}))["orderId"] == first["id"]
+
+
+async def test_usage_limit_holds_when_the_cached_count_is_stale(mongo):
+    await _seed(mongo, usageLimit=1)
+    await _order("u1", "YAZ20")
+    # The coupon cache still says usedCount 0, so pricing lets this through
+    with pytest.raises(HTTPException) as error:
+        await _order("u2", "YAZ20")
+    assert error.value.status_code == 400
+    assert "limiti" in error.value.detail
+
+    assert await mongo.orders.count_documents({}) == 1
+    assert (await mongo.coupons.find_one({"code": "YAZ20"}))["usedCount"] == 1
+    # The rejected user's counter was given back
+    usage = await mongo.coupon_user_usage.find_one({"_id": "u2"})
+    assert usage is None or not any(usage["counts"].values())
+
+
+async def test_user_limit_rejects_a_second_order(mongo):
+    await _seed(mongo, userLimit=1)
+    await _order("u1", "YAZ20")
+    with pytest.raises(HTTPException):
+        await _order("u1", "YAZ20")
+    assert await mongo.orders.count_documents({}) == 1
+
+
+async def test_redeem_is_idempotent_per_order_and_can_be_released(mongo):
+    coupon = await _seed(mongo, userLimit=2, usageLimit=10)
+    assert (await redeem("YAZ20", "u1", "o1", 20))["alreadyApplied"] is False
+    assert (await redeem("YAZ20", "u1", "o1", 20))["alreadyApplied"] is True
+    assert (await mongo.coupons.find_one({"_id": coupon["_id"]}))["usedCount"] == 1
+
+    await release_redemption("YAZ20", "u1", "o1")
+    # Releasing twice gives back only one use
+    await release_redemption("YAZ20", "u1", "o1")
+    assert (await mongo.coupons.find_one({"_id": coupon["_id"]}))["usedCount"] == 0
+    usage = await mongo.coupon_user_usage.find_one({"_id": "u1"})
+    assert usage["counts"][str(coupon["_id"])] == 0
+    assert "o1" not in usage["orders"]
+    assert await mongo.coupon_usage.count_documents({}) == 0
+
+
+async def test_failed_insert_releases_the_redemption(mongo, monkeypatch):
+    async def failing_insert(*args, **kwargs):
+        raise RuntimeError("insert failed")
+
+    coupon = await _seed(mongo, usageLimit=1)
+    await mongo.coupon_codes.insert_one({
+        "_id": "KAMPANYA02", "couponId": str(coupon["_id"]), "createdAt": datetime.utcnow(), "userId": None, "orderId": None,
+    })
+    monkeypatch.setattr(orders, "insert_with_code", failing_insert)
+    with pytest.raises(HTTPException) as error:
+        await _order("u1", "KAMPANYA02")
+    assert error.value.status_code == 500
+
+    assert (await mongo.coupons.find_one({"_id": coupon["_id"]}))["usedCount"] == 0
+    assert (await mongo.coupon_codes.find_one({"_id": "KAMPANYA02"}))["orderId"] is None
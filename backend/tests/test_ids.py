@@ -0,0 +1,157 @@
+"""
+Uniqueness proof for utils.ids.
+
+IDs from different workers differ in the worker bits, so the generator is
+collision-free if every worker's values strictly increase. The proof test
+generates ID_PROOF_COUNT values (default 10M) round-robin across workers
+with a clock that bursts past the per-second sequence and steps backwards,
+and checks exactly that, in constant memory. The remaining tests cover what
+the proof assumes: leased worker numbers are distinct per process, and an
+insert that still hits a duplicate code is retried with a new one.
+
+Run from backend/:
+    python -m pytest tests/test_ids.py
+    ID_PROOF_COUNT=1000000 python -m pytest tests/test_ids.py
+"""
+import os
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import utils.ids as ids
+import utils.leases as leases
+from utils.ids import (
+    ALPHABET, CODE_LENGTH, EPOCH, MAX_SEQUENCE, IdGenerator, decode, encode, insert_with_code, split
+)
+
+PROOF_COUNT = int(os.getenv("ID_PROOF_COUNT", "10000000"))
+WORKERS = 16
+
+
+class SteppingClock:
+    """Advances one second every `per_second` calls and jumps back `skew` seconds every `skew_every` calls"""
+
+    def __init__(self, start: float, per_second: int, skew: int = 5, skew_every: int = 1_000_003):
+        self.now = start
+        self.calls = 0
+        self.per_second = per_second
+        self.skew = skew
+        self.skew_every = skew_every
+
+    def __call__(self) -> float:
+        self.calls += 1
+        if self.calls % self.per_second == 0:
+            self.now += 1
+        if self.calls % self.skew_every == 0:
+            self.now -= self.skew
+        return self.now
+
+
+def test_encode_round_trip():
+    for value in (0, 1, 31, 32, MAX_SEQUENCE, (1 << 54) - 1):
+        code = encode(value)
+        assert len(code) == CODE_LENGTH
+        assert set(code) <= set(ALPHABET)
+        assert decode(code) == value
+
+
+def test_decode_accepts_common_misreadings():
+    code = encode(0b00001_00000)
+    assert decode(code.replace("1", "I")) == decode(code) == decode(code.replace("1", "L"))
+
+
+def test_fields_are_packed_and_recoverable():
+    generator = IdGenerator(worker_id=777, clock=lambda: EPOCH + 12345)
+    first, second = generator.next_value(), generator.next_value()
+    assert split(first) == (EPOCH + 12345, 777, 0)
+    assert split(second) == (EPOCH + 12345, 777, 1)
+
+
+def test_sequence_overflow_borrows_the_next_second():
+    generator = IdGenerator(worker_id=1, clock=lambda: EPOCH + 100)
+    values = [generator.next_value() for _ in range(MAX_SEQUENCE + 2)]
+    assert split(values[-2]) == (EPOCH + 100, 1, MAX_SEQUENCE)
+    assert split(values[-1]) == (EPOCH + 101, 1, 0)
+
+
+def test_clock_going_backwards_never_reuses_values():
+    times = iter([EPOCH + 50, EPOCH + 40, EPOCH + 40, EPOCH + 51])
+    generator = IdGenerator(worker_id=3, clock=lambda: next(times))
+    values = [generator.next_value() for _ in range(4)]
+    assert values == sorted(set(values))
+
+
+def test_rejects_out_of_range_worker():
+    with pytest.raises(ValueError):
+        IdGenerator(worker_id=1024)
+
+
+def test_codes_sort_in_generation_order():
+    generator = IdGenerator(worker_id=5, clock=SteppingClock(EPOCH + 10, per_second=7))
+    codes = [generator.next_code() for _ in range(10_000)]
+    assert codes == sorted(codes)
+    assert len(set(codes)) == len(codes)
+
+
+def test_collision_free_across_workers():
+    clock = SteppingClock(EPOCH + 1_000_000, per_second=WORKERS * (MAX_SEQUENCE + 1) + 1000)
+    generators = [IdGenerator(worker_id=worker * 61 % 1024, clock=clock) for worker in range(WORKERS)]
+    last = [-1] * WORKERS
+
+    for i in range(PROOF_COUNT):
+        index = i % WORKERS
+        value = generators[index].next_value()
+        # Strictly increasing per worker => no repeats within a worker
+        assert value > last[index]
+        last[index] = value
+
+    # Distinct worker bits => no repeats across workers
+    worker_ids = {split(value)[1] for value in last}
+    assert len(worker_ids) == WORKERS
+    for generator, value in zip(generators, last):
+        assert split(value)[1] == generator.worker_id
+        assert decode(encode(value)) == value
+
+
+async def test_each_process_leases_its_own_worker_number(mongo, monkeypatch):
+    leased = []
+    for process in range(WORKERS):
+        # Every uvicorn worker has its own lease owner
+        monkeypatch.setattr(leases, "OWNER", f"host:100{process}:x")
+        leased.append(await leases.lease_worker_id())
+    assert len(set(leased)) == WORKERS
+
+    # Renewing keeps the number; another process cannot take it
+    monkeypatch.setattr(leases, "OWNER", "host:1000:x")
+    assert await leases.acquire_lease(f"worker-id:{leased[0]}", leases.WORKER_LEASE_TTL)
+    monkeypatch.setattr(leases, "OWNER", "host:1001:x")
+    assert not await leases.acquire_lease(f"worker-id:{leased[0]}", leases.WORKER_LEASE_TTL)
+
+
+def test_set_worker_id_switches_the_generator(monkeypatch):
+    monkeypatch.setattr(ids, "_generator", None)
+    ids.set_worker_id(42)
+    generator = ids.get_generator()
+    assert split(generator.next_value())[1] == 42
+    ids.set_worker_id(42)
+    assert ids.get_generator() is generator
+    ids.set_worker_id(43)
+    assert ids.get_generator().worker_id == 43
+
+
+async def test_duplicate_code_is_retried_with_a_new_one(mongo):
+    await mongo.orders.create_index("orderNumber", unique=True)
+    await mongo.orders.insert_one({"_id": "o1", "orderNumber": "ORD-TAKEN"})
+    codes = iter(["ORD-TAKEN", "ORD-FREE"])
+
+    order = {"_id": "o2", "orderNumber": "ORD-TAKEN"}
+    await insert_with_code(mongo.orders, order, "orderNumber", lambda: next(codes))
+    assert (await mongo.orders.find_one({"_id": "o2"}))["orderNumber"] == "ORD-FREE"
+
+    # Other duplicates are not a code collision
+    with pytest.raises(DuplicateKeyError):
+        await insert_with_code(mongo.orders, {"_id": "o1", "orderNumber": "ORD-NEW"}, "orderNumber", lambda: "ORD-X")
+
+    # Gives up after `attempts`
+    with pytest.raises(DuplicateKeyError):
+        await insert_with_code(mongo.orders, {"_id": "o3", "orderNumber": "ORD-FREE"}, "orderNumber", lambda: "ORD-FREE")
@@ -0,0 +1,155 @@
+"""
+Menu snapshots (utils.menu_snapshot): building, version-checked item
+changes, restaurant deletion, and the ETags of the flat and grouped menu
+routes.
+
+Run from backend/:
+    python -m pytest tests/test_menu_snapshot.py
+"""
+import json
+
+import pytest
+from bson import ObjectId
+
+import routes.admin as admin
+import routes.menu as menu_routes
+from utils.menu_snapshot import apply_item_change, flatten, load_snapshot, menu_cache
+from utils.pricing import PricingError, price_order
+
+RESTAURANT_ID = "r1"
+
+
+def _item(name: str, category: str = "Kebap", price: float = 100.0) -> dict:
+    return {"_id": ObjectId(), "name": name, "category": category, "price": price, "restaurantId": RESTAURANT_ID}
+
+
+async def _seed(mongo) -> list:
+    items = [_item("Adana"), _item("Ayran", "İçecek", 20.0), _item("Urfa")]
+    await mongo.menu_items.insert_many(items)
+    return items
+
+
+async def _set_price(mongo, item: dict, price: float):
+    await mongo.menu_items.update_one({"_id": item["_id"]}, {"$set": {"price": price}})
+
+
+async def test_missing_snapshot_is_built_grouped_by_category(mongo):
+    await _seed(mongo)
+    snapshot = await load_snapshot(RESTAURANT_ID, mongo)
+    assert [category["name"] for category in snapshot["categories"]] == ["Kebap", "İçecek"]
+    assert [item["name"] for item in snapshot["categories"][0]["items"]] == ["Adana", "Urfa"]
+    assert snapshot["itemCount"] == 3
+    assert await mongo.menu_snapshots.count_documents({}) == 1
+
+    # Unknown restaurants get an empty menu without a stored document
+    assert (await load_snapshot("unknown", mongo))["categories"] == []
+    assert await mongo.menu_snapshots.count_documents({}) == 1
+
+
+async def test_item_change_bumps_the_version(mongo):
+    items = await _seed(mongo)
+    before = await load_snapshot(RESTAURANT_ID, mongo)
+
+    await _set_price(mongo, items[0], 120.0)
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+    await mongo.menu_items.delete_one({"_id": items[1]["_id"]})
+    await apply_item_change(RESTAURANT_ID, str(items[1]["_id"]))
+    after = await load_snapshot(RESTAURANT_ID, mongo)
+    assert after["version"] > before["version"]
+    assert {item["name"]: item["price"] for item in flatten(after)} == {"Adana": 120.0, "Urfa": 100.0}
+
+
+async def test_concurrent_item_changes_are_not_lost(mongo, monkeypatch):
+    items = await _seed(mongo)
+    await load_snapshot(RESTAURANT_ID, mongo)
+    # Collection objects are created per access; patch their class
+    collection_class = type(mongo.menu_snapshots)
+    replace_one = collection_class.replace_one
+    interleaved = []
+
+    async def racing_replace_one(self, query, document, *args, **kwargs):
+        # Another admin's edit lands between our read and our write
+        if not interleaved:
+            interleaved.append(True)
+            await _set_price(mongo, items[2], 150.0)
+            await apply_item_change(RESTAURANT_ID, str(items[2]["_id"]))
+        return await replace_one(self, query, document, *args, **kwargs)
+
+    monkeypatch.setattr(collection_class, "replace_one", racing_replace_one)
+    await _set_price(mongo, items[0], 120.0)
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+    assert interleaved
+
+    prices = {item["name"]: item["price"] for item in flatten(await load_snapshot(RESTAURANT_ID, mongo))}
+    assert prices == {"Adana": 120.0, "Ayran": 20.0, "Urfa": 150.0}
+
+
+async def test_edits_of_one_item_patched_out_of_order_keep_the_last_write(mongo):
+    items = await _seed(mongo)
+    await load_snapshot(RESTAURANT_ID, mongo)
+    # Two admins edit Adana; the second request patches the snapshot first
+    await _set_price(mongo, items[0], 120.0)
+    await _set_price(mongo, items[0], 140.0)
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+
+    prices = {item["name"]: item["price"] for item in flatten(await load_snapshot(RESTAURANT_ID, mongo))}
+    assert prices["Adana"] == 140.0
+
+
+async def test_moved_item_leaves_the_old_menu(mongo):
+    items = await _seed(mongo)
+    await load_snapshot(RESTAURANT_ID, mongo)
+    await mongo.menu_items.update_one({"_id": items[0]["_id"]}, {"$set": {"restaurantId": "r2"}})
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+    assert "Adana" not in {item["name"] for item in flatten(await load_snapshot(RESTAURANT_ID, mongo))}
+
+
+async def test_deleting_the_restaurant_drops_its_menu(mongo):
+    restaurant_id = ObjectId()
+    await mongo.restaurants.insert_one({"_id": restaurant_id, "name": "Kebapçı", "location": {"city": "Adana"}})
+    item = {**_item("Adana"), "restaurantId": str(restaurant_id)}
+    await mongo.menu_items.insert_one(item)
+    line = type("Line", (), {"menuItemId": str(item["_id"]), "quantity": 1})()
+    # Warm the menu and price caches
+    assert len(json.loads((await menu_routes.get_menu(str(restaurant_id), None)).body)) == 1
+    await price_order(str(restaurant_id), [line], "u1")
+
+    await admin.delete_restaurant(str(restaurant_id), current_user={"user_id": "admin"})
+    assert await mongo.menu_snapshots.count_documents({}) == 0
+    assert json.loads((await menu_routes.get_menu(str(restaurant_id), None)).body) == []
+    with pytest.raises(PricingError):
+        await price_order(str(restaurant_id), [line], "u1")
+
+
+async def test_flat_and_grouped_menus_have_their_own_etags(mongo):
+    await _seed(mongo)
+    flat = await menu_routes.get_menu(RESTAURANT_ID, None)
+    grouped = await menu_routes.get_menu_grouped(RESTAURANT_ID, None)
+    assert flat.headers["etag"] != grouped.headers["etag"]
+    assert isinstance(json.loads(flat.body), list)
+    assert json.loads(grouped.body)["restaurantId"] == RESTAURANT_ID
+
+    # Each revalidates against its own ETag only
+    assert (await menu_routes.get_menu(RESTAURANT_ID, flat.headers["etag"])).status_code == 304
+    assert (await menu_routes.get_menu(RESTAURANT_ID, grouped.headers["etag"])).status_code == 200
+    assert (await menu_routes.get_menu_grouped(RESTAURANT_ID, f'W/{grouped.headers["etag"]}')).status_code == 304
+    assert (await menu_routes.get_menu_grouped(RESTAURANT_ID, flat.headers["etag"])).status_code == 200
+
+
+async def test_etag_changes_with_the_menu(mongo):
+    items = await _seed(mongo)
+    first = await menu_routes.get_menu(RESTAURANT_ID, None)
+    await _set_price(mongo, items[0], 130.0)
+    await apply_item_change(RESTAURANT_ID, str(items[0]["_id"]))
+    assert menu_cache.recently_invalidated(RESTAURANT_ID, 60)
+
+    response = await menu_routes.get_menu(RESTAURANT_ID, first.headers["etag"])
+    assert response.status_code == 200
+    assert response.headers["etag"] != first.headers["etag"]
+
+
+async def test_items_stored_without_availability_are_available(mongo):
+    await _seed(mongo)
+    menu = json.loads((await menu_routes.get_menu(RESTAURANT_ID, None)).body)
+    assert [item["isAvailable"] for item in menu] == [True, True, True]
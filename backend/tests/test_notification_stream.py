@@ -0,0 +1,74 @@
+"""
+Notification push (utils.notification_stream): change events, as projected
+by the watcher's pipeline, reach /notifications/stream.
+
+Run from backend/:
+    python -m pytest tests/test_notification_stream.py
+"""
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+import routes.notifications as notifications
+from utils.notification_stream import PIPELINE, _handle_change, notification_updates
+
+
+def _insert_event(doc: dict) -> dict:
+    """A raw change event for inserting `doc`"""
+    return {
+        "_id": {"_data": str(doc["_id"])},
+        "operationType": "insert",
+        "ns": {"db": "test", "coll": "notifications"},
+        "documentKey": {"_id": doc["_id"]},
+        "fullDocument": doc,
+    }
+
+
+def _notification(user_id: str = "u1") -> dict:
+    return {
+        "_id": ObjectId(), "userId": user_id, "title": "Siparişiniz yolda", "message": "Kurye çıktı",
+        "notificationType": "order", "data": {"orderId": "o1"}, "isRead": False,
+        "createdAt": datetime(2030, 1, 5, 19, 0, 0, 123000), "internalNote": "not sent",
+    }
+
+
+def _frame(chunk: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().splitlines())
+    return {**fields, "data": json.loads(fields["data"])}
+
+
+async def test_projected_insert_is_published(mongo, project_change):
+    doc = _notification()
+    change = await project_change(PIPELINE, _insert_event(doc))
+    assert "internalNote" not in change["fullDocument"]
+
+    subscription = notification_updates.subscribe("u1", buffer=5)
+    try:
+        _handle_change(change)
+        [published] = await subscription.get(timeout=1)
+    finally:
+        notification_updates.unsubscribe(subscription)
+    assert published["_id"] == doc["_id"]
+    assert published["title"] == doc["title"]
+
+
+async def test_change_reaches_the_stream(mongo, project_change):
+    doc = _notification()
+    await mongo.notifications.insert_one({**doc, "isRead": True})
+    response = await notifications.stream_notifications(since=None, last_event_id=None, current_user={"user_id": "u1"})
+    frames = response.body_iterator
+    try:
+        assert _frame(await frames.__anext__())["data"] == {"unreadCount": 0}
+        # The generator has subscribed; deliver the insert as the watcher would
+        _handle_change(await project_change(PIPELINE, _insert_event(doc)))
+
+        frame = _frame(await frames.__anext__())
+        assert frame["event"] == "notification"
+        assert frame["id"] == f"1893870000123.{doc['_id']}"
+        assert frame["data"]["id"] == str(doc["_id"])
+        assert frame["data"]["createdAt"] == "2030-01-05T19:00:00.123000"
+        assert "internalNote" not in frame["data"]
+    finally:
+        await frames.aclose()
+    assert not notification_updates.has_subscribers("u1")
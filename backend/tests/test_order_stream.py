@@ -0,0 +1,134 @@
+"""
+Order status push (utils.order_stream) and the change-stream watcher that
+feeds it (utils.pubsub.ChangeStreamWatcher).
+
+Run from backend/:
+    python -m pytest tests/test_order_stream.py
+"""
+import asyncio
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+import routes.orders as orders
+from utils.order_stream import PIPELINE, _handle_change, order_updates
+from utils.pubsub import ChangeStreamWatcher
+
+
+class StubStream:
+    """Yields `events`, then raises `error` or, without one, waits forever"""
+
+    def __init__(self, events: list, error: Exception = None):
+        self.events = events
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for event in self.events:
+            self.resume_token = {"_data": event["_id"]}
+            yield event
+        if self.error is not None:
+            raise self.error
+        await asyncio.Event().wait()
+
+
+class StubDatabase:
+    def __init__(self, stream: StubStream):
+        self.stream = stream
+
+    def __getitem__(self, name):
+        return self
+
+    def watch(self, pipeline, resume_after=None):
+        return self.stream
+
+
+def _update_event(order_id: str, **fields) -> dict:
+    return {
+        "_id": {"_data": f"{order_id}-{fields.get('status')}"},
+        "operationType": "update",
+        "documentKey": {"_id": order_id},
+        "updateDescription": {"updatedFields": {**fields, "courierPhone": "555"}, "removedFields": []},
+    }
+
+
+def _frame(chunk: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().splitlines())
+    return {**fields, "data": json.loads(fields["data"])}
+
+
+async def test_handler_errors_do_not_stop_the_watcher():
+    handled = []
+
+    def handle(change):
+        assert watcher.active
+        if change["_id"] == "bad":
+            raise KeyError("documentKey")
+        handled.append(change["_id"])
+
+    # Ends like a standalone server would, so run() returns
+    stream = StubStream([{"_id": "bad"}, {"_id": "good"}], OperationFailure("not a replica set", code=40573))
+    watcher = ChangeStreamWatcher("orders", [], handle)
+    await watcher.run(StubDatabase(stream), retry_interval=0)
+
+    assert handled == ["good"]
+    assert watcher.resume_token == {"_data": "good"}
+    assert not watcher.active
+
+
+async def test_watcher_is_inactive_once_cancelled():
+    handled = asyncio.Event()
+    watcher = ChangeStreamWatcher("orders", [], lambda change: handled.set())
+    task = asyncio.create_task(watcher.run(StubDatabase(StubStream([{"_id": "1"}]))))
+    await asyncio.wait_for(handled.wait(), 1)
+    assert watcher.active
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert not watcher.active
+
+
+async def test_status_change_reaches_the_order_stream(mongo, project_change):
+    order_id = str(ObjectId())
+    await mongo.orders.insert_one({"_id": order_id, "userId": "u1", "status": "confirmed"})
+    response = await orders.stream_order_status(order_id, current_user={"user_id": "u1"})
+    frames = response.body_iterator
+    try:
+        assert _frame(await frames.__anext__())["data"] == {"orderId": order_id, "status": "confirmed"}
+
+        _handle_change(await project_change(PIPELINE, _update_event(order_id, status="preparing")))
+        frame = _frame(await frames.__anext__())
+        assert frame["event"] == "status"
+        assert frame["data"] == {"orderId": order_id, "status": "preparing"}
+
+        delivered_at = datetime(2030, 1, 5, 20, 15)
+        _handle_change(await project_change(
+            PIPELINE, _update_event(order_id, status="delivered", deliveredAt=delivered_at)
+        ))
+        assert _frame(await frames.__anext__())["data"] == {
+            "orderId": order_id, "status": "delivered", "deliveredAt": "2030-01-05T20:15:00"
+        }
+        # Final status ends the stream
+        assert [chunk async for chunk in frames] == []
+    finally:
+        await frames.aclose()
+    assert not order_updates.has_subscribers(order_id)
+
+
+async def test_changes_without_a_status_are_filtered_out(mongo, project_change):
+    change = await project_change(PIPELINE, {
+        "_id": {"_data": "x"}, "operationType": "update", "documentKey": {"_id": "o1"},
+        "updateDescription": {"updatedFields": {"courierPhone": "555"}, "removedFields": []},
+    })
+    assert change is None
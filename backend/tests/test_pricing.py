@@ -0,0 +1,67 @@
+"""
+Server-side order pricing (utils.pricing): menu prices, fees and coupon
+restrictions, including the restaurant's city.
+
+Run from backend/:
+    python -m pytest tests/test_pricing.py
+"""
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from utils.pricing import PricingError, price_order
+
+RESTAURANT_ID = ObjectId()
+
+
+def _line(menu_item_id: str, quantity: int = 1):
+    return SimpleNamespace(menuItemId=menu_item_id, quantity=quantity)
+
+
+async def _seed(mongo, city: str = "İzmir"):
+    await mongo.restaurants.insert_one({"_id": RESTAURANT_ID, "name": "Kumru", "location": {"city": city, "address": "Alsancak"}})
+    await mongo.menu_snapshots.insert_one({
+        "_id": str(RESTAURANT_ID), "version": 7, "itemCount": 2,
+        "categories": [{"name": "Sandviç", "items": [
+            {"id": "m1", "name": "Kumru", "price": 80.0, "isAvailable": True},
+            {"id": "m2", "name": "Boyoz", "price": 30.0, "isAvailable": False},
+        ]}],
+    })
+    await mongo.coupons.insert_many([
+        {"_id": ObjectId(), "code": "IZMIR10", "discountType": "fixed", "discountValue": 10, "isActive": True,
+         "userLimit": 1, "applicableCities": ["İzmir"]},
+        {"_id": ObjectId(), "code": "ANKARA10", "discountType": "fixed", "discountValue": 10, "isActive": True,
+         "userLimit": 1, "applicableCities": ["Ankara"]},
+    ])
+
+
+async def test_prices_come_from_the_menu_and_settings(mongo):
+    await _seed(mongo)
+    priced = await price_order(str(RESTAURANT_ID), [_line("m1"), _line("m1", 2)], "u1")
+    assert priced["items"] == [{"menuItemId": "m1", "name": "Kumru", "price": 80.0, "quantity": 3}]
+    assert priced["subtotal"] == 240.0
+    # DEFAULT_SETTINGS fees
+    assert priced["total"] == 240.0 + priced["deliveryFee"] + priced["serviceFee"]
+    assert priced["menuVersion"] == 7
+
+
+async def test_unknown_and_unavailable_items_are_rejected(mongo):
+    await _seed(mongo)
+    with pytest.raises(PricingError):
+        await price_order(str(RESTAURANT_ID), [_line("nope")], "u1")
+    with pytest.raises(PricingError):
+        await price_order(str(RESTAURANT_ID), [_line("m2")], "u1")
+
+
+async def test_city_restricted_coupon_applies_in_its_city(mongo):
+    await _seed(mongo)
+    priced = await price_order(str(RESTAURANT_ID), [_line("m1")], "u1", "izmir10")
+    assert priced["discount"] == 10
+    assert priced["couponCode"] == "IZMIR10"
+
+
+async def test_city_restricted_coupon_is_rejected_outside_its_city(mongo):
+    await _seed(mongo)
+    with pytest.raises(PricingError, match="şehirde"):
+        await price_order(str(RESTAURANT_ID), [_line("m1")], "u1", "ANKARA10")
@@ -0,0 +1,58 @@
+"""
+Restaurant views and projections (utils.projections).
+
+Run from backend/:
+    python -m pytest tests/test_projections.py
+"""
+import pytest
+
+from utils.projections import (
+    RESTAURANT_VIEWS, projection_for, resolve_fields, to_projection, trim
+)
+
+# What filtered /restaurants adds to the view for sorting and distance
+LISTING_EXTRA = ["rating", "location.coordinates", "deliveryRadius"]
+
+
+def _collides(projection: dict) -> bool:
+    paths = list(projection)
+    return any(other.startswith(path + ".") for path in paths for other in paths)
+
+
+def test_card_view_with_listing_extras_has_no_path_collision():
+    projection = projection_for("card", extra=LISTING_EXTRA)
+    assert not _collides(projection)
+    # location already covers location.coordinates
+    assert projection["location"] == 1
+    assert "location.coordinates" not in projection
+    assert set(RESTAURANT_VIEWS["card"]) <= set(projection)
+
+
+def test_nested_paths_survive_without_their_parent():
+    projection = projection_for("card", fields="name", extra=LISTING_EXTRA)
+    assert projection == {"deliveryRadius": 1, "location.coordinates": 1, "name": 1, "rating": 1}
+
+
+def test_parent_wins_regardless_of_order():
+    assert to_projection(["location.city", "location.coordinates"], extra=["location"]) == {"location": 1}
+    # A sibling that only shares a prefix is not a child
+    assert to_projection(["location", "locationNote"]) == {"location": 1, "locationNote": 1}
+
+
+def test_detail_view_projects_everything():
+    assert projection_for("detail") is None
+    assert to_projection(None, extra=LISTING_EXTRA) is None
+
+
+def test_sparse_fieldset_narrows_the_view():
+    assert resolve_fields("card", "name, id,location.city") == ["name", "location.city"]
+    with pytest.raises(ValueError):
+        resolve_fields("card", "phone")
+    with pytest.raises(ValueError):
+        resolve_fields("everything")
+
+
+def test_trim_applies_nested_fields_to_loaded_documents():
+    doc = {"id": "r1", "name": "Kebapçı", "location": {"city": "İstanbul", "address": "x"}, "phone": "1"}
+    assert trim(doc, ["name", "location.city"]) == {"id": "r1", "name": "Kebapçı", "location": {"city": "İstanbul"}}
+    assert trim(doc, None) is doc
@@ -0,0 +1,105 @@
+"""
+Reservation slot inventory (utils.reservation_slots): claims, releases,
+slot normalization and rebuilds.
+
+Run from backend/:
+    python -m pytest tests/test_reservation_slots.py
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from utils.reservation_slots import (
+    TIME_SLOTS, claim_slot, normalize_slot, rebuild_slots, release_reservation, release_slot, slot_key
+)
+
+RESTAURANT = {"_id": ObjectId(), "maxReservationsPerSlot": 2, "maxCoversPerSlot": 6}
+RID = str(RESTAURANT["_id"])
+
+
+async def _slot(mongo, date="2030-01-05", time="19:00"):
+    return await mongo.reservation_slots.find_one({"_id": slot_key(RID, date, time)})
+
+
+async def test_claims_stop_at_the_reservation_limit(mongo):
+    results = [await claim_slot(RESTAURANT, "2030-01-05", "19:00", 2) for _ in range(3)]
+    slot = await _slot(mongo)
+    assert results == [True, True, False]
+    assert (slot["bookings"], slot["covers"]) == (2, 4)
+
+
+async def test_claims_stop_at_the_cover_limit(mongo):
+    assert [
+        await claim_slot(RESTAURANT, "2030-01-05", "19:00", 4),
+        await claim_slot(RESTAURANT, "2030-01-05", "19:00", 3),
+        await claim_slot(RESTAURANT, "2030-01-05", "19:00", 2),
+    ] == [True, False, True]
+
+
+async def test_party_larger_than_the_slot_is_refused(mongo):
+    assert await claim_slot(RESTAURANT, "2030-01-05", "19:00", 7) is False
+
+
+async def test_concurrent_claims_never_overbook(mongo):
+    results = await asyncio.gather(*(claim_slot(RESTAURANT, "2030-01-05", "20:00", 1) for _ in range(10)))
+    slot = await _slot(mongo, time="20:00")
+    assert sum(results) == 2
+    assert slot["bookings"] == 2
+
+
+async def test_release_returns_capacity(mongo):
+    await claim_slot(RESTAURANT, "2030-01-05", "19:00", 3)
+    await claim_slot(RESTAURANT, "2030-01-05", "19:00", 3)
+    full = await claim_slot(RESTAURANT, "2030-01-05", "19:00", 1)
+    await release_reservation({"restaurantId": RID, "date": "2030-01-05", "time": "19:00", "partySize": 3})
+    again = await claim_slot(RESTAURANT, "2030-01-05", "19:00", 1)
+    slot = await _slot(mongo)
+    assert (full, again) == (False, True)
+    assert (slot["bookings"], slot["covers"]) == (2, 4)
+
+
+async def test_release_never_goes_below_zero(mongo):
+    await claim_slot(RESTAURANT, "2030-01-05", "19:00", 1)
+    await release_slot(RID, "2030-01-05", "19:00", 1)
+    await release_slot(RID, "2030-01-05", "19:00", 1)
+    assert (await _slot(mongo))["bookings"] == 0
+
+
+def test_normalize_slot_maps_spellings_to_one_slot():
+    assert normalize_slot("2030-1-5", "19:00") == ("2030-01-05", "19:00")
+    assert normalize_slot("2030-01-05", " 19:00 ") == ("2030-01-05", "19:00")
+    for date, time in (("2030-01-05", "19:15"), ("2030-01-05", "03:00"), ("05.01.2030", "19:00"), ("2030-01-05", "7pm")):
+        with pytest.raises(ValueError):
+            normalize_slot(date, time)
+    assert all(normalize_slot("2030-01-05", time)[1] == time for time in TIME_SLOTS)
+
+
+async def test_rebuild_recounts_holding_reservations(mongo):
+    await mongo.reservations.insert_many([
+        {"restaurantId": RID, "date": "2030-01-05", "time": "19:00", "partySize": 2, "status": "pending"},
+        {"restaurantId": RID, "date": "2030-01-05", "time": "19:00", "partySize": 3, "status": "confirmed"},
+        {"restaurantId": RID, "date": "2030-01-05", "time": "19:00", "partySize": 4, "status": "cancelled"},
+    ])
+    # Drifted counters and a slot nobody holds any more
+    stale = datetime.utcnow() - timedelta(hours=1)
+    await mongo.reservation_slots.insert_many([
+        {"_id": slot_key(RID, "2030-01-05", "19:00"), "restaurantId": RID, "bookings": 9, "covers": 9, "updatedAt": stale},
+        {"_id": slot_key(RID, "2030-01-06", "12:00"), "restaurantId": RID, "bookings": 1, "covers": 2, "updatedAt": stale},
+    ])
+    assert await rebuild_slots(RID) == 1
+    slot = await _slot(mongo)
+    assert (slot["bookings"], slot["covers"]) == (2, 5)
+    assert await _slot(mongo, "2030-01-06", "12:00") is None
+
+
+async def test_rebuild_leaves_slots_claimed_during_the_rebuild(mongo):
+    # Claimed "after" the rebuild started: its live counters win
+    future = datetime.utcnow() + timedelta(minutes=1)
+    await mongo.reservation_slots.insert_one(
+        {"_id": slot_key(RID, "2030-01-05", "19:00"), "restaurantId": RID, "bookings": 1, "covers": 2, "updatedAt": future}
+    )
+    await rebuild_slots(RID)
+    slot = await _slot(mongo)
+    assert (slot["bookings"], slot["covers"]) == (1, 2)
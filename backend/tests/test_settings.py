@@ -0,0 +1,43 @@
+"""
+Settings from backend/.env reach modules that read them at import.
+
+Run from backend/:
+    python -m pytest tests/test_settings.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Builds the app the way uvicorn does, with server.py's .env replaced by the
+# test's file
+SCRIPT = """
+import sys
+import dotenv
+
+load_dotenv = dotenv.load_dotenv
+dotenv.load_dotenv = lambda path=None, **kwargs: load_dotenv(sys.argv[1], **kwargs)
+
+import server
+server.app
+
+import utils.db_monitor
+import utils.security
+print(utils.security.SECRET_KEY)
+print(utils.db_monitor.SLOW_QUERY_MS)
+"""
+
+
+def test_env_file_settings_reach_utils(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SECRET_KEY=from-dotenv-0123456789abcdef0123456789\nDB_SLOW_QUERY_MS=250\n")
+    environment = {
+        key: value for key, value in os.environ.items() if key not in ("SECRET_KEY", "DB_SLOW_QUERY_MS")
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT, str(env_file)],
+        cwd=BACKEND, env=environment, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ["from-dotenv-0123456789abcdef0123456789", "250.0"]
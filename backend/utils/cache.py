@@ -0,0 +1,116 @@
+"""
+In-process TTL caches.
+
+Each worker keeps its own copy; writers invalidate the local cache and the TTL
+bounds how long other workers can serve a stale value. Concurrent misses for
+the same key share a single load. ``recently_invalidated`` lets a loader that
+normally reads a secondary go to the primary while the write it was
+invalidated for may not have replicated yet.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from utils.metrics import counter, register_callback
+
+CACHE_HITS = counter("cache_hits_total", "In-process cache hits", ["cache"])
+CACHE_MISSES = counter("cache_misses_total", "In-process cache misses", ["cache"])
+
+_caches = {}
+
+register_callback(
+    "cache_entries", "Entries held per in-process cache",
+    lambda: {(name, ): len(cache) for name, cache in _caches.items()}, ["cache"]
+)
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading = {}
+        self._generation = 0
+        # monotonic time of the last full and per-key invalidations
+        self._invalidated_at = 0.0
+        self._key_invalidated_at = {}
+        self._hits = CACHE_HITS.labels(name)
+        self._misses = CACHE_MISSES.labels(name)
+        _caches[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._misses.inc()
+            return default
+        self._hits.inc()
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable = _MISSING):
+        """Drop one key, or everything when called without a key"""
+        # Loads that started before the invalidation must not store their result
+        self._generation += 1
+        now = time.monotonic()
+        if key is _MISSING:
+            self._data.clear()
+            self._loading.clear()
+            self._invalidated_at = now
+            self._key_invalidated_at.clear()
+        else:
+            self._data.pop(key, None)
+            self._loading.pop(key, None)
+            self._key_invalidated_at[key] = now
+            if len(self._key_invalidated_at) > self.maxsize:
+                # Only recent invalidations matter; forget the oldest
+                oldest = min(self._key_invalidated_at, key=self._key_invalidated_at.get)
+                del self._key_invalidated_at[oldest]
+
+    def recently_invalidated(self, key: Hashable, within: float) -> bool:
+        """Whether `key` (or the whole cache) was invalidated in the last `within` seconds"""
+        invalidated_at = max(self._invalidated_at, self._key_invalidated_at.get(key, 0.0))
+        return invalidated_at > 0 and time.monotonic() - invalidated_at < within
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        future = self._loading.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            if generation == self._generation:
+                self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
@@ -0,0 +1,147 @@
+"""
+Cached read models for hot public data.
+
+App settings, active campaigns, active collections, the default restaurant
+listing, the city list and the geo index are loaded once per TTL and warmed
+before a worker reports ready. Admin writes call the matching ``invalidate_*``
+function.
+
+Loaders read ``catalog_db`` (secondaries), except for CATALOG_MAX_STALENESS
+seconds after the cache was invalidated here: a secondary may not have the
+admin write yet, and its old document would be cached again for the whole TTL.
+"""
+from datetime import datetime
+
+from database import db, catalog_db, CATALOG_MAX_STALENESS
+from utils.cache import TTLCache
+from utils.geo_index import GeoIndex
+from utils.health import register_warmer
+from utils.projections import projection_for
+from utils.codec import find_with_ids
+
+DEFAULT_SETTINGS = {
+    "type": "app",
+    "siteName": "Yemek Nerede Yenir",
+    "currency": "TRY",
+    "currencySymbol": "₺",
+    "defaultDeliveryFee": 10,
+    "defaultServiceFee": 5,
+    "minOrderAmount": 50,
+    "maxDeliveryRadius": 10,
+    "supportEmail": "destek@yemeknereyeyenir.com",
+    "supportPhone": "+90 212 000 00 00"
+}
+
+settings_cache = TTLCache("settings", ttl=60, maxsize=1)
+campaigns_cache = TTLCache("active_campaigns", ttl=30, maxsize=1)
+collections_cache = TTLCache("active_collections", ttl=60, maxsize=1)
+restaurants_cache = TTLCache("restaurant_catalog", ttl=300, maxsize=4)
+
+def read_db(cache: TTLCache, key):
+    """Primary right after a local invalidation of `key`, otherwise the catalog secondaries"""
+    return db if cache.recently_invalidated(key, CATALOG_MAX_STALENESS) else catalog_db
+
+# ==================== SETTINGS ====================
+
+async def _load_settings() -> dict:
+    # Settings gate checkout fees, so they are read from the primary
+    settings = await db.settings.find_one({"type": "app"}, {"_id": 0})
+    return {**DEFAULT_SETTINGS, **(settings or {})}
+
+async def get_app_settings() -> dict:
+    """App settings merged over the defaults"""
+    return await settings_cache.get_or_load("app", _load_settings)
+
+def invalidate_settings():
+    settings_cache.invalidate()
+
+# ==================== CAMPAIGNS ====================
+
+async def _load_campaigns() -> list:
+    # Everything that is active and not yet over; start dates are checked on read
+    cursor = read_db(campaigns_cache, "active").campaigns.find({"isActive": True, "endDate": {"$gte": datetime.utcnow()}}).sort("priority", -1)
+    campaigns = await cursor.to_list(length=500)
+    for campaign in campaigns:
+        campaign["id"] = str(campaign["_id"])
+    return campaigns
+
+async def get_active_campaigns() -> list:
+    """Campaigns running right now, highest priority first (documents keep their _id)"""
+    now = datetime.utcnow()
+    campaigns = await campaigns_cache.get_or_load("active", _load_campaigns)
+    return [c for c in campaigns if c.get("startDate") and c["startDate"] <= now and c.get("endDate") and c["endDate"] >= now]
+
+def invalidate_campaigns():
+    campaigns_cache.invalidate()
+
+# ==================== COLLECTIONS ====================
+
+async def _load_collections() -> list:
+    cursor = read_db(collections_cache, "active").collections.find({"isActive": True}, {"_id": 0}).sort("priority", -1)
+    collections = await cursor.to_list(length=500)
+    for collection in collections:
+        # Stored by utils.collection_members; older documents only have the id list
+        collection.setdefault("restaurantCount", len(collection.get("restaurantIds", [])))
+    return collections
+
+async def get_active_collections() -> list:
+    """Active collections, highest priority first"""
+    return await collections_cache.get_or_load("active", _load_collections)
+
+def invalidate_collections():
+    collections_cache.invalidate()
+
+# ==================== RESTAURANTS ====================
+
+async def _load_default_listing(view: str) -> list:
+    database = read_db(restaurants_cache, ("default", view))
+    return await find_with_ids(database.restaurants, {}, projection_for(view), sort=[("rating", -1)], limit=1000)
+
+async def get_default_restaurant_listing(view: str = "card") -> list:
+    """All restaurants by rating in the given view, as served by an unfiltered /restaurants request"""
+    return await restaurants_cache.get_or_load(("default", view), lambda: _load_default_listing(view))
+
+async def _load_cities() -> list:
+    pipeline = [
+        {"$group": {"_id": "$location.city", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}}
+    ]
+    cities = await read_db(restaurants_cache, "cities").restaurants.aggregate(pipeline).to_list(100)
+    return [{"city": c["_id"], "restaurantCount": c["count"]} for c in cities if c["_id"]]
+
+async def get_cities() -> list:
+    return await restaurants_cache.get_or_load("cities", _load_cities)
+
+async def _load_geo_index() -> GeoIndex:
+    projection = {"location.coordinates": 1, "cuisine": 1, "rating": 1}
+    restaurants = await read_db(restaurants_cache, "geo").restaurants.find({}, projection).to_list(length=None)
+    return GeoIndex.from_restaurants(restaurants)
+
+async def get_geo_index() -> GeoIndex:
+    return await restaurants_cache.get_or_load("geo", _load_geo_index)
+
+def invalidate_restaurants():
+    restaurants_cache.invalidate()
+
+# ==================== WARM-UP ====================
+
+@register_warmer("settings")
+async def warm_settings():
+    await get_app_settings()
+
+@register_warmer("campaigns")
+async def warm_campaigns():
+    await get_active_campaigns()
+
+@register_warmer("collections")
+async def warm_collections():
+    await get_active_collections()
+
+@register_warmer("restaurants")
+async def warm_restaurants():
+    await get_default_restaurant_listing()
+    await get_cities()
+
+@register_warmer("geo_index")
+async def warm_geo_index():
+    await get_geo_index()
@@ -0,0 +1,50 @@
+"""
+Shared document codec: the database emits API-shaped documents.
+
+Instead of every handler looping over results with
+``doc["id"] = str(doc["_id"]); del doc["_id"]``, list reads run as a small
+aggregation whose last stage turns ``_id`` into an ``id`` string.
+
+Read-only list endpoints use ``find_json``, which returns the encoded JSON
+array (orjson) ready for ``RawJSONResponse``. Dates are encoded by orjson
+like ``datetime.isoformat()``, the same as every other endpoint.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from utils.serialization import dumps
+
+Sort = Optional[Sequence[Tuple[str, int]]]
+
+
+def id_stages(projection: Optional[dict] = None) -> List[dict]:
+    """Final stages mapping `_id` to an `id` string"""
+    if projection:
+        return [{"$project": {**projection, "_id": 0, "id": {"$toString": "$_id"}}}]
+    return [{"$set": {"id": {"$toString": "$_id"}}}, {"$unset": "_id"}]
+
+
+def find_pipeline(query: dict, projection: Optional[dict] = None, sort: Sort = None,
+                  skip: int = 0, limit: Optional[int] = None) -> List[dict]:
+    """Aggregation equivalent of find(query, projection).sort().skip().limit() returning `id`"""
+    pipeline = [{"$match": query}]
+    if sort:
+        pipeline.append({"$sort": dict(sort)})
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline + id_stages(projection)
+
+
+async def find_with_ids(collection, query: dict, projection: Optional[dict] = None, sort: Sort = None,
+                        skip: int = 0, limit: Optional[int] = None) -> List[dict]:
+    """Documents with `id` strings instead of `_id`"""
+    pipeline = find_pipeline(query, projection, sort, skip, limit)
+    return await collection.aggregate(pipeline).to_list(length=limit)
+
+
+async def find_json(collection, query: dict, projection: Optional[dict] = None, sort: Sort = None,
+                    skip: int = 0, limit: Optional[int] = None) -> bytes:
+    """A JSON array of the matching documents"""
+    pipeline = find_pipeline(query, projection, sort, skip, limit)
+    return dumps(await collection.aggregate(pipeline).to_list(length=limit))
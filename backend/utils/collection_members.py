@@ -0,0 +1,181 @@
+"""
+Collection membership with denormalized restaurant cards.
+
+Each (collection, restaurant) pair is one ``collection_members`` document:
+
+    {"_id": "<collectionId>:<restaurantId>", "collectionId", "restaurantId",
+     "rank", "card": {card view fields, "id"}, "updatedAt"}
+
+Pages are read in ``rank`` order from the (collectionId, rank, restaurantId)
+index with a keyset cursor, so opening a collection is one indexed read no
+matter how long it is. For curated collections ``rank`` is the position in
+``restaurantIds``; rule-based collections are materialized by
+utils/collection_rules.py and rank by the rule's sort.
+
+The collection routes call ``sync_collection`` after writing a curated
+collection; restaurant writes (admin edits, rating updates) call
+``restaurant_changed`` so the cards stay current and rule collections
+re-check the restaurant.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+
+from database import db, catalog_db
+from utils.joins import fetch_by_keys
+from utils.projections import RESTAURANT_VIEWS, to_projection
+
+CARD_FIELDS = RESTAURANT_VIEWS["card"]
+CARD_PROJECTION = to_projection(CARD_FIELDS)
+
+_WRITE_BATCH = 1000
+
+
+def member_key(collection_id: str, restaurant_id: str) -> str:
+    return f"{collection_id}:{restaurant_id}"
+
+
+def card(restaurant: dict) -> dict:
+    entry = {field: restaurant[field] for field in CARD_FIELDS if field in restaurant}
+    entry["id"] = str(restaurant["_id"])
+    return entry
+
+
+# ==================== CURSORS ====================
+
+def encode_cursor(rank: float, restaurant_id: str) -> str:
+    return f"{rank!r}:{restaurant_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """ValueError on a malformed cursor"""
+    rank, _, restaurant_id = cursor.partition(":")
+    if not restaurant_id:
+        raise ValueError("Invalid cursor")
+    return float(rank), restaurant_id
+
+
+# ==================== WRITES ====================
+
+def _member(collection_id: str, restaurant: dict, rank: float, now: datetime) -> dict:
+    return {
+        "collectionId": collection_id,
+        "restaurantId": str(restaurant["_id"]),
+        "rank": rank,
+        "card": card(restaurant),
+        "updatedAt": now,
+    }
+
+
+async def set_members(
+    collection_id: str,
+    ranked: Iterable[Tuple[str, float]],
+    restaurants: Optional[Dict[str, dict]] = None
+) -> int:
+    """Make the membership exactly `ranked` ((restaurantId, rank) pairs); returns the member count
+
+    `restaurants` (id -> document with the card fields) saves the read when
+    the caller already has them.
+    """
+    ranked = list(ranked)
+    if restaurants is None:
+        restaurants = await fetch_by_keys(db.restaurants, [restaurant_id for restaurant_id, _ in ranked], CARD_PROJECTION)
+    now = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"_id": member_key(collection_id, restaurant_id)},
+            _member(collection_id, restaurants[restaurant_id], rank, now),
+            upsert=True
+        )
+        for restaurant_id, rank in ranked if restaurant_id in restaurants
+    ]
+    for start in range(0, len(operations), _WRITE_BATCH):
+        await db.collection_members.bulk_write(operations[start:start + _WRITE_BATCH], ordered=False)
+
+    kept = [restaurant_id for restaurant_id, _ in ranked if restaurant_id in restaurants]
+    await db.collection_members.delete_many({"collectionId": collection_id, "restaurantId": {"$nin": kept}})
+    await db.collections.update_one({"id": collection_id}, {"$set": {"restaurantCount": len(kept)}})
+    return len(kept)
+
+
+async def sync_collection(collection: dict) -> int:
+    """Rebuild a curated collection's members from its restaurantIds"""
+    restaurant_ids = list(dict.fromkeys(collection.get("restaurantIds", [])))
+    return await set_members(collection["id"], [(restaurant_id, position) for position, restaurant_id in enumerate(restaurant_ids)])
+
+
+async def put_member(collection_id: str, restaurant: dict, rank: float):
+    await db.collection_members.replace_one(
+        {"_id": member_key(collection_id, str(restaurant["_id"]))},
+        _member(collection_id, restaurant, rank, datetime.utcnow()),
+        upsert=True
+    )
+
+
+async def drop_member(collection_id: str, restaurant_id: str) -> bool:
+    result = await db.collection_members.delete_one({"_id": member_key(collection_id, restaurant_id)})
+    return result.deleted_count == 1
+
+
+async def remove_collection(collection_id: str):
+    await db.collection_members.delete_many({"collectionId": collection_id})
+
+
+async def restaurant_changed(restaurant_id: str) -> List[str]:
+    """Refresh the restaurant's cards, or drop it from every collection if it was deleted; returns affected collection ids
+
+    Also queues the restaurant for rule collections, which the materializer
+    re-evaluates in the background; new restaurants only need that part.
+    """
+    await db.collection_rule_queue.update_one(
+        {"_id": restaurant_id}, {"$set": {"changedAt": datetime.utcnow()}}, upsert=True
+    )
+    collection_ids = await db.collection_members.distinct("collectionId", {"restaurantId": restaurant_id})
+    if not collection_ids:
+        return []
+    restaurants = await fetch_by_keys(db.restaurants, [restaurant_id], CARD_PROJECTION)
+    restaurant = restaurants.get(restaurant_id)
+    if restaurant is not None:
+        await db.collection_members.update_many(
+            {"restaurantId": restaurant_id},
+            {"$set": {"card": card(restaurant), "updatedAt": datetime.utcnow()}}
+        )
+    else:
+        await db.collection_members.delete_many({"restaurantId": restaurant_id})
+        await db.collections.update_many(
+            {"id": {"$in": collection_ids}},
+            {"$pull": {"restaurantIds": restaurant_id}, "$inc": {"restaurantCount": -1}}
+        )
+        # A rule collection that lost a member may have a candidate to pull in
+        await db.collections.update_many(
+            {"id": {"$in": collection_ids}, "rule": {"$type": "object"}}, {"$set": {"staleAt": datetime.utcnow()}}
+        )
+    return collection_ids
+
+
+async def rebuild_all() -> int:
+    """Resync every curated collection (after deploying, or to repair)"""
+    count = 0
+    async for collection in db.collections.find({"rule": None}, {"id": 1, "restaurantIds": 1}):
+        await sync_collection(collection)
+        count += 1
+    return count
+
+
+# ==================== READS ====================
+
+async def get_page(collection_id: str, limit: int, after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """One page of members in rank order and the cursor of the next page (None on the last page)"""
+    query = {"collectionId": collection_id}
+    if after:
+        rank, restaurant_id = decode_cursor(after)
+        query["$or"] = [{"rank": {"$gt": rank}}, {"rank": rank, "restaurantId": {"$gt": restaurant_id}}]
+    cursor = catalog_db.collection_members.find(query, {"rank": 1, "restaurantId": 1, "card": 1})
+    # One extra row tells whether another page exists
+    members = await cursor.sort([("rank", 1), ("restaurantId", 1)]).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(members) > limit:
+        members = members[:limit]
+        next_cursor = encode_cursor(members[-1]["rank"], members[-1]["restaurantId"])
+    return members, next_cursor
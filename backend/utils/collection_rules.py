@@ -0,0 +1,291 @@
+"""
+Rule-based collections, materialized in the background.
+
+A collection with a ``rule`` (models.collection.CollectionRule) holds the
+restaurants matching it, the best ``limit`` by the rule's sort. Readers never
+evaluate rules: the materializer writes the result into ``collection_members``
+(utils/collection_members.py) and pages are read from there exactly like
+curated collections.
+
+The materializer runs in one worker at a time (lease ``collection_materializer``)
+every COLLECTION_REFRESH_INTERVAL seconds and
+
+- applies restaurant changes incrementally: restaurant writes queue the id in
+  ``collection_rule_queue`` (``restaurant_changed``) and each queued
+  restaurant is matched against every rule and inserted, re-ranked or dropped
+  in place. When that could let in a restaurant it has not seen (a member
+  left a full collection or fell in rank) the collection is marked stale;
+- fully re-evaluates rule collections that are new, stale, or were last
+  materialized more than COLLECTION_REBUILD_INTERVAL seconds ago, which also
+  repairs anything written without going through ``restaurant_changed``.
+
+Only the lease holder writes rule collection members: admin writes
+(``refresh_collection``) mark the collection stale instead of evaluating it,
+so a full evaluation never races the incremental counts.
+
+``rule_query`` and ``matches`` are the same rule as a MongoDB filter and as a
+Python predicate and must stay in step.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from database import db
+from utils.collection_members import CARD_FIELDS, drop_member, put_member, set_members, sync_collection
+from utils.joins import fetch_by_keys
+from utils.leases import acquire_lease, release_lease
+from utils.projections import to_projection
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("COLLECTION_REFRESH_INTERVAL", "10"))
+REBUILD_INTERVAL = float(os.getenv("COLLECTION_REBUILD_INTERVAL", "900"))
+LEASE = "collection_materializer"
+
+_QUEUE_BATCH = 500
+
+# Boolean flags a rule can require; any other feature name must appear in one
+# of FEATURE_LISTS
+FEATURE_FLAGS = ("hasDelivery", "hasTableBooking", "isOpen", "isGoldPartner", "hasActiveOffer", "isPromoted")
+FEATURE_LISTS = ("amenities", "dietaryOptions", "atmosphere", "specialFeatures")
+
+# sort -> (field, direction)
+SORTS = {
+    "rating": ("rating", -1),
+    "popular": ("reviewCount", -1),
+    "newest": ("_id", -1),
+    "deliveryFee": ("deliveryFee", 1),
+}
+
+RULE_FIELDS = ["cuisine", "tags", "location", "rating", "reviewCount", "deliveryFee", *FEATURE_FLAGS, *FEATURE_LISTS]
+RULE_PROJECTION = to_projection(list(dict.fromkeys(CARD_FIELDS + RULE_FIELDS)))
+
+
+# ==================== RULES ====================
+
+def rule_query(rule: dict) -> dict:
+    clauses = []
+    if rule.get("cuisines"):
+        clauses.append({"cuisine": {"$in": rule["cuisines"]}})
+    if rule.get("tags"):
+        clauses.append({"tags": {"$in": rule["tags"]}})
+    if rule.get("city"):
+        clauses.append({"location.city": rule["city"]})
+    if rule.get("minRating") is not None:
+        clauses.append({"rating": {"$gte": rule["minRating"]}})
+    if rule.get("minReviewCount") is not None:
+        clauses.append({"reviewCount": {"$gte": rule["minReviewCount"]}})
+    for feature in rule.get("features", []):
+        if feature in FEATURE_FLAGS:
+            clauses.append({feature: True})
+        else:
+            clauses.append({"$or": [{field: feature} for field in FEATURE_LISTS]})
+    return {"$and": clauses} if clauses else {}
+
+
+def _at_least(value, minimum) -> bool:
+    return minimum is None or (isinstance(value, (int, float)) and value >= minimum)
+
+
+def matches(rule: dict, restaurant: dict) -> bool:
+    if rule.get("cuisines") and restaurant.get("cuisine") not in rule["cuisines"]:
+        return False
+    if rule.get("tags") and not set(restaurant.get("tags") or ()) & set(rule["tags"]):
+        return False
+    if rule.get("city") and (restaurant.get("location") or {}).get("city") != rule["city"]:
+        return False
+    if not _at_least(restaurant.get("rating"), rule.get("minRating")):
+        return False
+    if not _at_least(restaurant.get("reviewCount"), rule.get("minReviewCount")):
+        return False
+    for feature in rule.get("features", []):
+        if feature in FEATURE_FLAGS:
+            if restaurant.get(feature) is not True:
+                return False
+        elif not any(feature in (restaurant.get(field) or ()) for field in FEATURE_LISTS):
+            return False
+    return True
+
+
+def rank_of(rule: dict, restaurant: dict) -> float:
+    """Member rank (ascending) for the rule's sort"""
+    field, direction = SORTS[rule.get("sort", "rating")]
+    if field == "_id":
+        value = restaurant["_id"].generation_time.timestamp()
+    else:
+        value = restaurant.get(field)
+        # Missing values sort like MongoDB's nulls: last when descending
+        if not isinstance(value, (int, float)):
+            value = 0
+    return float(direction * value)
+
+
+# ==================== FULL EVALUATION ====================
+
+async def materialize(collection: dict) -> int:
+    """Evaluate the collection's rule into its members; returns the member count"""
+    rule = collection["rule"]
+    started = datetime.utcnow()
+    field, direction = SORTS[rule.get("sort", "rating")]
+    sort = [(field, direction)] if field == "_id" else [(field, direction), ("_id", 1)]
+    cursor = db.restaurants.find(rule_query(rule), RULE_PROJECTION).sort(sort).limit(rule.get("limit", 50))
+    restaurants = {str(restaurant["_id"]): restaurant async for restaurant in cursor}
+    count = await set_members(
+        collection["id"],
+        [(restaurant_id, rank_of(rule, restaurant)) for restaurant_id, restaurant in restaurants.items()],
+        restaurants
+    )
+    await db.collections.update_one({"id": collection["id"]}, {"$set": {"materializedAt": started}})
+    # Marked stale after this evaluation started: keep it for the next pass
+    await db.collections.update_one({"id": collection["id"], "staleAt": {"$lte": started}}, {"$unset": {"staleAt": ""}})
+    collection["materializedAt"] = started
+    return count
+
+
+async def refresh_collection(collection: dict) -> int:
+    """Update members after a collection write; returns the member count
+
+    Curated lists are synced here. Rule collections are marked stale and
+    evaluated by the materializer within COLLECTION_REFRESH_INTERVAL; until
+    then the current count is returned.
+    """
+    if collection.get("rule"):
+        await mark_stale(collection["id"])
+        return collection.get("restaurantCount", 0)
+    return await sync_collection(collection)
+
+
+async def mark_stale(collection_id: str):
+    await db.collections.update_one({"id": collection_id}, {"$set": {"staleAt": datetime.utcnow()}})
+
+
+async def materialize_due() -> int:
+    """Fully evaluate new, stale and expired rule collections; returns how many"""
+    expired = datetime.utcnow() - timedelta(seconds=REBUILD_INTERVAL)
+    query = {
+        "rule": {"$type": "object"},
+        "$or": [{"materializedAt": None}, {"materializedAt": {"$lt": expired}}, {"staleAt": {"$exists": True}}],
+    }
+    collections = await db.collections.find(query, {"id": 1, "rule": 1}).to_list(length=None)
+    for count, collection in enumerate(collections):
+        # Each evaluation renews the lease, so a long pass keeps it
+        if count and not await acquire_lease(LEASE, _lease_ttl()):
+            return count
+        await materialize(collection)
+    return len(collections)
+
+
+async def materialize_all() -> int:
+    """Evaluate every rule collection (after deploying, or to repair)
+
+    Takes the lease like the materializer; when a server holds it, the
+    collections are marked stale for that server to evaluate instead.
+    """
+    collections = await db.collections.find({"rule": {"$type": "object"}}, {"id": 1, "rule": 1}).to_list(length=None)
+    if not await acquire_lease(LEASE, _lease_ttl()):
+        await db.collections.update_many({"rule": {"$type": "object"}}, {"$set": {"staleAt": datetime.utcnow()}})
+        logger.info("Collection materializer is running elsewhere; marked %d collections stale", len(collections))
+        return len(collections)
+    try:
+        for collection in collections:
+            await acquire_lease(LEASE, _lease_ttl())
+            await materialize(collection)
+    finally:
+        await release_lease(LEASE)
+    return len(collections)
+
+
+# ==================== INCREMENTAL ====================
+
+async def _add_to_count(collection: dict, delta: int):
+    collection["restaurantCount"] = collection.get("restaurantCount", 0) + delta
+    await db.collections.update_one({"id": collection["id"]}, {"$inc": {"restaurantCount": delta}})
+
+
+async def _reconcile(collection: dict, restaurant: dict, member: Optional[dict]):
+    """Insert, re-rank or drop one restaurant in one rule collection"""
+    rule = collection["rule"]
+    collection_id = collection["id"]
+    restaurant_id = str(restaurant["_id"])
+    full = collection.get("restaurantCount", 0) >= rule.get("limit", 50)
+
+    if not matches(rule, restaurant):
+        if member and await drop_member(collection_id, restaurant_id):
+            await _add_to_count(collection, -1)
+            if full:
+                await mark_stale(collection_id)
+        return
+
+    rank = rank_of(rule, restaurant)
+    if member:
+        await put_member(collection_id, restaurant, rank)
+        if full and rank > member["rank"]:
+            await mark_stale(collection_id)
+        return
+
+    if full:
+        worst = await db.collection_members.find_one(
+            {"collectionId": collection_id}, {"rank": 1, "restaurantId": 1},
+            sort=[("rank", -1), ("restaurantId", -1)]
+        )
+        if worst is not None:
+            if (worst["rank"], worst["restaurantId"]) < (rank, restaurant_id):
+                return
+            if await drop_member(collection_id, worst["restaurantId"]):
+                await _add_to_count(collection, -1)
+    await put_member(collection_id, restaurant, rank)
+    await _add_to_count(collection, 1)
+
+
+async def apply_queued_changes() -> int:
+    """Re-check queued restaurants against every rule collection; returns how many were processed"""
+    queued = await db.collection_rule_queue.find({}).sort("changedAt", 1).limit(_QUEUE_BATCH).to_list(length=_QUEUE_BATCH)
+    if not queued:
+        return 0
+    collections = await db.collections.find(
+        {"rule": {"$type": "object"}}, {"id": 1, "rule": 1, "restaurantCount": 1}
+    ).to_list(length=None)
+    if collections:
+        restaurant_ids = [entry["_id"] for entry in queued]
+        restaurants = await fetch_by_keys(db.restaurants, restaurant_ids, RULE_PROJECTION)
+        members: Dict[tuple, dict] = {}
+        async for member in db.collection_members.find(
+            {"restaurantId": {"$in": restaurant_ids}, "collectionId": {"$in": [collection["id"] for collection in collections]}},
+            {"collectionId": 1, "restaurantId": 1, "rank": 1}
+        ):
+            members[(member["collectionId"], member["restaurantId"])] = member
+        for restaurant_id in restaurant_ids:
+            # Deleted restaurants were already dropped by restaurant_changed
+            restaurant = restaurants.get(restaurant_id)
+            if restaurant is None:
+                continue
+            for collection in collections:
+                await _reconcile(collection, restaurant, members.get((collection["id"], restaurant_id)))
+    # A change queued again meanwhile has a newer changedAt and stays for the next pass
+    for entry in queued:
+        await db.collection_rule_queue.delete_one({"_id": entry["_id"], "changedAt": entry["changedAt"]})
+    return len(queued)
+
+
+# ==================== BACKGROUND TASK ====================
+
+def _lease_ttl() -> float:
+    return max(60.0, REFRESH_INTERVAL * 6)
+
+
+async def run_materializer(interval: float = REFRESH_INTERVAL):
+    """Server background task; only the worker holding the lease does any work"""
+    while True:
+        try:
+            if await acquire_lease(LEASE, _lease_ttl()):
+                changed = await apply_queued_changes()
+                rebuilt = await materialize_due()
+                if changed or rebuilt:
+                    logger.info("Collections: %d restaurant changes applied, %d collections rebuilt", changed, rebuilt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Collection materializer error: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,251 @@
+"""
+Response compression with a cache of precompressed variants.
+
+Replaces Starlette's GZipMiddleware. Each complete 200 response body gets an
+ETag (the app's own, or a hash of the body), and compressed variants are
+cached per (URL, ETag, encoding), so the catalog listings, menus and city
+lists that thousands of clients fetch are compressed once per content change
+instead of once per request. The URL is part of the key because nothing makes
+an app ETag unique across endpoints. ``Accept-Encoding`` picks the best of
+br, zstd and gzip (br and zstd only when ``brotli`` / ``zstandard`` are
+installed), and ``If-None-Match`` on GET is answered with 304. Other
+statuses are compressed too, but without ETags or caching.
+
+Streaming responses (more than one body message, or text/event-stream) are
+passed through uncompressed so events are never held back.
+"""
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import counter, register_callback
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+BR_QUALITY = int(os.getenv("COMPRESSION_BR_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "6"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+COMPRESSION_CACHE = counter("compression_cache_total", "Compressed variant lookups", ["encoding", "result"])
+NOT_MODIFIED = counter("not_modified_total", "Responses answered with 304 Not Modified")
+
+
+def _encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    # Preference order when the client accepts several with the same q-value
+    encoders = {}
+    if brotli is not None:
+        encoders["br"] = lambda body: brotli.compress(body, quality=BR_QUALITY)
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        encoders["zstd"] = compressor.compress
+    encoders["gzip"] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return encoders
+
+
+ENCODERS = _encoders()
+
+
+def negotiate(accept_encoding: str, available: List[str] = None) -> Optional[str]:
+    """Best supported encoding for an Accept-Encoding header, or None for identity"""
+    available = list(ENCODERS) if available is None else available
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class VariantCache:
+    """LRU of compressed bodies keyed by (url, etag, encoding), bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Tuple[str, str, str], value: bytes):
+        if len(value) > self.max_bytes // 8:
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+
+
+variant_cache = VariantCache()
+
+register_callback("compression_cache_bytes", "Bytes held by the compressed variant cache", lambda: variant_cache.size)
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # The identity ETag or exactly one of its "-<encoding>" variants; app
+    # ETags may contain "-" themselves, so suffixes are never stripped
+    base = _opaque(etag)
+    accepted = {base} | {f"{base}-{encoding}" for encoding in ENCODERS}
+    return any(_opaque(candidate) in accepted for candidate in if_none_match.split(","))
+
+
+def _opaque(etag: str) -> str:
+    return etag.strip().removeprefix("W/").strip('"')
+
+
+class CompressionMiddleware:
+    """ASGI middleware: ETags, 304s and cached br/zstd/gzip variants"""
+
+    def __init__(self, app, minimum_size: int = 1000, cache: VariantCache = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else variant_cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key: value for key, value in scope["headers"] if key in (b"accept-encoding", b"if-none-match")}
+        accept_encoding = headers.get(b"accept-encoding", b"").decode("latin-1")
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        cacheable = scope["method"] in ("GET", "HEAD")
+        url = scope["path"]
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                content_type = _header(message["headers"], b"content-type") or b""
+                # No body to compress (1xx, 204, 304), already encoded, or a stream
+                if (message["status"] < 200 or message["status"] in (204, 304)
+                        or _header(message["headers"], b"content-encoding")
+                        or content_type.startswith(b"text/event-stream")):
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streaming: do not buffer
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            await self._send_complete(
+                start_message, body, accept_encoding, if_none_match,
+                cacheable and start_message["status"] == 200, url, send
+            )
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_complete(self, start_message, body: bytes, accept_encoding: str,
+                             if_none_match: str, cacheable: bool, url: str, send):
+        """`cacheable`: a 200 to GET/HEAD, which gets ETags, 304s and cached variants"""
+        headers = [(k, v) for k, v in start_message["headers"] if k != b"content-length"]
+        etag_header = _header(headers, b"etag")
+        etag = etag_header.decode("latin-1") if etag_header and cacheable else None
+
+        if etag is None and cacheable and body:
+            etag = body_etag(body)
+            headers.append((b"etag", etag.encode("latin-1")))
+
+        if cacheable and etag and if_none_match and _etag_matches(if_none_match, etag):
+            NOT_MODIFIED.inc()
+            headers = [(k, v) for k, v in headers if k not in (b"content-type",)]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        encoding = negotiate(accept_encoding) if len(body) >= self.minimum_size else None
+        if encoding is not None:
+            key = (url, etag, encoding)
+            compressed = self.cache.get(key) if etag else None
+            if compressed is None:
+                COMPRESSION_CACHE.labels(encoding, "miss").inc()
+                compressed = ENCODERS[encoding](body)
+                if etag:
+                    self.cache.set(key, compressed)
+            else:
+                COMPRESSION_CACHE.labels(encoding, "hit").inc()
+
+            if len(compressed) < len(body):
+                body = compressed
+                headers = [(k, v) for k, v in headers if k != b"etag"]
+                if etag:
+                    # Each representation gets its own strong validator
+                    headers.append((b"etag", _variant_etag(etag, encoding).encode("latin-1")))
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+
+        headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _variant_etag(etag: str, encoding: str) -> str:
+    weak = "W/" if etag.startswith("W/") else ""
+    return f'{weak}"{_opaque(etag)}-{encoding}"'
@@ -0,0 +1,161 @@
+"""
+Single-use campaign codes and the Bloom filter that guards code lookups.
+
+Campaign codes live in ``coupon_codes`` (``_id`` is the code) and point to a
+parent coupon in ``coupons`` that carries the discount rules. There can be
+millions of them, so unlike coupon definitions they are not cached; instead
+each worker keeps a Bloom filter of every code, and a code the filter has
+never seen is rejected without touching the database.
+
+The filter is built at startup (warmer) and refreshed incrementally every
+CODE_FILTER_REFRESH seconds from codes created since the last refresh, so
+codes generated on another worker become usable there within that interval.
+Deleting codes (admin coupon delete) forces a full rebuild.
+
+Codes are claimed by setting ``orderId`` with a conditional update, so each
+is used once; the parent coupon's limits are enforced by the coupon engine.
+"""
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import BulkWriteError
+
+from database import db
+from utils.bloom import BloomFilter
+from utils.cache import TTLCache
+from utils.health import register_warmer
+from utils.ids import ALPHABET
+
+logger = logging.getLogger(__name__)
+
+CODE_FILTER_ERROR_RATE = float(os.getenv("CODE_FILTER_ERROR_RATE", "0.001"))
+# Headroom for codes generated between full rebuilds
+_MIN_CAPACITY = 100_000
+# Refreshes re-read this far behind the watermark: a batch stamped before
+# another worker's newer batch can become visible after it
+_OVERLAP = timedelta(minutes=5)
+
+code_filter_cache = TTLCache("coupon_code_filter", ttl=float(os.getenv("CODE_FILTER_REFRESH", "60")), maxsize=1)
+
+_filter: Optional[BloomFilter] = None
+# createdAt of the newest code in the filter
+_watermark: Optional[datetime] = None
+_full_rebuild = True
+
+
+# ==================== FILTER ====================
+
+async def _build_filter() -> BloomFilter:
+    global _filter, _watermark, _full_rebuild
+    total = await db.coupon_codes.estimated_document_count()
+    bloom = BloomFilter(max(_MIN_CAPACITY, int(total * 1.5)), CODE_FILTER_ERROR_RATE)
+    watermark = None
+    # Batches keep each step between awaits short
+    async for code in db.coupon_codes.find({}, {"createdAt": 1}, batch_size=10000):
+        bloom.add(code["_id"])
+        if watermark is None or code["createdAt"] > watermark:
+            watermark = code["createdAt"]
+    _filter, _watermark, _full_rebuild = bloom, watermark, False
+    logger.info("Coupon code filter built: %d codes, %d KiB", len(bloom), bloom.nbytes // 1024)
+    return bloom
+
+
+async def _refresh_filter() -> BloomFilter:
+    global _watermark
+    if _full_rebuild or _filter is None or _filter.saturated:
+        return await _build_filter()
+    query = {"createdAt": {"$gte": _watermark - _OVERLAP}} if _watermark else {}
+    async for code in db.coupon_codes.find(query, {"createdAt": 1}, batch_size=10000):
+        # Re-adding a known code changes nothing
+        _filter.add(code["_id"])
+        if _watermark is None or code["createdAt"] > _watermark:
+            _watermark = code["createdAt"]
+    return _filter
+
+
+async def get_code_filter() -> BloomFilter:
+    return await code_filter_cache.get_or_load("filter", _refresh_filter)
+
+
+def invalidate_code_filter():
+    """Rebuild from scratch on next use (after codes were deleted)"""
+    global _full_rebuild
+    _full_rebuild = True
+    code_filter_cache.invalidate()
+
+
+@register_warmer("coupon_code_filter")
+async def warm_code_filter():
+    await get_code_filter()
+
+
+# ==================== LOOKUP ====================
+
+async def find_code(code: str) -> Optional[dict]:
+    """The campaign code document, or None; unknown codes cost no database access"""
+    code = code.upper()
+    if code not in await get_code_filter():
+        return None
+    return await db.coupon_codes.find_one({"_id": code})
+
+
+async def claim_code(code: str, user_id: str, order_id: str) -> bool:
+    """Mark a code used by this order; True also when this order already holds it"""
+    result = await db.coupon_codes.update_one(
+        {"_id": code, "$or": [{"orderId": None}, {"orderId": order_id}]},
+        {"$set": {"userId": user_id, "orderId": order_id, "redeemedAt": datetime.utcnow()}}
+    )
+    return result.matched_count == 1
+
+
+async def release_code(code: str, order_id: str):
+    await db.coupon_codes.update_one(
+        {"_id": code, "orderId": order_id},
+        {"$set": {"userId": None, "orderId": None, "redeemedAt": None}}
+    )
+
+
+# ==================== GENERATION ====================
+
+def random_code(prefix: str = "", length: int = 10) -> str:
+    # 10 Crockford base32 characters: 2^50 codes, not guessable at any practical rate
+    return prefix + "".join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+async def generate_codes(coupon_id: str, count: int, prefix: str = "", length: int = 10, batch_size: int = 10000) -> int:
+    """Insert `count` new unique codes for a coupon in batches; returns how many were inserted"""
+    inserted = 0
+    batch_id = secrets.token_hex(6)
+    while inserted < count:
+        size = min(batch_size, count - inserted)
+        now = datetime.utcnow()
+        codes = {random_code(prefix, length) for _ in range(size)}
+        documents = [
+            {"_id": code, "couponId": coupon_id, "batchId": batch_id, "createdAt": now, "userId": None, "orderId": None}
+            for code in codes
+        ]
+        try:
+            result = await db.coupon_codes.insert_many(documents, ordered=False)
+            added = list(result.inserted_ids)
+        except BulkWriteError as e:
+            # Collisions with existing codes are skipped and made up in the next round
+            failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") == 11000}
+            if len(failed) != len(e.details.get("writeErrors", [])):
+                raise
+            added = [document["_id"] for index, document in enumerate(documents) if index not in failed]
+        inserted += len(added)
+        # Usable on this worker immediately; other workers pick them up on refresh
+        if _filter is not None and not _full_rebuild:
+            _filter.update(added)
+    logger.info("Generated %d codes for coupon %s (batch %s)", inserted, coupon_id, batch_id)
+    return inserted
+
+
+async def delete_codes(coupon_id: str) -> int:
+    result = await db.coupon_codes.delete_many({"couponId": coupon_id})
+    if result.deleted_count:
+        invalidate_code_filter()
+    return result.deleted_count
@@ -0,0 +1,432 @@
+"""
+Coupon definitions, validation and redemption.
+
+Definitions are cached per worker (``coupon_cache``, invalidated by the admin
+coupon endpoints) and each user's usage lives in one ``coupon_user_usage``
+document, also cached:
+
+    {"_id": userId, "counts": {couponId: uses}, "orders": {orderId: {"couponId", "discount", "usedAt"}}}
+
+so a warm validation reads nothing from the database. The coupons a user
+can still use (``get_user_coupons``) are cached per user on top of both and
+dropped when the user redeems one. Cached counters are
+only advisory; ``redeem`` (called by create_order before the order is
+inserted) enforces both limits with conditional updates: first the user's
+counter (``counts.<id> < userLimit``, keyed by order so a retry is a no-op),
+then the coupon's (``usedCount < usageLimit``), undoing the first when the
+second fails. ``release_redemption`` undoes a redemption whose order was
+not created.
+
+Single-use campaign codes (utils/coupon_codes.py) resolve to their parent
+coupon; they are claimed before the counters.
+"""
+import heapq
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.cache import TTLCache
+from utils.coupon_codes import claim_code, find_code, release_code
+
+coupon_cache = TTLCache("coupons", ttl=float(os.getenv("COUPON_CACHE_TTL", "60")), maxsize=1)
+coupon_usage_cache = TTLCache("coupon_user_usage", ttl=300, maxsize=10000)
+user_coupons_cache = TTLCache("user_coupons", ttl=60, maxsize=10000)
+
+
+class CouponError(ValueError):
+    """The coupon cannot be used; the message is shown to the user"""
+
+
+class CouponNotFound(CouponError):
+    pass
+
+
+# ==================== DEFINITIONS ====================
+
+def _rule(coupon: dict) -> tuple:
+    """The fields rank_coupons checks, flattened so the hot loop avoids dict lookups"""
+    return (
+        coupon.get("validFrom") or datetime.min,
+        coupon.get("validUntil") or datetime.max,
+        coupon.get("minOrderAmount") or 0,
+        frozenset(coupon["applicableCities"]) if coupon.get("applicableCities") else None,
+        str(coupon["_id"]),
+        coupon.get("userLimit", 1),
+        coupon["discountType"] == "percentage",
+        coupon["discountValue"],
+        coupon.get("maxDiscountAmount") or None,
+        coupon,
+    )
+
+
+def index_coupons(coupons: Iterable[dict], now: datetime) -> dict:
+    """Lookup tables over coupon documents, see get_coupons"""
+    by_code, by_id, active, rules, general, by_restaurant = {}, {}, [], [], [], {}
+    for coupon in coupons:
+        by_code[coupon["code"]] = coupon
+        by_id[str(coupon["_id"])] = coupon
+        if not coupon.get("isActive", True) or (coupon.get("validUntil") and coupon["validUntil"] < now):
+            continue
+        active.append(coupon)
+        # Used up when loaded; redemption re-checks the live counter anyway
+        if coupon.get("usageLimit") and coupon.get("usedCount", 0) >= coupon["usageLimit"]:
+            continue
+        rule = _rule(coupon)
+        rules.append(rule)
+        if coupon.get("applicableRestaurants"):
+            for restaurant_id in set(coupon["applicableRestaurants"]):
+                by_restaurant.setdefault(restaurant_id, []).append(rule)
+        else:
+            general.append(rule)
+    return {
+        "byCode": by_code, "byId": by_id, "active": active,
+        "rules": rules, "general": general, "byRestaurant": by_restaurant,
+    }
+
+
+async def _load_coupons() -> dict:
+    return index_coupons([coupon async for coupon in db.coupons.find({})], datetime.utcnow())
+
+
+async def get_coupons() -> dict:
+    """Cached coupon tables; treat the documents as read-only
+
+    {"byCode": {code: coupon}, "byId": {id: coupon}, "active": [coupon],
+     "rules": [rule], "general": [rule], "byRestaurant": {restaurantId: [rule]}}
+
+    "active" holds enabled coupons that had not expired when the cache was
+    loaded; callers still check the validity window. "rules" holds ranking
+    rules for the active coupons that were not used up, also split into
+    "general" (any restaurant) and "byRestaurant".
+    """
+    return await coupon_cache.get_or_load("all", _load_coupons)
+
+
+async def resolve_code(code: str) -> Tuple[dict, Optional[dict]]:
+    """(coupon, campaign code document or None) for a coupon code or a single-use campaign code"""
+    code = code.upper()
+    coupons = await get_coupons()
+    coupon = coupons["byCode"].get(code)
+    if coupon is not None:
+        return coupon, None
+    # Unknown codes stop at the Bloom filter, without a database read
+    campaign_code = await find_code(code)
+    if campaign_code is not None:
+        coupon = coupons["byId"].get(campaign_code["couponId"])
+        if coupon is not None:
+            return coupon, campaign_code
+    raise CouponNotFound("Kupon bulunamadı")
+
+
+async def get_coupon(code: str) -> dict:
+    coupon, campaign_code = await resolve_code(code)
+    if campaign_code is not None and campaign_code.get("orderId"):
+        raise CouponError("Bu kod daha önce kullanılmış")
+    return coupon
+
+
+def invalidate_coupons():
+    coupon_cache.invalidate()
+    user_coupons_cache.invalidate()
+
+
+# ==================== USAGE ====================
+
+async def _load_user_usage(user_id: str) -> dict:
+    usage = await db.coupon_user_usage.find_one({"_id": user_id}, {"counts": 1})
+    return (usage or {}).get("counts", {})
+
+
+async def get_user_usage(user_id: str) -> dict:
+    """{couponId: times the user has used it}"""
+    return await coupon_usage_cache.get_or_load(user_id, lambda: _load_user_usage(user_id))
+
+
+def coupon_error(
+    coupon: dict, used_by_user: int, restaurant_id: Optional[str], order_amount: Optional[float], city: Optional[str] = None
+) -> Optional[str]:
+    """Why a coupon cannot be used for this order, or None when it can"""
+    now = datetime.utcnow()
+    if not coupon.get("isActive", True):
+        return "Bu kupon aktif değil"
+    if coupon.get("validFrom") and coupon["validFrom"] > now:
+        return "Bu kupon henüz geçerli değil"
+    if coupon.get("validUntil") and coupon["validUntil"] < now:
+        return "Bu kuponun süresi dolmuş"
+    if coupon.get("usageLimit") and coupon.get("usedCount", 0) >= coupon["usageLimit"]:
+        return "Bu kuponun kullanım limiti dolmuş"
+    if used_by_user >= coupon.get("userLimit", 1):
+        return "Bu kuponu zaten kullandınız"
+    if order_amount and coupon.get("minOrderAmount", 0) > order_amount:
+        return f"Minimum sipariş tutarı {coupon['minOrderAmount']}₺ olmalıdır"
+    if coupon.get("applicableRestaurants") and restaurant_id and restaurant_id not in coupon["applicableRestaurants"]:
+        return "Bu kupon bu restoran için geçerli değil"
+    if coupon.get("applicableCities") and city and city not in coupon["applicableCities"]:
+        return "Bu kupon bu şehirde geçerli değil"
+    return None
+
+
+def is_eligible(coupon: dict, restaurant_id: Optional[str], city: Optional[str]) -> bool:
+    """Restaurant and city restrictions only; an unknown restaurant or city matches"""
+    if restaurant_id and coupon.get("applicableRestaurants") and restaurant_id not in coupon["applicableRestaurants"]:
+        return False
+    if city and coupon.get("applicableCities") and city not in coupon["applicableCities"]:
+        return False
+    return True
+
+
+def coupon_discount(coupon: dict, order_amount: float) -> float:
+    if coupon["discountType"] == "percentage":
+        discount = order_amount * (coupon["discountValue"] / 100)
+        if coupon.get("maxDiscountAmount"):
+            discount = min(discount, coupon["maxDiscountAmount"])
+    else:
+        discount = coupon["discountValue"]
+    # A discount never makes the items negative
+    return round(min(discount, order_amount), 2)
+
+
+async def check_coupon(
+    code: str, user_id: str, restaurant_id: Optional[str], order_amount: Optional[float], city: Optional[str] = None
+) -> dict:
+    """The coupon for `code` if the user can use it on this order; raises CouponError otherwise"""
+    coupon = await get_coupon(code)
+    used = (await get_user_usage(user_id)).get(str(coupon["_id"]), 0)
+    error = coupon_error(coupon, used, restaurant_id, order_amount, city)
+    if error:
+        raise CouponError(error)
+    return coupon
+
+
+async def _load_user_coupons(user_id: str) -> list:
+    coupons = await get_coupons()
+    usage = await get_user_usage(user_id)
+    now = datetime.utcnow()
+    available = []
+    for coupon in coupons["active"]:
+        if coupon.get("validFrom") and coupon["validFrom"] > now:
+            continue
+        if coupon.get("usageLimit") and coupon.get("usedCount", 0) >= coupon["usageLimit"]:
+            continue
+        coupon_id = str(coupon["_id"])
+        remaining = coupon.get("userLimit", 1) - usage.get(coupon_id, 0)
+        if remaining > 0:
+            entry = {key: value for key, value in coupon.items() if key != "_id"}
+            entry["id"] = coupon_id
+            entry["remainingUses"] = remaining
+            available.append(entry)
+    return available
+
+
+async def get_user_coupons(user_id: str, restaurant_id: Optional[str] = None, city: Optional[str] = None) -> list:
+    """Coupons the user can still use, optionally only those valid for a restaurant and/or city"""
+    available = await user_coupons_cache.get_or_load(user_id, lambda: _load_user_coupons(user_id))
+    now = datetime.utcnow()
+    return [
+        coupon for coupon in available
+        # Entries are cached for a minute; drop any that expired since
+        if not (coupon.get("validUntil") and coupon["validUntil"] < now) and is_eligible(coupon, restaurant_id, city)
+    ]
+
+
+def rank_coupons(
+    coupons: dict, usage: dict, restaurant_id: Optional[str], order_amount: float, city: Optional[str],
+    now: datetime, limit: Optional[int] = None
+) -> Tuple[List[dict], int]:
+    """The `limit` best coupons the user can use on this cart, largest discount first, and how many qualify
+
+    One pass over the rules of the coupons that can apply to the restaurant
+    (see index_coupons), with the same checks as coupon_error.
+    """
+    if restaurant_id:
+        rules = coupons["general"] + coupons["byRestaurant"].get(restaurant_id, [])
+    else:
+        rules = coupons["rules"]
+
+    entries = []
+    for valid_from, valid_until, min_order, cities, coupon_id, user_limit, percentage, value, cap, coupon in rules:
+        if valid_from > now or valid_until < now or min_order > order_amount:
+            continue
+        if cities is not None and city and city not in cities:
+            continue
+        if usage and usage.get(coupon_id, 0) >= user_limit:
+            continue
+        if percentage:
+            discount = order_amount * value / 100
+            if cap and discount > cap:
+                discount = cap
+        else:
+            discount = value
+        if discount > order_amount:
+            discount = order_amount
+        if discount > 0:
+            # Ties go to the coupon that expires first
+            entries.append((-discount, valid_until, len(entries), coupon_id, coupon))
+
+    best = heapq.nsmallest(limit, entries) if limit is not None else sorted(entries)
+    ranked = [
+        {"coupon": coupon, "couponId": coupon_id, "discount": round(-negative, 2)}
+        for negative, _, _, coupon_id, coupon in best
+    ]
+    return ranked, len(entries)
+
+
+async def best_coupons(
+    user_id: str, restaurant_id: Optional[str], order_amount: float, city: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[dict], int]:
+    coupons = await get_coupons()
+    usage = await get_user_usage(user_id)
+    return rank_coupons(coupons, usage, restaurant_id, order_amount, city, datetime.utcnow(), limit)
+
+
+# ==================== REDEMPTION ====================
+
+async def _claim_for_user(user_id: str, coupon_id: str, order_id: str, user_limit: int, discount: float) -> Optional[dict]:
+    """Count one use for the user; returns the earlier redemption when this order was already applied"""
+    count_field = f"counts.{coupon_id}"
+    order_field = f"orders.{order_id}"
+    query = {
+        "_id": user_id,
+        order_field: {"$exists": False},
+        "$or": [{count_field: {"$exists": False}}, {count_field: {"$lt": user_limit}}],
+    }
+    update = {
+        "$inc": {count_field: 1},
+        "$set": {order_field: {"couponId": coupon_id, "discount": discount, "usedAt": datetime.utcnow()}, "updatedAt": datetime.utcnow()},
+    }
+    # A second attempt covers two first redemptions racing to create the document
+    for _ in range(2):
+        try:
+            result = await db.coupon_user_usage.update_one(query, update, upsert=True)
+            if result.modified_count or result.upserted_id is not None:
+                return None
+        except DuplicateKeyError:
+            continue
+    usage = await db.coupon_user_usage.find_one({"_id": user_id}, {order_field: 1})
+    earlier = ((usage or {}).get("orders") or {}).get(order_id)
+    if earlier is not None:
+        return earlier
+    raise CouponError("Bu kuponu zaten kullandınız")
+
+
+async def _release_for_user(user_id: str, coupon_id: str, order_id: str):
+    await db.coupon_user_usage.update_one(
+        {"_id": user_id, f"orders.{order_id}": {"$exists": True}},
+        {"$inc": {f"counts.{coupon_id}": -1}, "$unset": {f"orders.{order_id}": ""}}
+    )
+
+
+async def _claim_global(coupon: dict) -> bool:
+    """Count one use against the coupon's total limit, checked against the stored document"""
+    result = await db.coupons.update_one(
+        {
+            "_id": coupon["_id"],
+            "isActive": {"$ne": False},
+            "$expr": {"$or": [
+                {"$not": ["$usageLimit"]},
+                {"$lt": [{"$ifNull": ["$usedCount", 0]}, "$usageLimit"]},
+            ]},
+        },
+        {"$inc": {"usedCount": 1}}
+    )
+    return result.modified_count == 1
+
+
+async def redeem(code: str, user_id: str, order_id: str, discount: float) -> dict:
+    """Record a coupon use for an order exactly once; raises CouponError when a limit is reached"""
+    coupon, campaign_code = await resolve_code(code)
+    coupon_id = str(coupon["_id"])
+
+    # A single-use code is claimed first; it is released if a coupon limit stops the redemption
+    if campaign_code is not None and not await claim_code(campaign_code["_id"], user_id, order_id):
+        raise CouponError("Bu kod daha önce kullanılmış")
+    try:
+        earlier = await _claim_for_user(user_id, coupon_id, order_id, coupon.get("userLimit", 1), discount)
+        if earlier is not None:
+            if earlier["couponId"] != coupon_id:
+                raise CouponError("Bu siparişe zaten bir kupon uygulandı")
+            return {"couponId": coupon_id, "discount": earlier["discount"], "alreadyApplied": True}
+
+        try:
+            claimed = await _claim_global(coupon)
+        except Exception:
+            await _release_for_user(user_id, coupon_id, order_id)
+            raise
+        if not claimed:
+            await _release_for_user(user_id, coupon_id, order_id)
+            coupon_cache.invalidate()
+            raise CouponError("Bu kuponun kullanım limiti dolmuş")
+    except Exception:
+        if campaign_code is not None:
+            await release_code(campaign_code["_id"], order_id)
+        raise
+
+    coupon_usage_cache.invalidate(user_id)
+    user_coupons_cache.invalidate(user_id)
+    # History for the admin usage view
+    await db.coupon_usage.insert_one({
+        "couponId": coupon_id,
+        "userId": user_id,
+        "orderId": order_id,
+        "discountApplied": discount,
+        "usedAt": datetime.utcnow()
+    })
+    return {"couponId": coupon_id, "discount": discount, "alreadyApplied": False}
+
+
+async def release_redemption(code: str, user_id: str, order_id: str):
+    """Undo redeem for an order that was not created"""
+    coupon, campaign_code = await resolve_code(code)
+    coupon_id = str(coupon["_id"])
+    usage = await db.coupon_user_usage.find_one_and_update(
+        {"_id": user_id, f"orders.{order_id}.couponId": coupon_id},
+        {"$inc": {f"counts.{coupon_id}": -1}, "$unset": {f"orders.{order_id}": ""}}
+    )
+    # Only the redemption that counted this order gives its use back
+    if usage is not None:
+        await db.coupons.update_one({"_id": coupon["_id"], "usedCount": {"$gt": 0}}, {"$inc": {"usedCount": -1}})
+        await db.coupon_usage.delete_one({"couponId": coupon_id, "orderId": order_id})
+    if campaign_code is not None:
+        await release_code(campaign_code["_id"], order_id)
+    coupon_usage_cache.invalidate(user_id)
+    user_coupons_cache.invalidate(user_id)
+
+
+async def rebuild_user_usage() -> int:
+    """Recreate the per-user usage documents from the coupon_usage history"""
+    pipeline = [
+        {"$group": {
+            "_id": {"userId": "$userId", "couponId": "$couponId"},
+            "uses": {"$sum": 1},
+            "orders": {"$push": {"orderId": "$orderId", "discount": "$discountApplied", "usedAt": "$usedAt"}},
+        }},
+        {"$group": {
+            "_id": "$_id.userId",
+            "coupons": {"$push": {"couponId": "$_id.couponId", "uses": "$uses", "orders": "$orders"}},
+        }},
+    ]
+    await db.coupon_user_usage.delete_many({})
+    count = 0
+    batch = []
+    async for user in db.coupon_usage.aggregate(pipeline, allowDiskUse=True):
+        counts, orders = {}, {}
+        for entry in user["coupons"]:
+            counts[entry["couponId"]] = entry["uses"]
+            for order in entry["orders"]:
+                orders[str(order["orderId"])] = {
+                    "couponId": entry["couponId"], "discount": order.get("discount", 0), "usedAt": order.get("usedAt")
+                }
+        batch.append({"_id": user["_id"], "counts": counts, "orders": orders, "updatedAt": datetime.utcnow()})
+        if len(batch) >= 1000:
+            await db.coupon_user_usage.insert_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await db.coupon_user_usage.insert_many(batch)
+        count += len(batch)
+    coupon_usage_cache.invalidate()
+    user_coupons_cache.invalidate()
+    return count
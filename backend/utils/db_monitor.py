@@ -0,0 +1,210 @@
+"""
+MongoDB command monitoring.
+
+A pymongo ``CommandListener`` attributes every command to the request that
+issued it (via a context variable set by ``DBStatsMiddleware``; Motor copies
+the context into its executor threads), logs commands slower than
+``DB_SLOW_QUERY_MS`` and can sample read commands for ``explain`` to flag
+collection scans and in-memory sorts.
+
+Environment variables:
+    DB_SLOW_QUERY_MS        slow command threshold in milliseconds (default 100)
+    DB_EXPLAIN_SAMPLE_RATE  fraction of read commands to explain (default 0, disabled)
+    DEBUG                   when true, responses carry X-DB-Query-Count / X-DB-Time-Ms
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+from collections import deque
+
+from pymongo import monitoring
+
+from utils.metrics import counter, histogram, route_template
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+EXPLAIN_SAMPLE_RATE = float(os.getenv("DB_EXPLAIN_SAMPLE_RATE", "0"))
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
+# Commands that are driver housekeeping rather than application queries
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+PLAN_WARNING_STAGES = {"COLLSCAN", "SORT"}
+
+DB_COMMANDS = counter("db_commands_total", "MongoDB commands by name and collection", ["command", "collection"])
+DB_COMMAND_DURATION = histogram("db_command_duration_seconds", "MongoDB command latency", ["command"])
+DB_SLOW_COMMANDS = counter("db_slow_commands_total", "Commands slower than DB_SLOW_QUERY_MS", ["command", "collection"])
+DB_FAILED_COMMANDS = counter("db_failed_commands_total", "Commands that returned an error", ["command"])
+DB_PLAN_WARNINGS = counter("db_plan_warnings_total", "Explained queries using COLLSCAN or blocking SORT", ["collection", "stage"])
+DB_QUERIES_PER_REQUEST = histogram(
+    "db_queries_per_request", "MongoDB commands issued per HTTP request", ["route"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+
+
+class RequestDBStats:
+    """Per-request command count and cumulative database time"""
+
+    __slots__ = ("query_count", "db_time_ms")
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time_ms = 0.0
+
+
+_request_stats = contextvars.ContextVar("db_request_stats", default=None)
+
+
+def current_stats():
+    """Stats for the request being served, or None outside a request"""
+    return _request_stats.get()
+
+
+def _collection_of(command_name: str, command: dict) -> str:
+    target = command.get(command_name)
+    if isinstance(target, str):
+        return target
+    # getMore carries the cursor id; the collection is a separate field
+    return command.get("collection", "")
+
+
+def _shape(value):
+    """Replace literal values with type names so slow-query logs carry no user data"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shape(value[0])] if value else []
+    return type(value).__name__
+
+
+class CommandMonitor(monitoring.CommandListener):
+    def __init__(self):
+        # (connection_id, request_id) -> (command name, collection, database, command, request stats)
+        self._pending = {}
+        self.explain_queue = deque(maxlen=100)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.command_name,
+            _collection_of(event.command_name, event.command),
+            event.database_name,
+            event.command,
+            _request_stats.get(),
+        )
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            self._record(pending, event.duration_micros)
+
+    def failed(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            DB_FAILED_COMMANDS.labels(pending[0]).inc()
+            self._record(pending, event.duration_micros)
+
+    def _record(self, pending, duration_micros: int):
+        command_name, collection, database, command, stats = pending
+        duration_ms = duration_micros / 1000
+
+        DB_COMMANDS.labels(command_name, collection).inc()
+        DB_COMMAND_DURATION.labels(command_name).observe(duration_ms / 1000)
+        if stats is not None:
+            stats.query_count += 1
+            stats.db_time_ms += duration_ms
+
+        if duration_ms >= SLOW_QUERY_MS:
+            DB_SLOW_COMMANDS.labels(command_name, collection).inc()
+            logger.warning(
+                "Slow MongoDB command: %s %s.%s took %.1f ms | shape: %s",
+                command_name, database, collection, duration_ms,
+                _shape({k: v for k, v in command.items() if k in ("filter", "pipeline", "query", "sort")}),
+                extra={"event": "slow_query", "command": command_name, "collection": collection, "duration_ms": duration_ms}
+            )
+
+        if command_name in EXPLAINABLE_COMMANDS and EXPLAIN_SAMPLE_RATE > 0 and random.random() < EXPLAIN_SAMPLE_RATE:
+            self.explain_queue.append((database, collection, command))
+
+
+command_monitor = CommandMonitor()
+
+
+def _plan_stages(plan: dict):
+    """Yield every stage name in an explain plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def _winning_plans(explain: dict):
+    """Winning plans from find explain output or each $cursor stage of an aggregate"""
+    if "queryPlanner" in explain:
+        yield explain["queryPlanner"].get("winningPlan", {})
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            yield stage["$cursor"].get("queryPlanner", {}).get("winningPlan", {})
+
+
+async def explain_worker(client, interval: float = 1.0):
+    """Explain sampled read commands in the background and flag COLLSCAN/SORT plans"""
+    while True:
+        try:
+            if not command_monitor.explain_queue:
+                await asyncio.sleep(interval)
+                continue
+            database, collection, command = command_monitor.explain_queue.popleft()
+            # Strip session and cluster metadata the driver adds to the wire command
+            query = {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+            explain = await client[database].command({"explain": query, "verbosity": "queryPlanner"})
+            flagged = {stage for plan in _winning_plans(explain) for stage in _plan_stages(plan)} & PLAN_WARNING_STAGES
+            for stage in flagged:
+                DB_PLAN_WARNINGS.labels(collection, stage).inc()
+                logger.warning(
+                    "Query plan uses %s on %s | shape: %s", stage, collection,
+                    _shape({k: v for k, v in query.items() if k in ("filter", "pipeline", "query", "sort")}),
+                    extra={"event": "query_plan_warning", "collection": collection, "stage": stage}
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("explain failed: %s", e)
+
+
+class DBStatsMiddleware:
+    """ASGI middleware that scopes command stats to each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if DEBUG and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.query_count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.db_time_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            DB_QUERIES_PER_REQUEST.labels(route_template(scope)).observe(stats.query_count)
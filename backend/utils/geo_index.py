@@ -0,0 +1,61 @@
+"""
+In-memory grid index of restaurant coordinates for radius queries.
+
+Restaurants are bucketed into cells of ``CELL_DEGREES``; a radius query only
+computes distances for restaurants in the cells the search circle overlaps.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from utils.helpers import haversine_distance
+
+CELL_DEGREES = 0.05  # ~5.5 km of latitude
+
+
+class GeoIndex:
+    def __init__(self, cell_degrees: float = CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        # cell -> [(restaurant id, lat, lng, cuisine, rating)]
+        self._cells: Dict[Tuple[int, int], list] = {}
+        self.size = 0
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def add(self, restaurant_id: str, lat: float, lng: float, cuisine: Optional[str] = None, rating: float = 0):
+        self._cells.setdefault(self._cell(lat, lng), []).append((restaurant_id, lat, lng, cuisine, rating or 0))
+        self.size += 1
+
+    @classmethod
+    def from_restaurants(cls, restaurants: List[dict]) -> "GeoIndex":
+        index = cls()
+        for restaurant in restaurants:
+            coords = (restaurant.get("location") or {}).get("coordinates") or {}
+            if coords.get("lat") and coords.get("lng"):
+                index.add(
+                    str(restaurant["_id"]), float(coords["lat"]), float(coords["lng"]),
+                    restaurant.get("cuisine"), restaurant.get("rating", 0)
+                )
+        return index
+
+    def nearby(self, lat: float, lng: float, radius_km: float,
+               cuisine: Optional[str] = None, min_rating: Optional[float] = None) -> List[Tuple[float, str]]:
+        """(distance_km, restaurant id) pairs within radius, nearest first"""
+        lat_span = radius_km / 111.0
+        lng_span = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        min_cell = self._cell(lat - lat_span, lng - lng_span)
+        max_cell = self._cell(lat + lat_span, lng + lng_span)
+
+        results = []
+        for cell_lat in range(min_cell[0], max_cell[0] + 1):
+            for cell_lng in range(min_cell[1], max_cell[1] + 1):
+                for restaurant_id, r_lat, r_lng, r_cuisine, r_rating in self._cells.get((cell_lat, cell_lng), ()):
+                    if cuisine and r_cuisine != cuisine:
+                        continue
+                    if min_rating and r_rating < min_rating:
+                        continue
+                    distance = haversine_distance(lat, lng, r_lat, r_lng)
+                    if distance <= radius_km:
+                        results.append((distance, restaurant_id))
+        results.sort()
+        return results
@@ -0,0 +1,109 @@
+"""
+Liveness, readiness and cache warm-up.
+
+``/api/live`` only proves the process is serving. ``/api/ready`` turns green
+once every registered warmer has run and the background connection monitor
+has a recent successful ping, so probes never hit the database themselves.
+
+Modules that own a cache register a warmer::
+
+    @register_warmer("settings")
+    async def warm_settings():
+        await get_app_settings()
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+from utils.metrics import register_callback
+
+logger = logging.getLogger(__name__)
+
+PING_INTERVAL = float(os.getenv("HEALTH_PING_INTERVAL", "5"))
+PING_TIMEOUT = float(os.getenv("HEALTH_PING_TIMEOUT", "2"))
+
+
+class ConnectionHealthMonitor:
+    """Pings the database in the background and caches the result"""
+
+    def __init__(self, interval: float = PING_INTERVAL, timeout: float = PING_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.last_ok = None
+        self.last_error = None
+        self.latency_ms = None
+
+    @property
+    def healthy(self) -> bool:
+        # A missed ping or two is tolerated; a monitor that stopped reporting is not
+        return self.last_ok is not None and time.monotonic() - self.last_ok < self.interval * 3 and self.last_error is None
+
+    async def ping(self, db):
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(db.command("ping"), timeout=self.timeout)
+            self.last_ok = time.monotonic()
+            self.latency_ms = (self.last_ok - start) * 1000
+            self.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+
+    async def run(self, db):
+        while True:
+            await self.ping(db)
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> dict:
+        return {
+            "database": "connected" if self.healthy else "disconnected",
+            "latencyMs": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "error": self.last_error,
+        }
+
+
+monitor = ConnectionHealthMonitor()
+
+_warmers: List[Tuple[str, Callable[[], Awaitable]]] = []
+_warm = False
+
+register_callback("app_ready", "1 when warm-up finished and the database is reachable", lambda: int(is_ready()))
+
+
+def register_warmer(name: str):
+    """Decorator registering a coroutine function to run before the worker reports ready"""
+    def decorator(fn):
+        _warmers.append((name, fn))
+        return fn
+    return decorator
+
+
+async def warm_up(retry_interval: float = 5.0):
+    """Run every warmer concurrently, retrying failures until all succeed"""
+    global _warm
+
+    pending = list(_warmers)
+    while pending:
+        start = time.monotonic()
+        results = await asyncio.gather(*(fn() for _, fn in pending), return_exceptions=True)
+        failed = []
+        for (name, fn), result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning("Warm-up of %s failed: %s", name, result)
+                failed.append((name, fn))
+        logger.info("Warm-up pass finished in %.0f ms (%d failed)", (time.monotonic() - start) * 1000, len(failed))
+        pending = failed
+        if pending:
+            await asyncio.sleep(retry_interval)
+    _warm = True
+
+
+def is_ready() -> bool:
+    return _warm and monitor.healthy
+
+
+def readiness() -> dict:
+    return {"status": "ready" if is_ready() else "starting", "warm": _warm, **monitor.snapshot()}
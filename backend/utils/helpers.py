@@ -1,5 +1,6 @@
 from typing import Optional, List
 from datetime import datetime
+import math
 
 def paginate(items: list, page: int = 1, page_size: int = 20) -> dict:
     """Paginate a list of items"""
@@ -32,4 +33,18 @@ def calculate_delivery_time(restaurant_distance: float) -> str:
     min_time = base_time + travel_time
     max_time = min_time + 10
     
-    return f"{min_time}-{max_time} dk"
\ No newline at end of file
+    return f"{min_time}-{max_time} dk"
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate distance between two points in kilometers"""
+    R = 6371  # Earth's radius in kilometers
+    
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    
+    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    
+    return R * c
@@ -0,0 +1,152 @@
+"""
+Short, unique, human-friendly codes without database round trips.
+
+A code packs three fields into 54 bits and renders them as 11 Crockford
+base32 characters (no I, L, O or U, so codes survive being read aloud):
+
+    | 32 bits seconds since 2024-01-01 | 10 bits worker | 12 bits sequence |
+
+Each process needs a distinct worker number (0-1023). The server leases one
+from MongoDB at startup (``utils.leases.lease_worker_id``), so every process
+of every host gets its own, including the N processes of
+``uvicorn --workers N``. Within a worker the (seconds, sequence) pair
+strictly increases: when the sequence runs out within a second, or the wall
+clock steps backwards, the generator keeps counting from its own last
+timestamp instead of waiting or reusing one. Codes from different workers
+differ in the worker bits, so no two codes collide as long as worker numbers
+are unique.
+
+Unique indexes back the codes all the same: ``insert_with_code`` draws a new
+code when an insert hits a duplicate (a process without a lease, such as a
+script, uses a random worker number).
+"""
+import logging
+import secrets
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+# Common misreadings map onto the canonical characters
+_DECODE.update({"O": 0, "I": 1, "L": 1})
+
+EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+
+TIME_BITS = 32
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+CODE_LENGTH = 11  # ceil(54 / 5)
+
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def encode(value: int, length: int = CODE_LENGTH) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+def decode(code: str) -> int:
+    value = 0
+    for char in code.upper().replace("-", ""):
+        value = value * 32 + _DECODE[char]
+    return value
+
+
+def split(value: int) -> Tuple[int, int, int]:
+    """(unix seconds, worker, sequence) of a generated value"""
+    sequence = value & MAX_SEQUENCE
+    worker = (value >> SEQUENCE_BITS) & MAX_WORKER
+    seconds = value >> (SEQUENCE_BITS + WORKER_BITS)
+    return seconds + EPOCH, worker, sequence
+
+
+def random_worker_id() -> int:
+    """Stand-in until a worker number is leased; collisions are caught by insert_with_code"""
+    worker = secrets.randbelow(MAX_WORKER + 1)
+    logger.info("No leased worker number; generating codes as worker %d", worker)
+    return worker
+
+
+class IdGenerator:
+    def __init__(self, worker_id: int, clock: Callable[[], float] = time.time):
+        if not 0 <= worker_id <= MAX_WORKER:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER}")
+        self.worker_id = worker_id
+        self._clock = clock
+        self._last_seconds = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_value(self) -> int:
+        with self._lock:
+            seconds = int(self._clock()) - EPOCH
+            if seconds > self._last_seconds:
+                self._last_seconds = seconds
+                self._sequence = 0
+            else:
+                # Same second or clock went backwards: continue from our own timeline
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_seconds += 1
+                    self._sequence = 0
+            return (self._last_seconds << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def next_code(self) -> str:
+        return encode(self.next_value())
+
+
+_generator: Optional[IdGenerator] = None
+
+
+def get_generator() -> IdGenerator:
+    global _generator
+    if _generator is None:
+        _generator = IdGenerator(random_worker_id())
+    return _generator
+
+
+def set_worker_id(worker_id: int):
+    """Generate codes as `worker_id` from now on (after leasing it)"""
+    global _generator
+    if _generator is None or _generator.worker_id != worker_id:
+        _generator = IdGenerator(worker_id)
+
+
+def new_code(prefix: str = "") -> str:
+    return prefix + get_generator().next_code()
+
+
+def generate_order_number() -> str:
+    return new_code("ORD-")
+
+
+def generate_reservation_code() -> str:
+    return new_code("RES-")
+
+
+def _duplicate_on(error: DuplicateKeyError, field: str) -> bool:
+    key_pattern = (error.details or {}).get("keyPattern")
+    if key_pattern is not None:
+        return field in key_pattern
+    return field in str(error)
+
+
+async def insert_with_code(collection, document: dict, field: str, generate: Callable[[], str], attempts: int = 3):
+    """insert_one, drawing a new `field` code when the current one is already taken"""
+    for attempt in range(attempts):
+        try:
+            return await collection.insert_one(document)
+        except DuplicateKeyError as e:
+            if attempt == attempts - 1 or not _duplicate_on(e, field):
+                raise
+            logger.warning("Duplicate %s %s; retrying with a new code", field, document[field])
+            document[field] = generate()
@@ -0,0 +1,218 @@
+"""
+Declarative MongoDB index specification.
+
+``INDEXES`` is the single source of truth for the indexes the application's
+query shapes need. ``plan_indexes`` diffs it against what exists,
+``sync_indexes`` creates what is missing and ``unused_indexes`` reports
+indexes with no recorded accesses in ``$indexStats``.
+
+A missing unique index is only built when the existing data has no
+duplicate keys; otherwise the plan lists it as blocked, with examples, until
+the data is cleaned up. A failing build on one collection does not stop the
+others.
+
+These run from ``manage_indexes.py`` (deploy/migration step) rather than on
+every server start.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Options that change an index's behaviour and must match for an index to count as present
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("createdAt", DESCENDING)]),
+    ],
+    "restaurants": [
+        IndexModel([("slug", ASCENDING)], unique=True),
+        IndexModel([("location.city", ASCENDING)]),
+        IndexModel([("cuisine", ASCENDING)]),
+        IndexModel([("tags", ASCENDING)]),
+        IndexModel([("location.coordinates.lat", ASCENDING), ("location.coordinates.lng", ASCENDING)]),
+    ],
+    "menu_items": [
+        IndexModel([("restaurantId", ASCENDING)]),
+    ],
+    "orders": [
+        IndexModel([("orderNumber", ASCENDING)], unique=True),
+        IndexModel([("userId", ASCENDING)]),
+        # Dashboard trends and admin lists sort/filter on createdAt
+        IndexModel([("createdAt", DESCENDING)]),
+        IndexModel([("restaurantId", ASCENDING), ("createdAt", DESCENDING)]),
+        # Admin list filtered by status, newest first (also serves status-only filters)
+        IndexModel([("status", ASCENDING), ("createdAt", DESCENDING)]),
+        # Campaign analytics
+        IndexModel([("couponCode", ASCENDING)], sparse=True),
+    ],
+    "reviews": [
+        IndexModel([("restaurantId", ASCENDING)]),
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "coupons": [
+        IndexModel([("code", ASCENDING)], unique=True),
+    ],
+    "coupon_usage": [
+        IndexModel([("couponId", ASCENDING), ("userId", ASCENDING)]),
+    ],
+    # _id is the code; the filter refresh reads codes created since its watermark
+    "coupon_codes": [
+        IndexModel([("couponId", ASCENDING)]),
+        IndexModel([("createdAt", ASCENDING)]),
+    ],
+    "campaigns": [
+        IndexModel([("isActive", ASCENDING)]),
+    ],
+    "api_keys": [
+        IndexModel([("key", ASCENDING)], unique=True),
+    ],
+    "reservations": [
+        IndexModel([("reservationCode", ASCENDING)], unique=True),
+        IndexModel([("restaurantId", ASCENDING)]),
+        # Availability checks
+        IndexModel([("restaurantId", ASCENDING), ("date", ASCENDING), ("time", ASCENDING), ("status", ASCENDING)]),
+    ],
+    # _id is "<restaurantId>:<date>:<time>"; availability reads a restaurant's day
+    "reservation_slots": [
+        IndexModel([("restaurantId", ASCENDING), ("date", ASCENDING)]),
+    ],
+    "notifications": [
+        IndexModel([("userId", ASCENDING)]),
+        IndexModel([("userId", ASCENDING), ("isRead", ASCENDING), ("createdAt", DESCENDING)]),
+        # Stream catch-up after a reconnect
+        IndexModel([("userId", ASCENDING), ("createdAt", ASCENDING)]),
+    ],
+    "collections": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    # _id is "<collectionId>:<restaurantId>"; pages read in rank order, restaurant edits refresh cards
+    "collection_members": [
+        IndexModel([("collectionId", ASCENDING), ("rank", ASCENDING), ("restaurantId", ASCENDING)]),
+        IndexModel([("restaurantId", ASCENDING)]),
+    ],
+    # _id is the restaurant id; the collection materializer drains it oldest first
+    "collection_rule_queue": [
+        IndexModel([("changedAt", ASCENDING)]),
+    ],
+}
+
+
+def _key_of(key) -> tuple:
+    return tuple((field, direction) for field, direction in key.items()) if hasattr(key, "items") else tuple(
+        (field, direction) for field, direction in key
+    )
+
+
+def _options_of(spec: dict) -> dict:
+    return {option: spec[option] for option in _COMPARED_OPTIONS if spec.get(option) not in (None, False)}
+
+
+async def find_duplicates(collection, model: IndexModel, limit: int = 5) -> List[dict]:
+    """Key values held by more than one document, which would fail a unique index build"""
+    document = model.document
+    fields = [field for field, _ in _key_of(document["key"])]
+    pipeline = []
+    if document.get("sparse"):
+        pipeline.append({"$match": {"$or": [{field: {"$exists": True}} for field in fields]}})
+    if document.get("partialFilterExpression"):
+        pipeline.append({"$match": document["partialFilterExpression"]})
+    pipeline += [
+        # Missing fields group as null, as the index would store them
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    return await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=limit)
+
+
+async def plan_indexes(db, indexes: Dict[str, List[IndexModel]] = None) -> dict:
+    """Diff desired against existing indexes.
+
+    Returns {collection: {"missing": [IndexModel], "blocked": [(IndexModel, duplicates)],
+    "conflicting": [(name, existing, desired)], "extra": [name]}}
+    """
+    indexes = indexes if indexes is not None else INDEXES
+    plan = {}
+    for collection, models in indexes.items():
+        existing = await db[collection].index_information()
+        existing_by_key = {
+            _key_of(info["key"]): (name, _options_of(info)) for name, info in existing.items()
+        }
+
+        missing, blocked, conflicting, matched = [], [], [], set()
+        for model in models:
+            desired = model.document
+            key = _key_of(desired["key"])
+            if key not in existing_by_key:
+                duplicates = await find_duplicates(db[collection], model) if desired.get("unique") else []
+                if duplicates:
+                    blocked.append((model, duplicates))
+                else:
+                    missing.append(model)
+                continue
+            name, options = existing_by_key[key]
+            matched.add(name)
+            if options != _options_of(desired):
+                conflicting.append((name, options, _options_of(desired)))
+
+        extra = [name for name in existing if name != "_id_" and name not in matched]
+        plan[collection] = {"missing": missing, "blocked": blocked, "conflicting": conflicting, "extra": extra}
+    return plan
+
+
+async def sync_indexes(db, indexes: Dict[str, List[IndexModel]] = None, drop_extra: bool = False) -> dict:
+    """Create missing indexes (and optionally drop ones not in the spec); returns the plan applied
+
+    Build errors are logged and recorded as diff["failed"] per collection;
+    the remaining collections are still synced.
+    """
+    plan = await plan_indexes(db, indexes)
+    for collection, diff in plan.items():
+        diff["failed"] = None
+        if diff["missing"]:
+            # One createIndexes command per collection; the server builds them without
+            # blocking reads and writes for the duration of the build
+            try:
+                names = await db[collection].create_indexes(diff["missing"])
+                logger.info("Created indexes on %s: %s", collection, ", ".join(names))
+            except PyMongoError as e:
+                diff["failed"] = str(e)
+                logger.error("Creating indexes on %s failed: %s", collection, e)
+        for model, duplicates in diff["blocked"]:
+            logger.error("Index %s.%s not built: duplicate keys, e.g. %s", collection, model.document["name"], duplicates)
+        for name, existing, desired in diff["conflicting"]:
+            logger.warning("Index %s.%s has options %s, spec wants %s; rebuild it manually", collection, name, existing, desired)
+        if drop_extra:
+            for name in diff["extra"]:
+                await db[collection].drop_index(name)
+                logger.info("Dropped index %s.%s (not in spec)", collection, name)
+    return plan
+
+
+async def unused_indexes(db, collections=None) -> List[dict]:
+    """Indexes with zero recorded accesses since the server (re)started tracking them.
+
+    Unique indexes are skipped: they enforce constraints even when no query uses them.
+    """
+    unused = []
+    for collection in collections or INDEXES.keys():
+        info = await db[collection].index_information()
+        stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        for stat in stats:
+            name = stat["name"]
+            if name == "_id_" or info.get(name, {}).get("unique"):
+                continue
+            if stat.get("accesses", {}).get("ops", 0) == 0:
+                unused.append({
+                    "collection": collection,
+                    "name": name,
+                    "since": stat.get("accesses", {}).get("since"),
+                    "host": stat.get("host"),
+                })
+    return unused
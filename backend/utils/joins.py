@@ -0,0 +1,83 @@
+"""
+Batched joins for list views.
+
+Instead of one ``find_one`` per row, collect the foreign keys of a page,
+fetch them with a single ``$in`` query projected to the fields the view needs
+and stitch the results in memory. ``lookup_stages`` builds the equivalent
+``$lookup`` stages for callers that already run an aggregation.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+
+def _key_variants(keys: Iterable) -> list:
+    """Foreign keys as stored ids may be strings or ObjectIds; query both forms"""
+    variants = set()
+    for key in keys:
+        if key is None or key == "":
+            continue
+        variants.add(key)
+        if isinstance(key, str) and ObjectId.is_valid(key):
+            variants.add(ObjectId(key))
+    return list(variants)
+
+
+def id_filter(value) -> dict:
+    """Match an id stored either as a string or as an ObjectId"""
+    return {"$in": _key_variants([value])}
+
+
+async def fetch_by_keys(collection, keys: Iterable, projection: Optional[dict] = None,
+                        foreign_field: str = "_id") -> Dict[str, dict]:
+    """Fetch documents whose ``foreign_field`` is in ``keys`` with one query, keyed by str(key)"""
+    variants = _key_variants(keys)
+    if not variants:
+        return {}
+    cursor = collection.find({foreign_field: {"$in": variants}}, projection)
+    documents = await cursor.to_list(length=len(variants))
+    return {str(doc[foreign_field]): doc for doc in documents if foreign_field in doc}
+
+
+async def batch_join(docs: List[dict], collection, local_field: str, as_field: str,
+                     projection: Optional[dict] = None, foreign_field: str = "_id",
+                     default=None) -> List[dict]:
+    """Attach the foreign document referenced by ``local_field`` to each doc as ``as_field``"""
+    foreign = await fetch_by_keys(collection, (doc.get(local_field) for doc in docs), projection, foreign_field)
+    for doc in docs:
+        key = doc.get(local_field)
+        doc[as_field] = foreign.get(str(key), default) if key is not None else default
+    return docs
+
+
+async def batch_count(collection, field: str, keys: Iterable, match: Optional[dict] = None) -> Dict[str, int]:
+    """Count documents per value of ``field`` for all ``keys`` in one $group"""
+    keys = [key for key in set(keys) if key]
+    if not keys:
+        return {}
+    pipeline = [
+        {"$match": {**(match or {}), field: {"$in": keys}}},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+    ]
+    result = await collection.aggregate(pipeline).to_list(length=len(keys))
+    return {str(item["_id"]): item["count"] for item in result}
+
+
+def lookup_stages(from_collection: str, local_field: str, as_field: str,
+                  projection: Optional[dict] = None, foreign_field: str = "_id",
+                  to_object_id: bool = True) -> List[dict]:
+    """$lookup + $unwind stages joining at most one foreign document per row"""
+    key = f"${local_field}"
+    if to_object_id:
+        # String ids that are not valid ObjectIds resolve to null instead of failing the pipeline
+        key = {"$convert": {"input": key, "to": "objectId", "onError": None, "onNull": None}}
+
+    pipeline = [{"$match": {"$expr": {"$eq": [f"${foreign_field}", "$$key"]}}}]
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline.append({"$limit": 1})
+
+    return [
+        {"$lookup": {"from": from_collection, "let": {"key": key}, "pipeline": pipeline, "as": as_field}},
+        {"$unwind": {"path": f"${as_field}", "preserveNullAndEmptyArrays": True}}
+    ]
@@ -0,0 +1,85 @@
+"""
+Leases for background jobs that must run in one worker at a time.
+
+A lease is a ``job_leases`` document (``_id`` is the job name) holding the
+owner and an expiry. ``acquire_lease`` takes a free or expired lease, or
+extends one this worker already holds, with a single conditional upsert: when
+another worker holds it the upsert collides on ``_id`` and nothing changes.
+A holder that stops renewing (crash, shutdown) loses the lease once it
+expires.
+
+Worker numbers for utils.ids are leases too (``worker-id:<n>``): each server
+process takes a free number at startup and renews it in the background.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.ids import MAX_WORKER, set_worker_id
+
+logger = logging.getLogger(__name__)
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+
+WORKER_LEASE_TTL = float(os.getenv("WORKER_LEASE_TTL", "60"))
+
+
+async def acquire_lease(name: str, ttl: float) -> bool:
+    """Take or renew the lease for `ttl` seconds; False when another worker holds it"""
+    now = datetime.utcnow()
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "$or": [{"owner": OWNER}, {"expiresAt": {"$lt": now}}]},
+            {"$set": {"owner": OWNER, "expiresAt": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def release_lease(name: str):
+    await db.job_leases.delete_one({"_id": name, "owner": OWNER})
+
+
+# ==================== WORKER NUMBERS ====================
+
+def _worker_lease(worker_id: int) -> str:
+    return f"worker-id:{worker_id}"
+
+
+async def lease_worker_id() -> int:
+    """Lease a worker number no live process holds (starting at a random one)"""
+    start = secrets.randbelow(MAX_WORKER + 1)
+    for offset in range(MAX_WORKER + 1):
+        worker_id = (start + offset) % (MAX_WORKER + 1)
+        if await acquire_lease(_worker_lease(worker_id), WORKER_LEASE_TTL):
+            return worker_id
+    raise RuntimeError("Every worker number is leased")
+
+
+async def hold_worker_id(worker_id: Optional[int] = None):
+    """Server background task: keep the worker number leased, taking a new one if it was lost.
+
+    Numbers are not released on shutdown; the lease expires after WORKER_LEASE_TTL.
+    """
+    while True:
+        try:
+            if worker_id is None or not await acquire_lease(_worker_lease(worker_id), WORKER_LEASE_TTL):
+                if worker_id is not None:
+                    logger.warning("Lost the lease on worker number %d", worker_id)
+                worker_id = await lease_worker_id()
+                set_worker_id(worker_id)
+                logger.info("Generating codes as worker %d", worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Worker number lease error: {e}")
+        await asyncio.sleep(WORKER_LEASE_TTL / 3)
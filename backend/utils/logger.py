@@ -1,31 +1,178 @@
+"""
+Application logging.
+
+Request handlers never write to disk on the event loop: records are put on an
+in-memory queue by a ``QueueHandler`` and written by a ``QueueListener``
+thread. Message formatting is deferred to that thread as well, and high-volume
+request logs can be sampled per route.
+
+Nothing is configured at import time. The server calls ``configure_logging()``
+on startup and ``shutdown_logging()`` on shutdown to flush the queue.
+
+Environment variables:
+    LOG_LEVEL                root log level (default INFO)
+    LOG_FORMAT               "json" or "text" (default json)
+    LOG_DIR                  directory for app.log; unset means stderr only
+    LOG_QUEUE_SIZE           records buffered before new ones are dropped (default 10000)
+    LOG_REQUEST_SAMPLE_RATE  default sample rate for request logs (default 1.0)
+    LOG_ROUTE_SAMPLE_RATES   per-route prefix overrides, e.g. "/api/restaurants=0.05,/api/menu=0.1"
+"""
+import json
 import logging
-from datetime import datetime
+import logging.handlers
 import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
 
-# Create logs directory if it doesn't exist
-log_dir = "/var/log/app"
-os.makedirs(log_dir, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"{log_dir}/app.log"),
-        logging.StreamHandler()
-    ]
-)
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and leaves formatting to the listener"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock implementation formats the message here, on the caller's
+        # thread. The queue is in-process, so the record can be handed over
+        # as-is and formatted by the listener.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Shedding log records is preferable to stalling requests
+            NonBlockingQueueHandler.dropped += 1
+
+
+class RouteSampler:
+    """Per-route sampling decisions for high-volume info logs"""
+
+    def __init__(self, default_rate: float = 1.0, route_rates: dict = None):
+        self.default_rate = default_rate
+        # Longest prefix wins
+        self.route_rates = sorted((route_rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self._cache = {}
+
+    @classmethod
+    def from_env(cls) -> "RouteSampler":
+        route_rates = {}
+        for entry in os.getenv("LOG_ROUTE_SAMPLE_RATES", "").split(","):
+            if "=" in entry:
+                prefix, rate = entry.rsplit("=", 1)
+                route_rates[prefix.strip()] = float(rate)
+        return cls(float(os.getenv("LOG_REQUEST_SAMPLE_RATE", "1.0")), route_rates)
+
+    def rate_for(self, endpoint: str) -> float:
+        rate = self._cache.get(endpoint)
+        if rate is None:
+            rate = self.default_rate
+            for prefix, prefix_rate in self.route_rates:
+                if endpoint.startswith(prefix):
+                    rate = prefix_rate
+                    break
+            if len(self._cache) < 10000:
+                self._cache[endpoint] = rate
+        return rate
+
+    def should_log(self, endpoint: str) -> bool:
+        rate = self.rate_for(endpoint)
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+
+_sampler = RouteSampler()
+
+
+def configure_logging():
+    """Install the queue-based logging pipeline (idempotent)"""
+    global _listener, _queue_handler, _sampler
+
+    if _listener is not None:
+        return
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    else:
+        formatter = JSONFormatter()
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    log_dir = os.getenv("LOG_DIR")
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+        # WatchedFileHandler reopens the file after external log rotation
+        handlers.append(logging.handlers.WatchedFileHandler(os.path.join(log_dir, "app.log")))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _sampler = RouteSampler.from_env()
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _queue_handler
+
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
 
-logger = logging.getLogger(__name__)
 
 def log_request(endpoint: str, method: str, user_id: str = None):
     """Log API request"""
-    logger.info(f"API Request: {method} {endpoint} | User: {user_id or 'anonymous'}")
+    if not logger.isEnabledFor(logging.INFO) or not _sampler.should_log(endpoint):
+        return
+    logger.info(
+        "API Request: %s %s | User: %s", method, endpoint, user_id or "anonymous",
+        extra={"event": "api_request", "method": method, "route": endpoint, "user_id": user_id}
+    )
 
 def log_error(error: Exception, context: str = ""):
     """Log error with context"""
-    logger.error(f"Error in {context}: {str(error)}", exc_info=True)
+    logger.error("Error in %s: %s", context, error, exc_info=True, extra={"event": "error", "context": context})
 
 def log_security_event(event_type: str, details: dict):
     """Log security-related events"""
-    logger.warning(f"Security Event: {event_type} | Details: {details}")
\ No newline at end of file
+    logger.warning(
+        "Security Event: %s | Details: %s", event_type, details,
+        extra={"event": "security", "security_event": event_type}
+    )
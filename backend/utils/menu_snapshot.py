@@ -0,0 +1,165 @@
+"""
+Per-restaurant menu snapshots.
+
+Each restaurant's menu is materialized as one ``menu_snapshots`` document
+(``_id`` is the restaurant id), already grouped by category and sorted:
+
+    {"_id", "version", "updatedAt", "itemCount",
+     "categories": [{"name", "items": [MenuItemResponse fields]}]}
+
+Categories keep the order in which the restaurant added them and items are
+in creation order (ObjectId order). The admin menu-item routes call
+``apply_item_change`` after each write, which rereads the one item and
+patches it into the snapshot with a version-checked replace instead of
+rereading the whole menu. A missing snapshot is built from ``menu_items`` on
+first read; ``delete_snapshot`` drops it with its restaurant.
+
+Versions only go up (they start from the build time in milliseconds), so
+``"<restaurantId>-<version>-<representation>"`` is a stable ETag for each of
+the flat and grouped bodies, and pricing records the version an order was
+priced from. Rendered JSON is cached per worker for
+MENU_CACHE_TTL seconds; right after a local change it is rendered from the
+primary (see utils.catalog.read_db).
+"""
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from utils.cache import TTLCache
+from utils.catalog import read_db
+from utils.joins import id_filter
+from utils.serialization import dumps
+
+ITEM_FIELDS = ("name", "description", "price", "image", "category", "isAvailable", "restaurantId")
+
+menu_cache = TTLCache("menu_snapshots", ttl=float(os.getenv("MENU_CACHE_TTL", "30")), maxsize=2048)
+
+
+def _entry(item: dict) -> dict:
+    entry = {"id": str(item.get("id") or item["_id"])}
+    for field in ITEM_FIELDS:
+        if field in item:
+            entry[field] = item[field]
+    entry.setdefault("isAvailable", True)
+    return entry
+
+
+def group_items(items: List[dict]) -> List[dict]:
+    """Category groups in first-added order, items in creation order"""
+    categories: Dict[str, List[dict]] = {}
+    for item in sorted(items, key=lambda entry: entry["id"]):
+        categories.setdefault(item.get("category") or "", []).append(item)
+    return [{"name": name, "items": entries} for name, entries in categories.items()]
+
+
+def _snapshot(restaurant_id: str, items: List[dict], previous: Optional[dict]) -> dict:
+    version = int(time.time() * 1000)
+    if previous is not None:
+        version = max(version, previous["version"] + 1)
+    return {
+        "_id": restaurant_id,
+        "version": version,
+        "updatedAt": datetime.utcnow(),
+        "itemCount": len(items),
+        "categories": group_items(items),
+    }
+
+
+def flatten(snapshot: dict) -> List[dict]:
+    return [item for category in snapshot["categories"] for item in category["items"]]
+
+
+def etag(snapshot: dict, representation: str) -> str:
+    """The ETag of one representation ("flat" or "grouped") of the snapshot"""
+    return f'"{snapshot["_id"]}-{snapshot["version"]}-{representation}"'
+
+
+# ==================== BUILD ====================
+
+async def rebuild_snapshot(restaurant_id: str) -> dict:
+    """Materialize the snapshot from menu_items (first read, or repair)"""
+    cursor = db.menu_items.find({"restaurantId": restaurant_id}, {field: 1 for field in ITEM_FIELDS})
+    items = [_entry(item) async for item in cursor]
+    previous = await db.menu_snapshots.find_one({"_id": restaurant_id}, {"version": 1})
+    if previous is None and not items:
+        # Not stored, so unknown restaurant ids do not create documents
+        return {"_id": restaurant_id, "version": 0, "updatedAt": datetime.utcnow(), "itemCount": 0, "categories": []}
+    snapshot = _snapshot(restaurant_id, items, previous)
+    if previous is None:
+        try:
+            await db.menu_snapshots.insert_one(snapshot)
+        except DuplicateKeyError:
+            # Built concurrently by another request
+            return await db.menu_snapshots.find_one({"_id": restaurant_id})
+    else:
+        await db.menu_snapshots.replace_one({"_id": restaurant_id}, snapshot)
+    menu_cache.invalidate(restaurant_id)
+    return snapshot
+
+
+async def apply_item_change(restaurant_id: Optional[str], item_id: str):
+    """Bring `item_id` in the restaurant's snapshot in line with menu_items (after a create, update or delete)"""
+    if not restaurant_id:
+        return
+    # Concurrent admin edits of the same menu retry against the newer version.
+    # The item is reread after the snapshot on every attempt, so whichever
+    # edit writes the snapshot last carries the item as stored, not as one
+    # request saw it
+    for _ in range(3):
+        previous = await db.menu_snapshots.find_one({"_id": restaurant_id})
+        if previous is None:
+            await rebuild_snapshot(restaurant_id)
+            return
+        item = await db.menu_items.find_one({"_id": id_filter(item_id)}, {field: 1 for field in ITEM_FIELDS})
+        items = [entry for entry in flatten(previous) if entry["id"] != item_id]
+        # Deleted, or moved to another restaurant
+        if item is not None and item.get("restaurantId") == restaurant_id:
+            items.append(_entry(item))
+        snapshot = _snapshot(restaurant_id, items, previous)
+        result = await db.menu_snapshots.replace_one({"_id": restaurant_id, "version": previous["version"]}, snapshot)
+        if result.matched_count:
+            menu_cache.invalidate(restaurant_id)
+            return
+    await rebuild_snapshot(restaurant_id)
+
+
+async def delete_snapshot(restaurant_id: str):
+    """Drop a deleted restaurant's snapshot (after its menu_items)"""
+    await db.menu_snapshots.delete_one({"_id": restaurant_id})
+    menu_cache.invalidate(restaurant_id)
+
+
+# ==================== READ ====================
+
+async def load_snapshot(restaurant_id: str, database=db) -> dict:
+    """One primary-key read; pricing passes the primary, menu pages the catalog database"""
+    snapshot = await database.menu_snapshots.find_one({"_id": restaurant_id})
+    if snapshot is None:
+        snapshot = await rebuild_snapshot(restaurant_id)
+    return snapshot
+
+
+async def _render(restaurant_id: str) -> dict:
+    snapshot = await load_snapshot(restaurant_id, read_db(menu_cache, restaurant_id))
+    return {
+        "version": snapshot["version"],
+        "itemsEtag": etag(snapshot, "flat"),
+        "items": dumps(flatten(snapshot)),
+        "groupedEtag": etag(snapshot, "grouped"),
+        "grouped": dumps({
+            "restaurantId": restaurant_id,
+            "version": snapshot["version"],
+            "updatedAt": snapshot["updatedAt"],
+            "itemCount": snapshot["itemCount"],
+            "categories": snapshot["categories"],
+        }),
+    }
+
+
+async def get_menu(restaurant_id: str) -> dict:
+    """{"version", "items": JSON bytes (flat list), "itemsEtag", "grouped": JSON bytes (snapshot), "groupedEtag"}"""
+    return await menu_cache.get_or_load(restaurant_id, lambda: _render(restaurant_id))
@@ -0,0 +1,104 @@
+"""
+Per-user notification push, replacing unread-count polling.
+
+Open streams subscribe to ``notification_updates`` (sharded by user id) and
+``watcher`` follows inserts into ``notifications``, so a notification written
+by any worker reaches the user's streams on every worker. On a standalone
+server writers call ``notify_inserted`` instead.
+
+Every event carries an id of ``<createdAt ms>.<notification id>``; a
+reconnecting client sends it back as ``Last-Event-ID`` and ``catch_up``
+returns what was inserted after it, in order.
+"""
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from database import db
+from utils.pubsub import ShardedBroker, ChangeStreamWatcher
+
+notification_updates = ShardedBroker("notifications")
+
+# Fields sent to clients; matches NotificationResponse
+EVENT_FIELDS = ("userId", "title", "message", "notificationType", "data", "isRead", "createdAt")
+
+PIPELINE = [
+    {"$match": {"operationType": "insert"}},
+    {"$project": {"documentKey": 1, "operationType": 1, **{f"fullDocument.{field}": 1 for field in EVENT_FIELDS}}},
+]
+
+# Catch-up is bounded; older notifications are fetched from the list endpoint
+CATCH_UP_LIMIT = 100
+
+EventKey = Tuple[int, str]
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _millis(value: datetime) -> int:
+    # Naive UTC, as stored; BSON dates have millisecond precision
+    return (value - _EPOCH) // _MILLISECOND
+
+
+def event_key(doc: dict) -> EventKey:
+    return _millis(doc["createdAt"]), str(doc["_id"])
+
+
+def format_key(key: EventKey) -> str:
+    return f"{key[0]}.{key[1]}"
+
+
+def parse_key(value: Optional[str]) -> Optional[EventKey]:
+    """Last-Event-ID back to a key; None when missing or malformed"""
+    if not value:
+        return None
+    millis, _, notification_id = value.partition(".")
+    try:
+        return int(millis), notification_id
+    except ValueError:
+        return None
+
+
+def since_key(since: datetime) -> EventKey:
+    """Key just before everything created at or after `since`"""
+    return _millis(since) - 1, "~"
+
+
+def notification_event(doc: dict) -> dict:
+    event = {"id": str(doc["_id"])}
+    for field in EVENT_FIELDS:
+        if field in doc:
+            value = doc[field]
+            event[field] = value.isoformat() if isinstance(value, datetime) else value
+    return event
+
+
+async def catch_up(user_id: str, after: EventKey) -> List[dict]:
+    """Notifications created after `after`, oldest first"""
+    created_after = _EPOCH + after[0] * _MILLISECOND
+    cursor = db.notifications.find(
+        {"userId": user_id, "createdAt": {"$gte": created_after}}
+    ).sort([("createdAt", 1), ("_id", 1)]).limit(CATCH_UP_LIMIT)
+    docs = [doc async for doc in cursor]
+    # Same-millisecond neighbours of the last seen event were already sent
+    return [doc for doc in docs if event_key(doc) > after]
+
+
+def _handle_change(change: dict):
+    doc = change["fullDocument"]
+    doc["_id"] = change["documentKey"]["_id"]
+    if notification_updates.has_subscribers(doc["userId"]):
+        notification_updates.publish(doc["userId"], doc)
+
+
+watcher = ChangeStreamWatcher("notifications", PIPELINE, _handle_change)
+
+
+async def notify_inserted(docs: Iterable[dict]) -> int:
+    """Called after inserting notifications; only publishes when no change stream will deliver them"""
+    if watcher.active:
+        return 0
+    return await notification_updates.publish_many(
+        (doc["userId"], doc) for doc in docs if notification_updates.has_subscribers(doc["userId"])
+    )
@@ -0,0 +1,64 @@
+"""
+Order status push: one change-stream watcher per worker feeding SSE trackers.
+
+``watcher`` follows ``orders`` for status changes (updates and
+replacements) and publishes ``{"orderId", "status", ...}`` to the
+``order_updates`` broker, keyed by order id. On a standalone server the
+watcher disables itself and ``notify_order_update`` publishes directly from
+the writer instead, which only reaches trackers connected to the same worker.
+"""
+from datetime import datetime
+
+from utils.pubsub import Broker, ChangeStreamWatcher
+
+order_updates = Broker("orders")
+
+# Fields a tracker renders
+STATUS_FIELDS = ("status", "updatedAt", "confirmedAt", "deliveredAt", "cancelledAt", "cancellationReason")
+FINAL_STATUSES = ("delivered", "cancelled")
+
+PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": "update", "updateDescription.updatedFields.status": {"$exists": True}},
+        {"operationType": "replace"},
+    ]}},
+    {"$project": {
+        "documentKey": 1,
+        "operationType": 1,
+        **{f"updateDescription.updatedFields.{field}": 1 for field in STATUS_FIELDS},
+        **{f"fullDocument.{field}": 1 for field in STATUS_FIELDS},
+    }},
+]
+
+
+def order_event(order_id: str, fields: dict) -> dict:
+    event = {"orderId": order_id}
+    for field in STATUS_FIELDS:
+        value = fields.get(field)
+        if value is not None:
+            event[field] = value.isoformat() if isinstance(value, datetime) else value
+    return event
+
+
+def publish_order_update(order_id: str, fields: dict) -> int:
+    return order_updates.publish(order_id, order_event(order_id, fields))
+
+
+def _handle_change(change: dict):
+    order_id = str(change["documentKey"]["_id"])
+    if not order_updates.has_subscribers(order_id):
+        return
+    if change["operationType"] == "replace":
+        fields = change.get("fullDocument") or {}
+    else:
+        fields = change["updateDescription"]["updatedFields"]
+    publish_order_update(order_id, fields)
+
+
+watcher = ChangeStreamWatcher("orders", PIPELINE, _handle_change)
+
+
+def notify_order_update(order_id: str, fields: dict):
+    """Called by writers; only publishes when no change stream will deliver the update"""
+    if not watcher.active:
+        publish_order_update(order_id, fields)
@@ -0,0 +1,105 @@
+"""
+Server-side order pricing.
+
+Orders are priced from a per-restaurant menu price index (menu item id ->
+name, price, availability) built from the restaurant's menu snapshot and
+cached; admin menu writes call ``invalidate_menu_prices``. The snapshot
+version is stored on the order so a price dispute can be traced to the menu
+it was priced from. Fees come from the cached app settings and the coupon
+discount from the coupon engine. Client-supplied amounts are never used.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+
+from database import db
+from utils.cache import TTLCache
+from utils.catalog import get_app_settings
+from utils.coupon_engine import CouponError, check_coupon, coupon_discount
+from utils.menu_snapshot import flatten, load_snapshot
+
+menu_price_cache = TTLCache("menu_prices", ttl=300, maxsize=2048)
+
+
+class PricingError(ValueError):
+    """The order cannot be priced (unknown or unavailable item, invalid coupon)"""
+
+
+# ==================== MENU PRICE INDEX ====================
+
+async def _load_menu_prices(restaurant_id: str) -> dict:
+    # Read from the primary: an order must not be priced from a lagging menu
+    snapshot = await load_snapshot(restaurant_id, db)
+    restaurant = await db.restaurants.find_one({"_id": ObjectId(restaurant_id)}, {"location.city": 1}) if ObjectId.is_valid(restaurant_id) else None
+    items = {
+        item["id"]: {"name": item["name"], "price": float(item["price"]), "isAvailable": item.get("isAvailable", True)}
+        for item in flatten(snapshot)
+    }
+    return {
+        "version": snapshot["version"],
+        "builtAt": datetime.utcnow(),
+        # For city-restricted coupons
+        "city": ((restaurant or {}).get("location") or {}).get("city"),
+        "items": items,
+    }
+
+
+async def get_menu_prices(restaurant_id: str) -> dict:
+    """{"version", "builtAt", "city", "items": {menu item id: {"name", "price", "isAvailable"}}}"""
+    return await menu_price_cache.get_or_load(restaurant_id, lambda: _load_menu_prices(restaurant_id))
+
+
+def invalidate_menu_prices(restaurant_id: Optional[str] = None):
+    if restaurant_id is None:
+        menu_price_cache.invalidate()
+    else:
+        menu_price_cache.invalidate(restaurant_id)
+
+
+# ==================== ORDERS ====================
+
+async def price_order(restaurant_id: str, items: Iterable, user_id: str, coupon_code: Optional[str] = None) -> dict:
+    """Price order lines (objects with menuItemId and quantity) and return the order amounts"""
+    menu = await get_menu_prices(restaurant_id)
+
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item.menuItemId] = quantities.get(item.menuItemId, 0) + item.quantity
+    if not quantities:
+        raise PricingError("Sipariş en az bir ürün içermelidir")
+
+    priced_items = []
+    for menu_item_id, quantity in quantities.items():
+        entry = menu["items"].get(menu_item_id)
+        if entry is None:
+            raise PricingError(f"Ürün bu restoranın menüsünde bulunamadı: {menu_item_id}")
+        if not entry["isAvailable"]:
+            raise PricingError(f"{entry['name']} şu anda mevcut değil")
+        priced_items.append({"menuItemId": menu_item_id, "name": entry["name"], "price": entry["price"], "quantity": quantity})
+
+    subtotal = round(sum(item["price"] * item["quantity"] for item in priced_items), 2)
+
+    settings = await get_app_settings()
+    delivery_fee = float(settings.get("defaultDeliveryFee", 0))
+    service_fee = float(settings.get("defaultServiceFee", 0))
+
+    discount = 0.0
+    if coupon_code:
+        coupon_code = coupon_code.upper()
+        try:
+            coupon = await check_coupon(coupon_code, user_id, restaurant_id, subtotal, menu["city"])
+        except CouponError as e:
+            raise PricingError(str(e))
+        discount = coupon_discount(coupon, subtotal)
+
+    return {
+        "items": priced_items,
+        "subtotal": subtotal,
+        "deliveryFee": delivery_fee,
+        "serviceFee": service_fee,
+        "discount": discount,
+        "couponCode": coupon_code or None,
+        "total": round(subtotal + delivery_fee + service_fee - discount, 2),
+        "menuVersion": menu["version"],
+    }
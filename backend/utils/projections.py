@@ -0,0 +1,92 @@
+"""
+Named projections for restaurant documents.
+
+Listing endpoints return the ``card`` view (what a list tile renders) instead
+of whole documents; ``detail`` is the full document and ``admin`` is what the
+admin table and edit form use. Callers can narrow further with a sparse
+fieldset, e.g. ``?fields=name,image,rating``.
+"""
+from typing import Dict, Iterable, List, Optional
+
+RESTAURANT_VIEWS: Dict[str, Optional[List[str]]] = {
+    "card": [
+        "name", "slug", "image", "cuisine", "rating", "reviewCount", "deliveryTime",
+        "priceRange", "location", "offers", "promotionText", "isPromoted", "isGoldPartner",
+        "hasDelivery", "hasTableBooking", "deliveryFee", "minOrder", "discount", "isOpen",
+        "tags", "deliveryRadius",
+    ],
+    "admin": [
+        "name", "slug", "image", "cuisine", "description", "phone", "rating", "reviewCount",
+        "deliveryTime", "priceRange", "location", "minOrder", "deliveryFee", "isOpen", "type",
+        "hasDelivery", "hasTableBooking", "isPromoted", "promotionText", "offers",
+        "isGoldPartner", "createdAt", "updatedAt",
+    ],
+    # Full document
+    "detail": None,
+}
+
+# Fields computed by the API rather than stored; always allowed in `fields=`
+COMPUTED_FIELDS = {"id", "distance", "canDeliver", "orderCount"}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated `fields=` value, or None when not given"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def resolve_fields(view: str = "card", fields: Optional[str] = None) -> Optional[List[str]]:
+    """Stored fields to return for a view and optional sparse fieldset (None means all)"""
+    if view not in RESTAURANT_VIEWS:
+        raise ValueError(f"Unknown view '{view}', expected one of: {', '.join(RESTAURANT_VIEWS)}")
+    view_fields = RESTAURANT_VIEWS[view]
+    requested = parse_fields(fields)
+    if requested is None:
+        return view_fields
+
+    # Sparse fieldsets narrow the view; top-level names also select nested paths
+    selected = []
+    for field in requested:
+        if field in COMPUTED_FIELDS:
+            continue
+        if view_fields is not None and field.split(".")[0] not in view_fields:
+            raise ValueError(f"Field '{field}' is not part of the '{view}' view")
+        selected.append(field)
+    return selected
+
+
+def to_projection(field_names: Optional[Iterable[str]], extra: Iterable[str] = ()) -> Optional[dict]:
+    """MongoDB projection for a field list; `_id` is always included"""
+    if field_names is None:
+        return None
+    # MongoDB rejects overlapping paths ("location" and "location.city"); keep the parent
+    fields = sorted(set(field_names) | set(extra))
+    projection = {}
+    for field in fields:
+        if not any(field.startswith(parent + ".") for parent in projection):
+            projection[field] = 1
+    return projection
+
+
+def projection_for(view: str = "card", fields: Optional[str] = None, extra: Iterable[str] = ()) -> Optional[dict]:
+    return to_projection(resolve_fields(view, fields), extra)
+
+
+def trim(doc: dict, field_names: Optional[Iterable[str]]) -> dict:
+    """Apply a field list to an already loaded document (used for cached listings)"""
+    if field_names is None:
+        return doc
+    result = {field: doc[field] for field in COMPUTED_FIELDS if field in doc}
+    for field in field_names:
+        *parents, leaf = field.split(".")
+        source, target = doc, result
+        for part in parents:
+            source = source.get(part) if isinstance(source, dict) else None
+            if source is None:
+                break
+            target = target.setdefault(part, {})
+        else:
+            if isinstance(source, dict) and leaf in source:
+                target[leaf] = source[leaf]
+    return result
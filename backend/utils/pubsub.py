@@ -0,0 +1,223 @@
+"""
+In-process publish/subscribe for push endpoints (SSE).
+
+A ``Subscription`` is a small bounded buffer plus an ``asyncio.Event``; an
+idle subscriber costs one object and one waiting coroutine, no polling and
+no timers besides its heartbeat. Publishing never blocks: when a slow client
+falls behind, the oldest buffered events are dropped (with ``buffer=1`` the
+subscriber simply sees the latest value, which is all a status tracker
+needs).
+
+Everything runs on the event loop thread, so no locks are needed.
+
+Events written by another worker arrive through a ``ChangeStreamWatcher``,
+one per collection and worker, which resumes from its last token after a
+dropped connection.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from utils.metrics import counter, register_callback
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED = counter("pubsub_events_published_total", "Events published", ["channel"])
+DROPPED = counter("pubsub_events_dropped_total", "Events dropped because a subscriber fell behind", ["channel"])
+
+
+class Subscription:
+    def __init__(self, channel: str, topic: str, buffer: int = 1):
+        self.channel = channel
+        self.topic = topic
+        self._items = deque(maxlen=buffer)
+        self._ready = asyncio.Event()
+        # Events pushed out of a full buffer since the last get()
+        self.missed = 0
+
+    def put(self, item: Any):
+        if len(self._items) == self._items.maxlen:
+            DROPPED.labels(self.channel).inc()
+            self.missed += 1
+        self._items.append(item)
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[Any]:
+        """Buffered events, waiting up to `timeout` seconds; [] on timeout"""
+        if not self._items:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        items = list(self._items)
+        self._items.clear()
+        self._ready.clear()
+        return items
+
+
+class Broker:
+    """Topic -> subscriptions registry for one channel (e.g. "orders")"""
+
+    def __init__(self, channel: str, register: bool = True):
+        self.channel = channel
+        self._topics: Dict[str, Set[Subscription]] = {}
+        if register:
+            _brokers[channel] = self
+
+    def __len__(self):
+        return sum(len(subscriptions) for subscriptions in self._topics.values())
+
+    def subscribe(self, topic: str, buffer: int = 1) -> Subscription:
+        subscription = Subscription(self.channel, topic, buffer)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._topics.get(subscription.topic)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._topics[subscription.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic: str, item: Any) -> int:
+        """Deliver to every subscriber of `topic`; returns how many received it"""
+        subscriptions = self._topics.get(topic)
+        if not subscriptions:
+            return 0
+        PUBLISHED.labels(self.channel).inc()
+        for subscription in subscriptions:
+            subscription.put(item)
+        return len(subscriptions)
+
+
+class ShardedBroker:
+    """Broker split by topic hash, for channels with many topics (one per user)
+
+    Large fan-outs go through ``publish_many``, which yields to the event loop
+    between shards so a bulk send does not stall other requests.
+    """
+
+    def __init__(self, channel: str, shards: int = 64):
+        self.channel = channel
+        self._shards = [Broker(channel, register=False) for _ in range(shards)]
+        _brokers[channel] = self
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def shard(self, topic: str) -> Broker:
+        return self._shards[hash(topic) % len(self._shards)]
+
+    def subscribe(self, topic: str, buffer: int = 1) -> Subscription:
+        return self.shard(topic).subscribe(topic, buffer)
+
+    def unsubscribe(self, subscription: Subscription):
+        self.shard(subscription.topic).unsubscribe(subscription)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return self.shard(topic).has_subscribers(topic)
+
+    def publish(self, topic: str, item: Any) -> int:
+        return self.shard(topic).publish(topic, item)
+
+    async def publish_many(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """Publish (topic, item) pairs; returns how many deliveries were made"""
+        by_shard: Dict[int, List[Tuple[str, Any]]] = {}
+        for topic, item in items:
+            by_shard.setdefault(hash(topic) % len(self._shards), []).append((topic, item))
+        delivered = 0
+        for index, pairs in by_shard.items():
+            shard = self._shards[index]
+            for topic, item in pairs:
+                delivered += shard.publish(topic, item)
+            await asyncio.sleep(0)
+        return delivered
+
+
+_brokers: Dict[str, Any] = {}
+
+register_callback(
+    "pubsub_subscribers", "Open push subscriptions per channel",
+    lambda: {(name,): len(broker) for name, broker in _brokers.items()}, ["channel"]
+)
+
+
+def sse_event(data: str, event: str = None, event_id: str = None) -> bytes:
+    """One Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+# Comment frame; keeps proxies from closing idle connections
+SSE_HEARTBEAT = b": keep-alive\n\n"
+
+
+# "The $changeStream stage is only supported on replica sets"
+_NOT_A_REPLICA_SET = 40573
+
+
+class ChangeStreamWatcher:
+    """Feeds change events of one collection to `handle`; inactive on a standalone server
+
+    Change streams need a replica set (a single-node one is enough, see
+    database.py). Without one the watcher disables itself and writers publish
+    locally instead (see ``active``), which only reaches subscribers connected
+    to the same worker.
+    """
+
+    def __init__(self, collection: str, pipeline: List[dict], handle: Callable[[dict], Any]):
+        self.collection = collection
+        self.pipeline = pipeline
+        self.handle = handle
+        self.active = False
+        self.resume_token = None
+        self.last_event_at: Optional[datetime] = None
+
+    async def run(self, db, retry_interval: float = 2.0):
+        try:
+            while True:
+                try:
+                    async with db[self.collection].watch(self.pipeline, resume_after=self.resume_token) as stream:
+                        self.active = True
+                        logger.info("Watching %s changes", self.collection)
+                        async for change in stream:
+                            self.last_event_at = datetime.utcnow()
+                            # One bad event must not stop the stream: writers skip
+                            # their local publish while the watcher is active
+                            try:
+                                self.handle(change)
+                            except Exception as e:
+                                logger.error("Failed to handle %s change: %s", self.collection, e, exc_info=True)
+                            self.resume_token = stream.resume_token
+                except asyncio.CancelledError:
+                    raise
+                except OperationFailure as e:
+                    self.active = False
+                    if e.code == _NOT_A_REPLICA_SET:
+                        logger.warning("Change streams unavailable (not a replica set); %s events are published locally", self.collection)
+                        return
+                    # e.g. the resume token fell off the oplog: start from now
+                    logger.warning("%s change stream failed: %s", self.collection, e)
+                    self.resume_token = None
+                except PyMongoError as e:
+                    self.active = False
+                    logger.warning("%s change stream interrupted, resuming: %s", self.collection, e)
+                except Exception as e:
+                    self.active = False
+                    logger.error("%s change stream error, restarting: %s", self.collection, e, exc_info=True)
+                await asyncio.sleep(retry_interval)
+        finally:
+            # Stopped for good (cancelled or no replica set): writers publish locally
+            self.active = False
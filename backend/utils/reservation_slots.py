@@ -0,0 +1,253 @@
+"""
+Reservation slot inventory.
+
+One document per ``(restaurantId, date, time)`` in ``reservation_slots``
+holds the bookings and covers (total party size) currently held by pending
+and confirmed reservations. Capacity is claimed with a single conditional
+upsert, so concurrent bookings cannot overbook a slot:
+
+- the filter only matches while the slot has room for the party
+- a full slot does not match, the upsert then collides with the existing
+  ``_id`` and the DuplicateKeyError means "full"
+
+Releasing capacity is a plain ``$inc`` of the negative amounts. Dates and
+times are normalized with ``normalize_slot`` before claiming, so every
+spelling of a slot maps to the same document.
+
+Availability reads (single day, date ranges and next-available badges) are
+served from the inventory through a short TTL cache. Every claim or release
+bumps the restaurant's version, which is part of the cache key, so this
+worker never serves availability older than its own last booking change;
+other workers are bounded by the TTL.
+"""
+import os
+from datetime import date as date_type, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import db
+from utils.cache import TTLCache
+
+# Statuses that occupy a table
+HOLDING_STATUSES = ("pending", "confirmed")
+
+DEFAULT_MAX_RESERVATIONS_PER_SLOT = 5
+
+# 11:00 to 22:30, every 30 minutes
+TIME_SLOTS = [f"{hour:02d}:{minute}" for hour in range(11, 23) for minute in ("00", "30")]
+
+MAX_RANGE_DAYS = 60
+
+availability_cache = TTLCache("reservation_availability", ttl=float(os.getenv("AVAILABILITY_CACHE_TTL", "15")), maxsize=4096)
+
+# restaurant id -> number of inventory changes seen by this worker
+_versions: Dict[str, int] = {}
+
+_MISSING = object()
+
+
+def _changed(restaurant_id: str):
+    _versions[restaurant_id] = _versions.get(restaurant_id, 0) + 1
+
+
+def slot_key(restaurant_id: str, date: str, time: str) -> str:
+    return f"{restaurant_id}:{date}:{time}"
+
+
+def normalize_slot(date: str, time: str) -> Tuple[str, str]:
+    """Canonical (YYYY-MM-DD, HH:MM) of a bookable slot; ValueError for a bad date or a time not in TIME_SLOTS"""
+    day = parse_date(date).isoformat()
+    try:
+        time = datetime.strptime(time.strip(), "%H:%M").strftime("%H:%M")
+    except ValueError:
+        raise ValueError(f"Invalid time '{time}'")
+    if time not in TIME_SLOTS:
+        raise ValueError(f"'{time}' is not a reservation time slot")
+    return day, time
+
+
+def slot_capacity(restaurant: dict) -> Tuple[int, Optional[int]]:
+    """(max reservations, max covers or None) per slot for a restaurant"""
+    max_reservations = restaurant.get("maxReservationsPerSlot", DEFAULT_MAX_RESERVATIONS_PER_SLOT)
+    return max_reservations, restaurant.get("maxCoversPerSlot")
+
+
+async def claim_slot(restaurant: dict, date: str, time: str, party_size: int) -> bool:
+    """Reserve capacity for a party; False when the slot is full"""
+    restaurant_id = str(restaurant["_id"])
+    max_reservations, max_covers = slot_capacity(restaurant)
+    if max_reservations < 1 or (max_covers is not None and party_size > max_covers):
+        return False
+
+    query = {"_id": slot_key(restaurant_id, date, time), "bookings": {"$lt": max_reservations}}
+    if max_covers is not None:
+        query["covers"] = {"$lte": max_covers - party_size}
+    update = {
+        "$inc": {"bookings": 1, "covers": party_size},
+        "$set": {"updatedAt": datetime.utcnow()},
+        "$setOnInsert": {"restaurantId": restaurant_id, "date": date, "time": time},
+    }
+
+    # A second attempt covers two first bookings racing to create the document
+    for _ in range(2):
+        try:
+            await db.reservation_slots.update_one(query, update, upsert=True)
+            _changed(restaurant_id)
+            return True
+        except DuplicateKeyError:
+            continue
+    return False
+
+
+async def release_slot(restaurant_id: str, date: str, time: str, party_size: int):
+    """Return a party's capacity to the slot"""
+    await db.reservation_slots.update_one(
+        {"_id": slot_key(restaurant_id, date, time), "bookings": {"$gte": 1}},
+        {"$inc": {"bookings": -1, "covers": -party_size}, "$set": {"updatedAt": datetime.utcnow()}}
+    )
+    _changed(restaurant_id)
+
+
+async def release_reservation(reservation: dict):
+    await release_slot(
+        reservation["restaurantId"], reservation["date"], reservation["time"], reservation.get("partySize", 1)
+    )
+
+
+def slot_availability(restaurant: dict, usage: Dict[str, dict], after: Optional[str] = None) -> list:
+    """Per-slot availability for one day; `after` skips times up to HH:MM"""
+    max_reservations, max_covers = slot_capacity(restaurant)
+    availability = []
+    for time in TIME_SLOTS:
+        if after is not None and time <= after:
+            continue
+        slot = usage.get(time) or {}
+        available = max(max_reservations - slot.get("bookings", 0), 0)
+        entry = {"time": time, "available": available, "isAvailable": available > 0}
+        if max_covers is not None:
+            entry["availableCovers"] = max(max_covers - slot.get("covers", 0), 0)
+            entry["isAvailable"] = entry["isAvailable"] and entry["availableCovers"] > 0
+        availability.append(entry)
+    return availability
+
+
+async def rebuild_slots(restaurant_id: Optional[str] = None) -> int:
+    """Recompute inventory from reservations (backfill or repair); returns slots written
+
+    Safe while bookings are live: each slot is upserted on its own, and only
+    if no claim or release touched it since the rebuild started (its live
+    counters are then newer than the recount and are left alone). Slots with
+    no holding reservations are removed under the same condition.
+    """
+    started = datetime.utcnow()
+    match = {"status": {"$in": list(HOLDING_STATUSES)}}
+    slot_filter = {}
+    if restaurant_id:
+        match["restaurantId"] = restaurant_id
+        slot_filter["restaurantId"] = restaurant_id
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"restaurantId": "$restaurantId", "date": "$date", "time": "$time"},
+            "bookings": {"$sum": 1},
+            "covers": {"$sum": {"$ifNull": ["$partySize", 1]}},
+        }},
+    ]
+    untouched = {"$or": [{"updatedAt": {"$lt": started}}, {"updatedAt": {"$exists": False}}]}
+    operations = []
+    keys = []
+    async for group in db.reservations.aggregate(pipeline):
+        key = slot_key(group["_id"]["restaurantId"], group["_id"]["date"], group["_id"]["time"])
+        keys.append(key)
+        operations.append(UpdateOne(
+            {"_id": key, **untouched},
+            {"$set": {**group["_id"], "bookings": group["bookings"], "covers": group["covers"], "updatedAt": started}},
+            upsert=True
+        ))
+
+    written = len(operations)
+    for start in range(0, len(operations), 1000):
+        try:
+            await db.reservation_slots.bulk_write(operations[start:start + 1000], ordered=False)
+        except BulkWriteError as e:
+            # A duplicate key means the slot was claimed or released meanwhile
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            written -= len(errors)
+
+    await db.reservation_slots.delete_many({**slot_filter, "_id": {"$nin": keys}, **untouched})
+    availability_cache.invalidate()
+    return written
+
+
+def parse_date(value: str) -> date_type:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def date_range(start: date_type, end: date_type) -> List[str]:
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+async def _load_usage_range(restaurant_ids: List[str], date_from: str, date_to: str) -> Dict[str, Dict[str, Dict[str, dict]]]:
+    """restaurant id -> date -> time -> inventory document, in one indexed query"""
+    cursor = db.reservation_slots.find(
+        {"restaurantId": {"$in": restaurant_ids}, "date": {"$gte": date_from, "$lte": date_to}},
+        {"restaurantId": 1, "date": 1, "time": 1, "bookings": 1, "covers": 1}
+    )
+    usage: Dict[str, Dict[str, Dict[str, dict]]] = {}
+    async for slot in cursor:
+        usage.setdefault(slot["restaurantId"], {}).setdefault(slot["date"], {})[slot["time"]] = slot
+    return usage
+
+
+async def get_availability_range(restaurant: dict, start: date_type, end: date_type) -> List[dict]:
+    """Per-day slot availability from `start` to `end` inclusive"""
+    restaurant_id = str(restaurant["_id"])
+    days = date_range(start, end)
+    key = ("range", restaurant_id, _versions.get(restaurant_id, 0), days[0], days[-1])
+
+    async def load():
+        usage = (await _load_usage_range([restaurant_id], days[0], days[-1])).get(restaurant_id, {})
+        return [{"date": day, "timeSlots": slot_availability(restaurant, usage.get(day, {}))} for day in days]
+
+    return await availability_cache.get_or_load(key, load)
+
+
+def _first_open_slot(restaurant: dict, usage: Dict[str, Dict[str, dict]], days: List[str], now: datetime) -> Optional[dict]:
+    today, current_time = now.date().isoformat(), now.strftime("%H:%M")
+    for day in days:
+        for slot in slot_availability(restaurant, usage.get(day, {}), after=current_time if day == today else None):
+            if slot["isAvailable"]:
+                return {"date": day, **slot}
+    return None
+
+
+async def next_available_slots(restaurants: Iterable[dict], days: int = 14) -> Dict[str, Optional[dict]]:
+    """First bookable slot per restaurant within `days`, for listing badges"""
+    now = datetime.now()
+    window = date_range(now.date(), now.date() + timedelta(days=days - 1))
+    minute = now.strftime("%H:%M")
+
+    results: Dict[str, Optional[dict]] = {}
+    missing = []
+    for restaurant in restaurants:
+        restaurant_id = str(restaurant["_id"])
+        key = ("next", restaurant_id, _versions.get(restaurant_id, 0), window[0], days, minute)
+        cached = availability_cache.get(key, _MISSING)
+        if cached is _MISSING:
+            missing.append((restaurant, key))
+        else:
+            results[restaurant_id] = cached
+
+    if missing:
+        usage = await _load_usage_range([str(r["_id"]) for r, _ in missing], window[0], window[-1])
+        for restaurant, key in missing:
+            restaurant_id = str(restaurant["_id"])
+            slot = _first_open_slot(restaurant, usage.get(restaurant_id, {}), window, now)
+            availability_cache.set(key, slot)
+            results[restaurant_id] = slot
+    return results
@@ -0,0 +1,77 @@
+"""
+Fast JSON responses.
+
+``ORJSONResponse`` is the app-wide default response class: it encodes with
+orjson and understands BSON types (ObjectId, Decimal128) directly, so values
+read from MongoDB need no ``jsonable_encoder`` pass.
+
+Large read endpoints use the trusted path: the handler fetches exactly the
+fields of its response schema (``model_projection``) and returns
+``trusted_response(docs)``. FastAPI does not re-validate a returned
+``Response``, so the ``response_model`` only documents the shape in OpenAPI.
+In its place the projection fills in the model's field defaults, so
+documents written before a field existed come out as validation would have
+returned them. Only use it for documents this service wrote itself and never for models
+that must strip stored fields (e.g. users with password hashes).
+"""
+from decimal import Decimal
+from typing import Any, Optional, Type
+
+import orjson
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+
+def bson_default(obj: Any):
+    """orjson fallback for types it does not encode natively"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=bson_default)
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Already encoded JSON bytes (see utils.codec.find_json)"""
+    media_type = "application/json"
+
+
+def trusted_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> ORJSONResponse:
+    """Encode handler output directly, skipping response_model validation"""
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def model_defaults(model: Type[BaseModel]) -> dict:
+    """Plain (non-factory) defaults of a response model's optional fields"""
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if name != "id" and not field.is_required() and field.default_factory is None
+    }
+
+
+def model_projection(model: Type[BaseModel]) -> dict:
+    """Aggregation $project for the fields a response model declares (`id` comes from `_id`)"""
+    defaults = model_defaults(model)
+    return {
+        name: {"$ifNull": [f"${name}", {"$literal": defaults[name]}]} if name in defaults else 1
+        for name in model.model_fields if name != "id"
+    }